@@ -1,18 +1,216 @@
-from sqlalchemy import create_engine
+import threading
+from typing import NamedTuple, Optional, Union
+
+from fastapi import Request
+from sqlalchemy import Engine, create_engine, event, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+from .utils.async_utils import run_db
+from .utils.constants import (
+    DATABASE_URL, DB_ASYNC, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE,
+    SQLITE_PRODUCTION, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE_KB, SQLITE_BUSY_TIMEOUT_MS, METRICS_ENABLED, QUERY_BUDGET_ENFORCE,
+)
+from .utils.metrics_utils import instrument_engine
+
+
+def engine_options(url: str) -> dict:
+    """
+    Return the create_engine keyword arguments for the URL's dialect.
+    SQLite connections are shared with the threadpool; server databases (PostgreSQL) get a sized
+    connection pool that pings connections before use and recycles them after DB_POOL_RECYCLE seconds.
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return {"connect_args": {"check_same_thread": False}}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
 
-from .utils.constants import DATABASE_URL
+def uses_sqlite_production(url: str) -> bool:
+    """True when the SQLite production profile applies: SQLITE_PRODUCTION is set and the URL is an SQLite file."""
+    url = make_url(url)
+    return SQLITE_PRODUCTION and url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def _sqlite_pragmas(query_only: bool):
+    """Return a connect-event listener applying the production pragmas to each new SQLite connection."""
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+            cursor.execute("PRAGMA journal_mode = WAL")
+            cursor.execute("PRAGMA synchronous = NORMAL")
+            cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+            cursor.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+            if query_only:
+                cursor.execute("PRAGMA query_only = ON")
+        finally:
+            cursor.close()
+    return on_connect
+
+
+def _sqlite_production_engines(factory, url: str):
+    """
+    Create the (writer, reader) engine pair of the SQLite production profile with factory
+    (create_engine or create_async_engine). The writer pool holds a single connection, so writes
+    are serialized in the application instead of contending for SQLite's lock; readers run in WAL
+    mode next to it, on a pool of DB_POOL_SIZE read-only connections.
+    """
+    options = engine_options(url)
+    writer = factory(url, pool_size=1, max_overflow=0, **options)
+    reader = factory(url, pool_size=DB_POOL_SIZE, max_overflow=0, **options)
+    event.listen(getattr(writer, "sync_engine", writer), "connect", _sqlite_pragmas(query_only=False))
+    event.listen(getattr(reader, "sync_engine", reader), "connect", _sqlite_pragmas(query_only=True))
+    return writer, reader
+
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+# Session type handed to routers by get_session
+AnySession = Union[Session, AsyncSession]
+
+
+def async_database_url(url: str) -> str:
+    """
+    Map a synchronous database URL onto its asyncio driver (aiosqlite for SQLite, asyncpg for PostgreSQL).
+    """
+    scheme, _, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg://{rest}"
+    return url
+
+
+class Engines(NamedTuple):
+    """
+    Engines and session factories of DATABASE_URL. The reader equals the writer except in the SQLite
+    production profile; the async members are None unless DB_ASYNC is enabled.
+    """
+    engine: Engine
+    read_engine: Engine
+    SessionLocal: sessionmaker
+    ReadSessionLocal: sessionmaker
+    async_engine: Optional[AsyncEngine]
+    async_read_engine: Optional[AsyncEngine]
+    AsyncSessionLocal: Optional[async_sessionmaker]
+    AsyncReadSessionLocal: Optional[async_sessionmaker]
+
+
+def _instrument_engines(engines: Engines):
+    """Attach the SQL metrics to every engine, labelled writer/reader in the SQLite production profile."""
+    pairs = [(engines.engine, engines.read_engine)]
+    if engines.async_engine is not None:
+        pairs.append((engines.async_engine.sync_engine, engines.async_read_engine.sync_engine))
+    for writer, reader in pairs:
+        if writer is reader:
+            instrument_engine(writer, "primary")
+        else:
+            instrument_engine(writer, "writer")
+            instrument_engine(reader, "reader")
+
+
+def _create_engines() -> Engines:
+    if uses_sqlite_production(DATABASE_URL):
+        engine, read_engine = _sqlite_production_engines(create_engine, DATABASE_URL)
+    else:
+        engine = read_engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+
+    async_engine = async_read_engine = AsyncSessionLocal = AsyncReadSessionLocal = None
+    if DB_ASYNC:
+        if uses_sqlite_production(DATABASE_URL):
+            async_engine, async_read_engine = _sqlite_production_engines(create_async_engine, async_database_url(DATABASE_URL))
+        else:
+            async_engine = async_read_engine = create_async_engine(async_database_url(DATABASE_URL), **engine_options(DATABASE_URL))
+        # objects stay usable after commit; lazy refreshes are not possible on an AsyncSession
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+        AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
+    engines = Engines(
+        engine, read_engine,
+        sessionmaker(autocommit=False, autoflush=False, bind=engine),
+        sessionmaker(autocommit=False, autoflush=False, bind=read_engine),
+        async_engine, async_read_engine, AsyncSessionLocal, AsyncReadSessionLocal,
+    )
+    # query budgets are checked by the same instrumentation
+    if METRICS_ENABLED or QUERY_BUDGET_ENFORCE:
+        _instrument_engines(engines)
+    return engines
+
+
+_engines: Optional[Engines] = None
+_engines_lock = threading.Lock()
+
+
+def get_engines() -> Engines:
+    """
+    Return the application's engines and session factories, creating them on the first call.
+    Importing the application never touches the database: engines are built when the first request,
+    the lifespan or a maintenance command needs them, and connections are only opened on use.
+    """
+    global _engines
+    if _engines is None:
+        with _engines_lock:
+            if _engines is None:
+                _engines = _create_engines()
+    return _engines
+
+
+async def dispose_engines():
+    """Close every pooled connection and drop the engines; a later get_engines() creates new ones."""
+    global _engines
+    with _engines_lock:
+        engines, _engines = _engines, None
+    if engines is None:
+        return
+    for sync_engine in {engines.engine, engines.read_engine}:
+        sync_engine.dispose()
+    for async_engine in {engines.async_engine, engines.async_read_engine} - {None}:
+        await async_engine.dispose()
+
+
+def __getattr__(name: str):
+    # engine, SessionLocal, ... resolve through get_engines, so "from app.database import SessionLocal" keeps working
+    if name in Engines._fields:
+        return getattr(get_engines(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _is_read_only(request: Request) -> bool:
+    return request.method in ("GET", "HEAD", "OPTIONS")
+
+def get_db(request: Request):
+    """Session for the request: from the reader pool for GET/HEAD routes, else on the writer connection."""
+    engines = get_engines()
+    db = engines.ReadSessionLocal() if _is_read_only(request) else engines.SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db(request: Request):
+    """AsyncSession for the request, from the reader or writer engine like get_db."""
+    engines = get_engines()
+    async with (engines.AsyncReadSessionLocal() if _is_read_only(request) else engines.AsyncSessionLocal()) as db:
+        yield db
+
+# Session dependency of the async routers: an AsyncSession when DB_ASYNC is enabled, else a Session
+get_session = get_async_db if DB_ASYNC else get_db
+
+
+async def release_connection(db: AnySession, *instances):
+    """
+    End the session's transaction so its connection returns to the pool before a slow step that
+    does not need the database (e.g. bcrypt). With the SQLite production profile this keeps the
+    single writer connection free for other requests.
+    :param instances: Loaded objects to keep usable; they are detached and keep their loaded state.
+    """
+    for instance in instances:
+        db.expunge(instance)
+    await run_db(db, Session.rollback)
@@ -1,18 +1,64 @@
+"""
+Application factory.
+
+Importing this module builds the app without touching the database: the schema is created and
+upgraded by migrations (python -m app.manage migrate), engines are created on first use, and the
+background scheduler starts with the lifespan. Run with `uvicorn app.main:app`, or
+`uvicorn --factory app.main:create_app`.
+"""
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
-from .database import Base, engine
-from .routers import users, categories, expenses, incomes, finance
+from .database import dispose_engines, get_engines
+from .routers import users, categories, expenses, incomes, finance, metrics, recurring, batch, budgets
+from .utils.constants import METRICS_ENABLED, QUERY_BUDGET_ENFORCE, RECURRING_SCHEDULER_ENABLED
+from .utils.metrics_utils import MetricsMiddleware
+from .utils.passwords import shutdown_password_pool
+from .utils.query_budget_utils import query_budget, routes_without_budget
+from .utils.recurring_utils import RecurringScheduler
 
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Home Budget API", version="1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # the engines are created by the scheduler's first pass, on its own thread
+    scheduler = RecurringScheduler(lambda: get_engines().SessionLocal())
+    if RECURRING_SCHEDULER_ENABLED:
+        scheduler.start()
+    yield
+    scheduler.stop()
+    shutdown_password_pool()
+    await dispose_engines()
 
-app.include_router(users.router)
-app.include_router(categories.router)
-app.include_router(expenses.router)
-app.include_router(incomes.router)
-app.include_router(finance.router)
 
-@app.get("/")
+@query_budget(0)
 def root():
     return {"message": "Welcome to the Home Budget API!"}
+
+
+def create_app() -> FastAPI:
+    """Build the Home Budget application."""
+    app = FastAPI(title="Home Budget API", version="1.0", lifespan=lifespan)
+
+    app.include_router(users.router)
+    app.include_router(categories.router)
+    app.include_router(expenses.router)
+    app.include_router(incomes.router)
+    app.include_router(finance.router)
+    app.include_router(recurring.router)
+    app.include_router(batch.router)
+    app.include_router(budgets.router)
+
+    if METRICS_ENABLED or QUERY_BUDGET_ENFORCE:
+        app.add_middleware(MetricsMiddleware)
+    if METRICS_ENABLED:
+        app.include_router(metrics.router)
+
+    app.get("/")(root)
+
+    if QUERY_BUDGET_ENFORCE and routes_without_budget(app):
+        raise RuntimeError(f"Routes without a query budget: {', '.join(routes_without_budget(app))}")
+    return app
+
+
+app = create_app()
@@ -0,0 +1,119 @@
+"""
+Maintenance commands.
+
+Usage:
+    python -m app.manage migrate [--revision REV]
+    python -m app.manage rebuild-rollups [--user-id ID]
+    python -m app.manage rebuild-checkpoints [--user-id ID]
+    python -m app.manage load-fx-rates FILE
+    python -m app.manage check-query-plans [--verbose]
+    python -m app.manage materialize-recurring
+"""
+import argparse
+import os
+import sys
+
+from .database import get_engines
+from .utils.balance_utils import rebuild_balance_checkpoints
+from .utils.fx_utils import load_fx_rates, read_fx_rates_csv
+from .utils.query_plan_utils import collect_query_plans
+from .utils.recurring_utils import materialize_due_rules
+from .utils.rollup_utils import rebuild_rollups
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _migrate(args):
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(os.path.join(PROJECT_ROOT, "alembic.ini"))
+    command.upgrade(config, args.revision)
+
+
+def _rebuild_rollups(args):
+    db = get_engines().SessionLocal()
+    try:
+        rebuild_rollups(db, args.user_id)
+    finally:
+        db.close()
+    print("Rollups rebuilt" + (f" for user {args.user_id}" if args.user_id is not None else ""))
+
+
+def _rebuild_checkpoints(args):
+    db = get_engines().SessionLocal()
+    try:
+        rebuild_balance_checkpoints(db, args.user_id)
+    finally:
+        db.close()
+    print("Balance checkpoints rebuilt" + (f" for user {args.user_id}" if args.user_id is not None else ""))
+
+
+def _load_fx_rates(args):
+    db = get_engines().SessionLocal()
+    try:
+        with open(args.file, "rb") as stream:
+            loaded = load_fx_rates(db, read_fx_rates_csv(stream))
+    except ValueError as exc:
+        sys.exit(f"{args.file}: {exc}")
+    finally:
+        db.close()
+    print(f"{loaded} FX rates loaded")
+
+
+def _materialize_recurring(args):
+    db = get_engines().SessionLocal()
+    try:
+        created = materialize_due_rules(db)
+    finally:
+        db.close()
+    print(f"{created} recurring entries created")
+
+
+def _check_query_plans(args):
+    plans = collect_query_plans()
+    regressions = [plan for plan in plans if plan["full_scans"]]
+    for plan in plans:
+        if args.verbose or plan["full_scans"]:
+            print(f"{plan['label']}: {' / '.join(plan['plan']) or 'no table access'}")
+            if plan["full_scans"]:
+                print(f"  FULL SCAN of {', '.join(plan['full_scans'])} in: {' '.join(plan['statement'].split())}")
+    print(f"{len(plans)} statements checked, {len(regressions)} with full table scans")
+    if regressions:
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.manage", description="Home Budget maintenance commands.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate", help="Create the schema or upgrade it to the latest revision (alembic upgrade).")
+    migrate.add_argument("--revision", default="head", help="Revision to upgrade to (default: head).")
+    migrate.set_defaults(handler=_migrate)
+
+    rollups = commands.add_parser("rebuild-rollups", help="Regenerate the monthly rollups from the raw expenses and incomes.")
+    rollups.add_argument("--user-id", type=int, default=None, help="Only rebuild this user's rollups.")
+    rollups.set_defaults(handler=_rebuild_rollups)
+
+    checkpoints = commands.add_parser("rebuild-checkpoints", help="Regenerate the monthly balance checkpoints from the raw expenses and incomes.")
+    checkpoints.add_argument("--user-id", type=int, default=None, help="Only rebuild this user's checkpoints.")
+    checkpoints.set_defaults(handler=_rebuild_checkpoints)
+
+    fx_rates = commands.add_parser("load-fx-rates", help="Load FX rates from a CSV file (date,currency,rate rows, or an ECB-style table with one column per currency).")
+    fx_rates.add_argument("file", help="Path of the rates file.")
+    fx_rates.set_defaults(handler=_load_fx_rates)
+
+    recurring = commands.add_parser("materialize-recurring", help="Create the entries of every due recurring rule once, without the background scheduler.")
+    recurring.set_defaults(handler=_materialize_recurring)
+
+    plans = commands.add_parser("check-query-plans", help="Run the util queries on a scratch SQLite database and fail if any plan scans a whole table.")
+    plans.add_argument("--verbose", action="store_true", help="Print the plan of every statement, not only the failing ones.")
+    plans.set_defaults(handler=_check_query_plans)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
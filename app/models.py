@@ -1,10 +1,34 @@
-from sqlalchemy import Column, Integer, String, Numeric, ForeignKey, DateTime
+from sqlalchemy import BigInteger, Column, Integer, String, Numeric, ForeignKey, Date, DateTime, Index, UniqueConstraint, text
 from sqlalchemy.orm import relationship
+from sqlalchemy.types import TypeDecorator
 from datetime import datetime
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
 
 from .database import Base
-from .utils.constants import INITIAL_BALANCE
+from .utils.constants import DEFAULT_BASE_CURRENCY, INITIAL_BALANCE
+from .utils.search_utils import install_search_index
+
+
+class Cents(TypeDecorator):
+    """
+    Money amount stored as an integer number of cents, read and written as a Decimal with two places.
+    Sums, comparisons and arithmetic run on the integers inside the database, so totals are exact on
+    every dialect; a Decimal is only built for each value a statement returns. Python values bound
+    against a Cents column or expression (e.g. `Expense.amount >= 10`) are converted to cents too.
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return int((Decimal(str(value)) * 100).to_integral_value(ROUND_HALF_UP))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        # aggregates of converted amounts may come back as floats or Decimals (e.g. ROUND on SQLite)
+        return Decimal(value if isinstance(value, int) else round(value)).scaleb(-2)
 
 
 class User(Base):
@@ -16,12 +40,16 @@ class User(Base):
     :param email: User's email address (max 254 chars).
     :param password_hash: Hashed password.
     :param balance: User's account balance.
+    :param base_currency: ISO 4217 code of the currency balances and summaries are reported in.
+    :param data_version: Counter bumped by every write to the user's categories, expenses or incomes.
     """
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String(30), unique=True, index=True, nullable=False)
     email = Column(String(254), unique=True, index=True, nullable=False)
     password_hash = Column(String(128), nullable=False)
-    balance = Column(Numeric(12, 2), default=Decimal(str(INITIAL_BALANCE)))
+    balance = Column(Cents, default=Decimal(str(INITIAL_BALANCE)))
+    base_currency = Column(String(3), nullable=False, default=DEFAULT_BASE_CURRENCY, server_default=DEFAULT_BASE_CURRENCY)
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     # relationships
     categories = relationship("Category", back_populates="owner")
@@ -38,6 +66,10 @@ class Category(Base):
     :param description: Optional longer description.
     :param user_id: Foreign key, to reference user's category.
     """
+    __table_args__ = (
+        Index("ix_categories_user_name", "user_id", "name"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), index=True, nullable=False)
     description = Column(String(500), nullable=True)
@@ -55,17 +87,27 @@ class Expense(Base):
     :param id: Primary key, expense ID.
     :param title: Short title for the expense (max 150 chars).
     :param amount: Expense amount.
+    :param currency: ISO 4217 code of the amount; None for the owner's base currency.
+    :param base_amount: The amount in the owner's base currency, converted when the expense is written and read
+        by every total; NULL only for entries in a currency without a rate when the column was added.
     :param description: Optional description (max 500 chars).
     :param date: Timestamp when the expense occurred; defaults to UTC now.
     :param category_id: Foreign key to Category (category of expense).
     :param user_id: Foreign key to User (owner of the expense).
     """
+    __table_args__ = (
+        Index("ix_expenses_user_date", "user_id", "date"),
+        Index("ix_expenses_user_category_date", "user_id", "category_id", "date"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(150), nullable=False)
-    amount = Column(Numeric(12, 2), nullable=False)
+    amount = Column(Cents, nullable=False)
+    currency = Column(String(3), nullable=True)
+    base_amount = Column(Cents, nullable=True)
     description = Column(String(500), nullable=True)
     date = Column(DateTime, default=datetime.utcnow)
-    category_id = Column(Integer, ForeignKey("categories.id"))
+    category_id = Column(Integer, ForeignKey("categories.id"), index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
 
     # relationships
@@ -73,6 +115,9 @@ class Expense(Base):
     category = relationship("Category", back_populates="expenses")
 
 
+install_search_index(Expense.__table__)
+
+
 class Income(Base):
     __tablename__ = "incomes"
     """
@@ -80,17 +125,176 @@ class Income(Base):
     :param id: Primary key, income ID.
     :param title: Short title for the income (max 150 chars).
     :param amount: Income amount.
+    :param currency: ISO 4217 code of the amount; None for the owner's base currency.
+    :param base_amount: The amount in the owner's base currency, converted when the income is written and read
+        by every total; NULL only for entries in a currency without a rate when the column was added.
     :param description: Optional description (max 500 chars).
     :param date: Timestamp when the income occurred; defaults to UTC now.
     :param user_id: Foreign key to User (owner of the income).
     """
+    __table_args__ = (
+        Index("ix_incomes_user_date", "user_id", "date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
-    amount = Column(Numeric(12, 2), nullable=False)
+    amount = Column(Cents, nullable=False)
+    currency = Column(String(3), nullable=True)
+    base_amount = Column(Cents, nullable=True)
     description = Column(String, nullable=True)
     date = Column(DateTime, default=datetime.utcnow)
     user_id = Column(Integer, ForeignKey("users.id"))
 
     # relationships
     user = relationship("User", back_populates="incomes")
+
+
+install_search_index(Income.__table__)
+
+
+class ExpenseRollup(Base):
+    __tablename__ = "expense_rollups"
+    """
+    Pre-aggregated monthly expense totals, kept up to date by the expense write utils.
+    :param id: Primary key, rollup row ID.
+    :param user_id: Foreign key to User (owner of the expenses).
+    :param category_id: Foreign key to Category (category of the expenses); None for the user's uncategorized expenses.
+    :param period: Month of the expenses in YYYY-MM format.
+    :param total: Sum of the expense amounts in the month, in the owner's base currency.
+    :param entry_count: Number of expenses in the month.
+    """
+    __table_args__ = (
+        UniqueConstraint("user_id", "category_id", "period", name="uq_expense_rollups_user_category_period"),
+        # NULLs never conflict in the constraint above: the uncategorized rollups get their own unique index
+        Index("uq_expense_rollups_user_period_uncategorized", "user_id", "period", unique=True,
+              sqlite_where=text("category_id IS NULL"), postgresql_where=text("category_id IS NULL")),
+        Index("ix_expense_rollups_user_period", "user_id", "period"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
+    period = Column(String(7), nullable=False)
+    total = Column(Cents, nullable=False, default=0)
+    entry_count = Column(Integer, nullable=False, default=0)
+
+
+class IncomeRollup(Base):
+    __tablename__ = "income_rollups"
+    """
+    Pre-aggregated monthly income totals, kept up to date by the income write utils.
+    :param id: Primary key, rollup row ID.
+    :param user_id: Foreign key to User (owner of the incomes).
+    :param period: Month of the incomes in YYYY-MM format.
+    :param total: Sum of the income amounts in the month, in the owner's base currency.
+    :param entry_count: Number of incomes in the month.
+    """
+    __table_args__ = (
+        UniqueConstraint("user_id", "period", name="uq_income_rollups_user_period"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    period = Column(String(7), nullable=False)
+    total = Column(Cents, nullable=False, default=0)
+    entry_count = Column(Integer, nullable=False, default=0)
+
+
+class BalanceCheckpoint(Base):
+    __tablename__ = "balance_checkpoints"
+    """
+    Running balance movement of a user at the close of a month, kept up to date by the write utils.
+    :param id: Primary key, checkpoint ID.
+    :param user_id: Foreign key to User (owner of the ledger).
+    :param period: Month the checkpoint closes, in YYYY-MM format.
+    :param net: Sum of all incomes minus all expenses dated up to the end of the month, in the owner's base currency.
+    """
+    __table_args__ = (
+        UniqueConstraint("user_id", "period", name="uq_balance_checkpoints_user_period"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    period = Column(String(7), nullable=False)
+    net = Column(Cents, nullable=False, default=0)
+
+
+class RecurringRule(Base):
+    __tablename__ = "recurring_rules"
+    """
+    A repeating expense or income, materialized into expenses/incomes by the recurring scheduler.
+    Occurrence n falls `interval` * n frequency periods after start_date (months are clamped to their last day).
+    :param id: Primary key, rule ID.
+    :param user_id: Foreign key to User (owner of the rule).
+    :param kind: "expense" or "income".
+    :param title: Title of the created entries (max 150 chars).
+    :param amount: Amount of the created entries.
+    :param currency: ISO 4217 code of the amount; None for the owner's base currency.
+    :param description: Optional description of the created entries (max 500 chars).
+    :param category_id: Foreign key to Category; required for expense rules.
+    :param frequency: Period unit: day, week, month, quarter or year.
+    :param interval: Number of frequency periods between occurrences.
+    :param start_date: Timestamp of the first occurrence.
+    :param end_date: Optional timestamp after which no occurrence is created.
+    :param occurrences: Number of occurrences materialized so far.
+    :param next_run: Timestamp of the next occurrence to materialize; None once the rule has ended.
+    """
+    __table_args__ = (
+        Index("ix_recurring_rules_next_run", "next_run"),
+        Index("ix_recurring_rules_user_id", "user_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String(7), nullable=False)
+    title = Column(String(150), nullable=False)
+    amount = Column(Cents, nullable=False)
+    currency = Column(String(3), nullable=True)
+    description = Column(String(500), nullable=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
+    frequency = Column(String(7), nullable=False)
+    interval = Column(Integer, nullable=False, default=1)
+    start_date = Column(DateTime, nullable=False)
+    end_date = Column(DateTime, nullable=True)
+    occurrences = Column(Integer, nullable=False, default=0)
+    next_run = Column(DateTime, nullable=True)
+
+
+class CategoryBudget(Base):
+    __tablename__ = "category_budgets"
+    """
+    Monthly spending limit of a category; the month's spend is read from its expense rollup.
+    :param id: Primary key, budget ID.
+    :param user_id: Foreign key to User (owner of the category).
+    :param category_id: Foreign key to Category; a category has at most one budget.
+    :param monthly_limit: Most the user means to spend in the category per month, in the owner's base currency.
+    """
+    __table_args__ = (
+        UniqueConstraint("category_id", name="uq_category_budgets_category"),
+        Index("ix_category_budgets_user_id", "user_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
+    monthly_limit = Column(Cents, nullable=False)
+
+
+class FxRate(Base):
+    __tablename__ = "fx_rates"
+    """
+    Exchange rate of a currency on a day, loaded from a rates file (python -m app.manage load-fx-rates).
+    An amount dated d converts with the latest rates on or before d.
+    :param id: Primary key, rate ID.
+    :param currency: ISO 4217 code of the quoted currency.
+    :param date: Day the rate applies from.
+    :param rate: Units of the currency worth one unit of FX_REFERENCE_CURRENCY.
+    """
+    __table_args__ = (
+        UniqueConstraint("currency", "date", name="uq_fx_rates_currency_date"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    currency = Column(String(3), nullable=False)
+    date = Column(Date, nullable=False)
+    rate = Column(Numeric(18, 8), nullable=False)
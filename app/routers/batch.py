@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends
+
+from .. import schemas
+from ..database import AnySession, get_session
+from ..utils.auth import Principal, get_current_user
+from ..utils.batch_utils import apply_batch_async
+from ..utils.constants import BATCH_MAX_OPERATIONS
+from ..utils.query_budget_utils import query_budget
+
+router = APIRouter(prefix="/batch", tags=["Batch"])
+
+
+# the auth lookup, three prefetch queries, nine for the derived data and budget check, four for currency
+# conversion, six for deleted categories (see delete_categories), two batched deletes, three to read the
+# saved records back, plus one per operation: the flush inserts (returning ids) and updates row by row
+@router.post("/", response_model=schemas.BatchReport)
+@query_budget(28 + BATCH_MAX_OPERATIONS)
+async def apply_batch_operations(batch: schemas.BatchRequest, db: AnySession = Depends(get_session),
+                                 current_user: Principal = Depends(get_current_user)):
+    """
+    Create, update and delete expenses, incomes and categories in one transaction.
+    Each operation's data takes the body of the matching single-record endpoint. The results list
+    the status those endpoints would have answered; failed operations are skipped, or roll back the
+    whole batch when atomic is set.
+    """
+    return await apply_batch_async(db, current_user.id, batch.operations, batch.atomic)
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, Query, status
+from typing import List, Optional
+
+from .. import schemas
+from ..database import AnySession, get_session
+from ..utils.auth import Principal, get_current_user
+from ..utils.budget_utils import set_category_budget_async, delete_category_budget_async, get_budget_status_async
+from ..utils.query_budget_utils import query_budget
+
+router = APIRouter(prefix="/budgets", tags=["Budgets"])
+
+
+@router.get("/", response_model=List[schemas.BudgetStatus])
+@query_budget(2)
+async def get_budget_status(period: Optional[str] = Query(None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$"),
+                            db: AnySession = Depends(get_session),
+                            current_user: Principal = Depends(get_current_user)):
+    """Get the spend of every budgeted category in a month (YYYY-MM, default: the current month)."""
+    return await get_budget_status_async(db, current_user.id, period)
+
+@router.put("/{category_id}", response_model=schemas.CategoryBudgetOut)
+@query_budget(4)
+async def set_category_budget(category_id: int, budget: schemas.CategoryBudgetSet,
+                              db: AnySession = Depends(get_session),
+                              current_user: Principal = Depends(get_current_user)):
+    """Set the monthly budget of a category, replacing any previous one."""
+    return await set_category_budget_async(db, category_id, current_user.id, budget.monthly_limit)
+
+@router.delete("/{category_id}", status_code=status.HTTP_204_NO_CONTENT)
+@query_budget(2)
+async def delete_category_budget(category_id: int, db: AnySession = Depends(get_session),
+                                 current_user: Principal = Depends(get_current_user)):
+    """Remove the monthly budget of a category."""
+    return await delete_category_budget_async(db, category_id, current_user.id)
@@ -1,42 +1,51 @@
 from fastapi import APIRouter, Depends, status
-from sqlalchemy.orm import Session
 from typing import List
 
-from .. import models, schemas
-from ..database import get_db
-from ..utils.auth import get_current_user
-from ..utils.category_utils import create_category_in_db, get_category_for_user, get_categories_for_user, update_category_in_db, delete_category_in_db
+from .. import schemas
+from ..database import AnySession, get_session
+from ..utils.auth import Principal, get_current_user
+from ..utils.category_utils import create_category_in_db_async, get_category_for_user_async, get_categories_for_user_async, update_category_in_db_async, delete_category_in_db_async
+from ..utils.version_utils import VersionedResponse, versioned_response
+from ..utils.query_budget_utils import query_budget
 
 router = APIRouter(prefix="/categories", tags=["Categories"])
 
 
 @router.post("/", response_model=schemas.CategoryOut)
-def create_category(category: schemas.CategoryCreate, db: Session = Depends(get_db),
-                    current_user: models.User = Depends(get_current_user)):
+@query_budget(5)
+async def create_category(category: schemas.CategoryCreate, db: AnySession = Depends(get_session),
+                          current_user: Principal = Depends(get_current_user)):
     """Create a new expense category."""
-    return create_category_in_db(db, category.name, category.description, current_user.id)
+    return await create_category_in_db_async(db, category.name, category.description, current_user.id)
 
 @router.get("/", response_model=List[schemas.CategoryOut])
-def get_categories(db: Session = Depends(get_db),
-                   current_user: models.User = Depends(get_current_user)):
-    """Get user's categories."""
-    return get_categories_for_user(db, current_user.id)
+@query_budget(3)
+async def get_categories(db: AnySession = Depends(get_session),
+                         current_user: Principal = Depends(get_current_user),
+                         versioned: VersionedResponse = Depends(versioned_response)):
+    """Get user's categories. Answers 304 to a matching If-None-Match."""
+    if versioned.not_modified:
+        return versioned.not_modified_response()
+    return await get_categories_for_user_async(db, current_user.id)
 
 @router.get("/{category_id}", response_model=schemas.CategoryOut)
-def get_category(category_id: int, db: Session = Depends(get_db),
-                 current_user: models.User = Depends(get_current_user)):
+@query_budget(2)
+async def get_category(category_id: int, db: AnySession = Depends(get_session),
+                       current_user: Principal = Depends(get_current_user)):
     """Get user's category by ID."""
-    return get_category_for_user(db, category_id, current_user.id)
+    return await get_category_for_user_async(db, category_id, current_user.id)
 
 @router.put("/{category_id}", response_model=schemas.CategoryOut)
-def update_category(category_id: int, category_data: schemas.CategoryCreate,
-                    db: Session = Depends(get_db),
-                    current_user: models.User = Depends(get_current_user)):
+@query_budget(5)
+async def update_category(category_id: int, category_data: schemas.CategoryCreate,
+                          db: AnySession = Depends(get_session),
+                          current_user: Principal = Depends(get_current_user)):
     """Update an existing category."""
-    return update_category_in_db(db, category_id, current_user.id, category_data.name, category_data.description)
+    return await update_category_in_db_async(db, category_id, current_user.id, category_data.name, category_data.description)
 
 @router.delete("/{category_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_category(category_id: int, db: Session = Depends(get_db),
-                    current_user: models.User = Depends(get_current_user)):
+@query_budget(9)
+async def delete_category(category_id: int, db: AnySession = Depends(get_session),
+                          current_user: Principal = Depends(get_current_user)):
     """Delete a category."""
-    return delete_category_in_db(db, category_id, current_user.id)
+    return await delete_category_in_db_async(db, category_id, current_user.id)
@@ -1,60 +1,138 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, File, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from typing import Optional, List
+from typing import List, Optional
 from fastapi import Query, status
 
-from .. import models, schemas
-from ..database import get_db
-from ..utils.auth import get_current_user
+from .. import schemas
+from ..database import AnySession, get_db, get_session
+from ..utils.auth import Principal, get_current_user
+from ..utils.budget_utils import pop_budget_alerts
+from ..utils.constants import MAX_PAGE_SIZE
+from ..utils.import_utils import read_import_rows
+from ..utils.pagination_utils import next_cursor, next_offset_cursor
+from ..utils.version_utils import VersionedResponse, versioned_response
 
-from ..utils.expense_utils import create_expense_in_db, get_expenses_for_user, update_expense_in_db, delete_expense_in_db, get_expense_summary_util
+from ..utils.expense_utils import create_expense_in_db_async, import_expenses_in_db, get_expenses_for_user_async, stream_expenses_for_user, update_expense_in_db_async, delete_expense_in_db_async, get_expense_summary_util_async
+from ..utils.query_budget_utils import query_budget
 
 
 router = APIRouter(prefix="/expenses", tags=["Expenses"])
 
+
+def _set_budget_alert_header(response: Response, db: AnySession):
+    alerts = pop_budget_alerts(db)
+    if alerts:
+        response.headers["X-Budget-Exceeded"] = ",".join(str(alert["category_id"]) for alert in alerts)
+
 # Example POST /expenses/
 @router.post("/", response_model=schemas.ExpenseOut)
-def create_expense(expense: schemas.ExpenseCreate,
-                   db: Session = Depends(get_db),
-                   current_user: models.User = Depends(get_current_user)):
-    """Create a new expense for the current user."""
-    return create_expense_in_db(db, expense.title, expense.amount, expense.description, expense.date, expense.category_id, current_user.id)
+@query_budget(11)
+async def create_expense(expense: schemas.ExpenseCreate,
+                         response: Response,
+                         db: AnySession = Depends(get_session),
+                         current_user: Principal = Depends(get_current_user)):
+    """
+    Create a new expense for the current user.
+    When it takes its category over the monthly budget, the category ID is sent in the X-Budget-Exceeded header.
+    """
+    created = await create_expense_in_db_async(db, expense.title, expense.amount, expense.description, expense.date, expense.category_id, current_user.id,
+                                               expense.currency)
+    _set_budget_alert_header(response, db)
+    return created
+
+
+# the auth, category and base currency lookups; each chunk of IMPORT_CHUNK_SIZE rows extends the budget by the
+# statements it may run
+@router.post("/import", response_model=schemas.ImportReport)
+@query_budget(3)
+def import_expenses(file: UploadFile = File(...),
+                    format: str = Query("csv", enum=["csv", "ofx"]),
+                    category_id: Optional[int] = Query(None),
+                    db: Session = Depends(get_db),
+                    current_user: Principal = Depends(get_current_user)):
+    """
+    Bulk-create expenses from a CSV (title, amount, currency, description, date, category or category_id columns)
+    or OFX bank export. category_id is used for rows without a category.
+    Parsing and validation are CPU bound, so this route runs on the threadpool with a sync session.
+    """
+    rows = read_import_rows(file.file, format, "expense")
+    return import_expenses_in_db(db, current_user.id, rows, category_id)
 
 
 @router.get("/", response_model=List[schemas.ExpenseOut])
-def get_expenses(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+@query_budget(3)
+async def get_expenses(
+    response: Response,
+    db: AnySession = Depends(get_session),
+    current_user: Principal = Depends(get_current_user),
     category_id: Optional[int] = Query(None),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
     min_amount: Optional[float] = Query(None),
-    max_amount: Optional[float] = Query(None)
+    max_amount: Optional[float] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    q: Optional[str] = Query(None, min_length=1, max_length=200),
+    format: str = Query("json", enum=["json", "ndjson"]),
+    versioned: VersionedResponse = Depends(versioned_response)
 ):
-    """Get an existing expense."""
-    return get_expenses_for_user(db, current_user.id, category_id, start_date, end_date, min_amount, max_amount)
+    """
+    Get user's expenses ordered by date.
+    With limit, one page is returned and the next page's cursor is sent in the X-Next-Cursor header.
+    With q, only the expenses whose title or description contain every word (or a word starting with it)
+    are returned, best match first.
+    With format=ndjson, the expenses are streamed one JSON object per line.
+    Answers 304 to a matching If-None-Match.
+    """
+    if versioned.not_modified:
+        return versioned.not_modified_response()
+    if format == "ndjson":
+        rows = stream_expenses_for_user(db, current_user.id, category_id, start_date, end_date, min_amount, max_amount, cursor, limit, q)
+        return StreamingResponse(rows, media_type="application/x-ndjson", headers=versioned.headers)
+
+    expenses = await get_expenses_for_user_async(db, current_user.id, category_id, start_date, end_date, min_amount, max_amount, cursor, limit, q)
+    cursor_after = next_offset_cursor(cursor, expenses, limit) if q is not None else next_cursor(expenses, limit)
+    if cursor_after is not None:
+        response.headers["X-Next-Cursor"] = cursor_after
+    return expenses
 
 @router.put("/{expense_id}", response_model=schemas.ExpenseOut)
-def update_expense(expense_id: int, expense_data: schemas.ExpenseCreate,
-                   db: Session = Depends(get_db),
-                   current_user: models.User = Depends(get_current_user)):
-    """Update an existing expense."""
-    return update_expense_in_db(db, expense_id, current_user.id, expense_data.title, expense_data.amount, expense_data.description, expense_data.date, expense_data.category_id)
+@query_budget(11)
+async def update_expense(expense_id: int, expense_data: schemas.ExpenseCreate,
+                         response: Response,
+                         db: AnySession = Depends(get_session),
+                         current_user: Principal = Depends(get_current_user)):
+    """
+    Update an existing expense.
+    When it takes its category over the monthly budget, the category ID is sent in the X-Budget-Exceeded header.
+    """
+    updated = await update_expense_in_db_async(db, expense_id, current_user.id, expense_data.title, expense_data.amount, expense_data.description, expense_data.date, expense_data.category_id,
+                                               expense_data.currency)
+    _set_budget_alert_header(response, db)
+    return updated
 
 @router.delete("/{expense_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_expense(expense_id: int,
-                   db: Session = Depends(get_db),
-                   current_user: models.User = Depends(get_current_user)):
+@query_budget(9)
+async def delete_expense(expense_id: int,
+                         db: AnySession = Depends(get_session),
+                         current_user: Principal = Depends(get_current_user)):
     """Delete an existing expense."""
-    return delete_expense_in_db(db, expense_id, current_user.id)
+    return await delete_expense_in_db_async(db, expense_id, current_user.id)
 
 @router.get("/summary")
-def get_expense_summary(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
-    period: str = Query("month", enum=["month", "quarter", "year"])
+@query_budget(4)
+async def get_expense_summary(
+    db: AnySession = Depends(get_session),
+    current_user: Principal = Depends(get_current_user),
+    period: str = Query("month", enum=["month", "quarter", "year"]),
+    versioned: VersionedResponse = Depends(versioned_response)
 ):
-    """Get expenses summary."""
-    return get_expense_summary_util(db, current_user.id, period)
\ No newline at end of file
+    """
+    Get expenses summary.
+    Answers 304 to a matching If-None-Match; results are cached per user data version.
+    """
+    if versioned.not_modified:
+        return versioned.not_modified_response()
+    return await versioned.cached(lambda: get_expense_summary_util_async(db, current_user.id, period))
\ No newline at end of file
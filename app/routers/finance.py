@@ -1,16 +1,98 @@
+from datetime import datetime
+from typing import Optional
+
 from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from ..database import get_db
-from ..utils.auth import get_current_user
-from ..utils.summary_utils import get_financial_summary
+from ..database import AnySession, get_db, get_session
+from ..utils.auth import Principal, get_current_user
+from ..utils.export_utils import EXPORT_MEDIA_TYPES, export_ledger, ledger_statement
+from ..utils.period_utils import GRANULARITIES
+from ..utils.constants import ANALYTICS_MAX_BUCKETS
+from ..utils.summary_utils import get_financial_summary_async, get_financial_timeseries_async
+from ..utils.version_utils import VersionedResponse, versioned_response
+from ..utils.query_budget_utils import query_budget
 
 router = APIRouter(prefix="/finance", tags=["Finance"])
 
 @router.get("/summary")
-def financial_summary(
+@query_budget(4)
+async def financial_summary(
     period: str = Query("month", enum=["month", "quarter", "year"]),
+    db: AnySession = Depends(get_session),
+    current_user: Principal = Depends(get_current_user),
+    versioned: VersionedResponse = Depends(versioned_response)
+):
+    """
+    Get financial summary.
+    Answers 304 to a matching If-None-Match; results are cached per user data version.
+    """
+    if versioned.not_modified:
+        return versioned.not_modified_response()
+    return await versioned.cached(lambda: get_financial_summary_async(db, current_user.id, period))
+
+@router.get("/timeseries")
+@query_budget(3)
+async def financial_timeseries(
+    granularity: str = Query("month", enum=list(GRANULARITIES)),
+    periods: int = Query(12, ge=1, le=ANALYTICS_MAX_BUCKETS),
+    db: AnySession = Depends(get_session),
+    current_user: Principal = Depends(get_current_user),
+    versioned: VersionedResponse = Depends(versioned_response)
+):
+    """
+    Get income, expense, net and closing balance for each of the last `periods` periods.
+    Answers 304 to a matching If-None-Match; results are cached per user data version.
+    """
+    if versioned.not_modified:
+        return versioned.not_modified_response()
+    return await versioned.cached(lambda: get_financial_timeseries_async(db, current_user.id, granularity, periods))
+
+@router.get("/analytics")
+@query_budget(6)
+async def analytics(
+    kind: str = Query("expenses", enum=["expenses", "incomes", "net"]),
+    granularity: str = Query("month", enum=list(GRANULARITIES)),
+    start_date: Optional[datetime] = Query(None),
+    end_date: Optional[datetime] = Query(None),
+    group_by: Optional[str] = Query(None, enum=["category"]),
+    db: AnySession = Depends(get_session),
+    current_user: Principal = Depends(get_current_user),
+    versioned: VersionedResponse = Depends(versioned_response)
+):
+    """
+    Bucket expenses, incomes or net flow by day, week, month, quarter or year over any window,
+    optionally pivoting expenses by category. Computed from the user's ledger held in memory.
+    Answers 304 to a matching If-None-Match.
+    """
+    if versioned.not_modified:
+        return versioned.not_modified_response()
+    # NumPy is loaded by the first analytics request rather than at startup
+    from ..utils.analytics_utils import analyze_ledger_async
+
+    return await analyze_ledger_async(db, current_user.id, kind, granularity, start_date, end_date, group_by,
+                                      version=versioned.version)
+
+@router.get("/export")
+@query_budget(2)
+def export(
+    format: str = Query("csv", enum=["csv", "ndjson", "parquet"]),
+    kind: str = Query("all", enum=["all", "expenses", "incomes"]),
+    category_id: Optional[int] = Query(None),
+    start_date: Optional[datetime] = Query(None),
+    end_date: Optional[datetime] = Query(None),
+    min_amount: Optional[float] = Query(None),
+    max_amount: Optional[float] = Query(None),
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    """Get financial summary."""
-    return get_financial_summary(db, current_user.id, period)
+    """
+    Stream the user's ledger (expenses with category names and incomes) as CSV, NDJSON or Parquet.
+    The export reads a server-side cursor from the threadpool with a sync session.
+    """
+    statement = ledger_statement(current_user.id, kind, category_id, start_date, end_date, min_amount, max_amount)
+    return StreamingResponse(
+        export_ledger(db, format, statement),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="ledger.{format}"'},
+    )
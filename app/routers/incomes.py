@@ -1,59 +1,116 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, File, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from typing import Optional, List
+from typing import List, Optional
 from fastapi import Query, status
 
-from .. import models, schemas
-from ..database import get_db
-from ..utils.auth import get_current_user
+from .. import schemas
+from ..database import AnySession, get_db, get_session
+from ..utils.auth import Principal, get_current_user
+from ..utils.constants import MAX_PAGE_SIZE
+from ..utils.import_utils import read_import_rows
+from ..utils.pagination_utils import next_cursor, next_offset_cursor
+from ..utils.version_utils import VersionedResponse, versioned_response
 
-from ..utils.income_utils import create_income_in_db, get_incomes_for_user, update_income_in_db, delete_income_in_db, get_income_summary_util
+from ..utils.income_utils import create_income_in_db_async, import_incomes_in_db, get_incomes_for_user_async, stream_incomes_for_user, update_income_in_db_async, delete_income_in_db_async, get_income_summary_util_async
+from ..utils.query_budget_utils import query_budget
 
 
 router = APIRouter(prefix="/incomes", tags=["Incomes"])
 
 # Example POST /incomes/
 @router.post("/", response_model=schemas.IncomeOut)
-def create_income(income: schemas.IncomeCreate,
-                   db: Session = Depends(get_db),
-                   current_user: models.User = Depends(get_current_user)):
+@query_budget(9)
+async def create_income(income: schemas.IncomeCreate,
+                         db: AnySession = Depends(get_session),
+                         current_user: Principal = Depends(get_current_user)):
     """Create a new income for the current user."""
-    return create_income_in_db(db, income.title, income.amount, income.description, income.date,current_user.id)
+    return await create_income_in_db_async(db, income.title, income.amount, income.description, income.date, current_user.id, income.currency)
+
+
+# the auth and base currency lookups; each chunk of IMPORT_CHUNK_SIZE rows extends the budget by the statements
+# it may run
+@router.post("/import", response_model=schemas.ImportReport)
+@query_budget(2)
+def import_incomes(file: UploadFile = File(...),
+                   format: str = Query("csv", enum=["csv", "ofx"]),
+                   db: Session = Depends(get_db),
+                   current_user: Principal = Depends(get_current_user)):
+    """
+    Bulk-create incomes for the current user from a CSV (title, amount, currency, description, date columns)
+    or OFX bank export.
+    Parsing and validation are CPU bound, so this route runs on the threadpool with a sync session.
+    """
+    rows = read_import_rows(file.file, format, "income")
+    return import_incomes_in_db(db, current_user.id, rows)
 
 
 @router.get("/", response_model=List[schemas.IncomeOut])
-def get_incomes(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+@query_budget(3)
+async def get_incomes(
+    response: Response,
+    db: AnySession = Depends(get_session),
+    current_user: Principal = Depends(get_current_user),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
     min_amount: Optional[float] = Query(None),
-    max_amount: Optional[float] = Query(None)
+    max_amount: Optional[float] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    q: Optional[str] = Query(None, min_length=1, max_length=200),
+    format: str = Query("json", enum=["json", "ndjson"]),
+    versioned: VersionedResponse = Depends(versioned_response)
 ):
-    """Get incomes for the current user."""
-    return get_incomes_for_user(db, current_user.id, start_date, end_date, min_amount, max_amount)
+    """
+    Get incomes for the current user ordered by date.
+    With limit, one page is returned and the next page's cursor is sent in the X-Next-Cursor header.
+    With q, only the incomes whose title or description contain every word (or a word starting with it)
+    are returned, best match first.
+    With format=ndjson, the incomes are streamed one JSON object per line.
+    Answers 304 to a matching If-None-Match.
+    """
+    if versioned.not_modified:
+        return versioned.not_modified_response()
+    if format == "ndjson":
+        rows = stream_incomes_for_user(db, current_user.id, start_date, end_date, min_amount, max_amount, cursor, limit, q)
+        return StreamingResponse(rows, media_type="application/x-ndjson", headers=versioned.headers)
+
+    incomes = await get_incomes_for_user_async(db, current_user.id, start_date, end_date, min_amount, max_amount, cursor, limit, q)
+    cursor_after = next_offset_cursor(cursor, incomes, limit) if q is not None else next_cursor(incomes, limit)
+    if cursor_after is not None:
+        response.headers["X-Next-Cursor"] = cursor_after
+    return incomes
 
 @router.put("/{income_id}", response_model=schemas.IncomeOut)
-def update_income(income_id: int, income_data: schemas.IncomeCreate,
-                   db: Session = Depends(get_db),
-                   current_user: models.User = Depends(get_current_user)):
+@query_budget(10)
+async def update_income(income_id: int, income_data: schemas.IncomeCreate,
+                         db: AnySession = Depends(get_session),
+                         current_user: Principal = Depends(get_current_user)):
     """Update an existing income for the current user."""
-    return update_income_in_db(db, income_id, current_user.id, income_data.title, income_data.amount, income_data.description, income_data.date)
+    return await update_income_in_db_async(db, income_id, current_user.id, income_data.title, income_data.amount, income_data.description, income_data.date,
+                                           income_data.currency)
 
 @router.delete("/{income_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_income(income_id: int,
-                   db: Session = Depends(get_db),
-                   current_user: models.User = Depends(get_current_user)):
+@query_budget(9)
+async def delete_income(income_id: int,
+                         db: AnySession = Depends(get_session),
+                         current_user: Principal = Depends(get_current_user)):
     """Delete an existing income for the current user."""
-    return delete_income_in_db(db, income_id, current_user.id)
+    return await delete_income_in_db_async(db, income_id, current_user.id)
 
 @router.get("/summary")
-def get_income_summary(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
-    period: str = Query("month", enum=["month", "quarter", "year"])
+@query_budget(3)
+async def get_income_summary(
+    db: AnySession = Depends(get_session),
+    current_user: Principal = Depends(get_current_user),
+    period: str = Query("month", enum=["month", "quarter", "year"]),
+    versioned: VersionedResponse = Depends(versioned_response)
 ):
-    """Get income summary for the current user."""
-    return get_income_summary_util(db, current_user.id, period)
\ No newline at end of file
+    """
+    Get income summary for the current user.
+    Answers 304 to a matching If-None-Match; results are cached per user data version.
+    """
+    if versioned.not_modified:
+        return versioned.not_modified_response()
+    return await versioned.cached(lambda: get_income_summary_util_async(db, current_user.id, period))
\ No newline at end of file
@@ -0,0 +1,39 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from ..utils.auth import auth_cache_stats
+from ..utils.fx_utils import fx_cache_stats
+from ..utils.metrics_utils import counter_lines, gauge_lines, render_metrics
+from ..utils.passwords import password_pool_stats
+from ..utils.version_utils import result_cache_stats
+from ..utils.query_budget_utils import query_budget
+
+router = APIRouter(tags=["Monitoring"])
+
+
+def _cache_metrics():
+    # imported here so that NumPy is not loaded at startup
+    from ..utils.analytics_utils import analytics_cache_stats
+
+    caches = {"auth": auth_cache_stats(), "result": result_cache_stats(), "analytics": analytics_cache_stats(), "fx": fx_cache_stats()}
+    yield from gauge_lines("budget_cache_entries", "Entries held by the in-process caches.", "cache",
+                           {name: stats["size"] for name, stats in caches.items()})
+    for counter in ("hits", "misses", "evictions"):
+        yield from counter_lines(f"budget_cache_{counter}_total", f"Cache {counter} since the worker started.", "cache",
+                                 {name: stats[counter] for name, stats in caches.items()})
+
+
+def _password_pool_metrics():
+    stats = password_pool_stats()
+    yield from gauge_lines("budget_password_hashing", "Password hashing pool: running and waiting calls.", "state",
+                           {"running": stats["running"], "waiting": stats["waiting"]})
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+@query_budget(0)
+def metrics():
+    """
+    Request, SQL, pool and cache metrics of this worker in the Prometheus text format.
+    """
+    return PlainTextResponse(render_metrics([_cache_metrics, _password_pool_metrics]),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, status
+from typing import List
+
+from .. import schemas
+from ..database import AnySession, get_session
+from ..utils.auth import Principal, get_current_user
+from ..utils.recurring_utils import create_recurring_rule_in_db_async, get_recurring_rules_for_user_async, delete_recurring_rule_in_db_async
+from ..utils.query_budget_utils import query_budget
+
+router = APIRouter(prefix="/recurring", tags=["Recurring"])
+
+
+# the auth and category lookups, the insert and its refresh, plus the base currency and rate lookups of
+# rules in another currency
+@router.post("/", response_model=schemas.RecurringRuleOut)
+@query_budget(6)
+async def create_recurring_rule(rule: schemas.RecurringRuleCreate, db: AnySession = Depends(get_session),
+                                current_user: Principal = Depends(get_current_user)):
+    """
+    Create a recurring expense or income rule.
+    Its entries are created by the background scheduler, including any already due.
+    """
+    return await create_recurring_rule_in_db_async(db, rule, current_user.id)
+
+@router.get("/", response_model=List[schemas.RecurringRuleOut])
+@query_budget(2)
+async def get_recurring_rules(db: AnySession = Depends(get_session),
+                              current_user: Principal = Depends(get_current_user)):
+    """Get user's recurring rules."""
+    return await get_recurring_rules_for_user_async(db, current_user.id)
+
+@router.delete("/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
+@query_budget(3)
+async def delete_recurring_rule(rule_id: int, db: AnySession = Depends(get_session),
+                                current_user: Principal = Depends(get_current_user)):
+    """Delete a recurring rule. Entries it already created are kept."""
+    return await delete_recurring_rule_in_db_async(db, rule_id, current_user.id)
@@ -1,39 +1,45 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
  
 from ..schemas import UserOut, UserCreate, UserLogin, Token
-from ..database import get_db
-from ..utils.user_utils import get_user_by_username, get_user_by_email, create_user_in_db, authenticate_user, create_token_for_user
-from ..utils.category_utils import create_predefined_categories_for_user
+from ..database import AnySession, get_session, release_connection
+from ..utils.constants import PREDEFINED_CATEGORIES
+from ..utils.passwords import hash_password_async
+from ..utils.user_utils import user_exists_async, create_user_in_db_async, authenticate_user_async, create_token_for_user
+from ..utils.query_budget_utils import query_budget
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 
 @router.post("/register", response_model=UserOut, status_code=status.HTTP_201_CREATED)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+@query_budget(4)
+async def register_user(user: UserCreate, db: AnySession = Depends(get_session)):
     """
     Register a new user.
+    The password is hashed on the password hashing pool, off the request workers; the user and
+    its predefined categories are then created in one transaction.
     """
-    if get_user_by_username(db, user.username) or get_user_by_email(db, user.email):
+    if await user_exists_async(db, user.username, user.email):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username or email already registered")
 
+    await release_connection(db)
+    password_hash = await hash_password_async(user.password)
     try:
-        new_user = create_user_in_db(db, user)
+        new_user = await create_user_in_db_async(db, user, password_hash=password_hash, category_names=PREDEFINED_CATEGORIES)
     except SQLAlchemyError:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create user")
 
-    create_predefined_categories_for_user(db, new_user.id)
-    
     return new_user
 
 
 @router.post("/login", response_model=Token)
-def login_user(form_data: UserLogin, db: Session = Depends(get_db)):
+@query_budget(3)
+async def login_user(form_data: UserLogin, db: AnySession = Depends(get_session)):
     """
     Authenticate a user and return an access token.
+    The password is verified on the password hashing pool, off the request workers.
     """
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user_async(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
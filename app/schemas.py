@@ -1,6 +1,9 @@
 from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
 from decimal import Decimal
+from typing import Literal
+
+from .utils.constants import BATCH_MAX_OPERATIONS, CURRENCY_CODE_PATTERN, DEFAULT_BASE_CURRENCY
 
 # User schemas
 class UserBase(BaseModel):
@@ -16,8 +19,10 @@ class UserCreate(UserBase):
     """
     Input model for creating a user.
     Password is required and constrained to avoid excessively long input.
+    :param base_currency: ISO 4217 code of the currency balances and summaries are reported in.
     """
     password: str = Field(..., min_length=6, max_length=72)
+    base_currency: str = Field(DEFAULT_BASE_CURRENCY, pattern=CURRENCY_CODE_PATTERN)
 
 
 class UserLogin(BaseModel):
@@ -34,9 +39,11 @@ class UserOut(UserBase):
     Does not include the password field.
     :param id: DB ID of the user.
     :param balance: Current user's balance.
+    :param base_currency: Currency of the balance and of the summaries.
     """
     id: int
     balance: Decimal
+    base_currency: str
 
     class Config:
         orm_mode = True
@@ -83,17 +90,69 @@ class CategoryOut(CategoryBase):
     class Config:
         orm_mode = True
 
+# Category budget schemas
+class CategoryBudgetSet(BaseModel):
+    """
+    Input model for setting a category budget.
+    :param monthly_limit: Most the user means to spend in the category per month.
+    """
+    monthly_limit: Decimal = Field(..., gt=0, max_digits=12, decimal_places=2)
+
+class CategoryBudgetOut(CategoryBudgetSet):
+    """
+    Category budget returned by the API.
+    :param category_id: Category the budget applies to.
+    """
+    category_id: int
+
+    class Config:
+        orm_mode = True
+
+class BudgetStatus(BaseModel):
+    """
+    Spend of a budgeted category in one month.
+    :param category_id: Budgeted category.
+    :param category: Category name.
+    :param period: Month in YYYY-MM format.
+    :param monthly_limit: The category's monthly budget.
+    :param spent: Sum of the category's expenses in the month.
+    :param remaining: monthly_limit - spent; negative once over budget.
+    :param over_budget: Whether spent exceeds monthly_limit.
+    """
+    category_id: int
+    category: str
+    period: str
+    monthly_limit: Decimal
+    spent: Decimal
+    remaining: Decimal
+    over_budget: bool
+
+class BudgetAlert(BaseModel):
+    """
+    A category that a write pushed over its monthly budget.
+    :param category_id: The category.
+    :param period: Month in YYYY-MM format.
+    :param monthly_limit: The category's monthly budget.
+    :param spent: Sum of the category's expenses in the month after the write.
+    """
+    category_id: int
+    period: str
+    monthly_limit: Decimal
+    spent: Decimal
+
 # Expense schemas
 class ExpenseBase(BaseModel):
     """Shared fields for expense schemas.
     :param title: Expense title.
     :param amount: Expense amount.
+    :param currency: ISO 4217 code of the amount; None for the user's base currency.
     :param description: Optional description.
     :param date: When the expense occurred.
     :param category_id: ID of the category for the expense.
     """
     title: str
     amount: Decimal
+    currency: str | None = Field(None, pattern=CURRENCY_CODE_PATTERN)
     description: str | None = None
     date: datetime | None = None
     category_id: int
@@ -118,11 +177,13 @@ class IncomeBase(BaseModel):
     """Shared fields for income schemas.
     :param title: Income title.
     :param amount: Income amount.
+    :param currency: ISO 4217 code of the amount; None for the user's base currency.
     :param description: Optional description.
     :param date: When the income occurred.
     """
     title: str
     amount: Decimal
+    currency: str | None = Field(None, pattern=CURRENCY_CODE_PATTERN)
     description: str | None = None
     date: datetime | None = None
 
@@ -140,3 +201,124 @@ class IncomeOut(IncomeBase):
     class Config:
         orm_mode = True
         json_encoders = {Decimal: lambda v: str(v)}
+
+# Import schemas
+class ImportRowError(BaseModel):
+    """
+    Validation failure of a single uploaded row.
+    :param row: 1-based row (CSV) or transaction (OFX) number.
+    :param errors: Human readable error messages.
+    """
+    row: int
+    errors: list[str]
+
+class ImportReport(BaseModel):
+    """
+    Outcome of a bulk import.
+    :param imported: Number of rows created.
+    :param failed: Number of rows rejected.
+    :param errors: Per-row errors of the rejected rows.
+    """
+    imported: int
+    failed: int
+    errors: list[ImportRowError]
+
+
+# Recurring rule schemas
+class RecurringRuleBase(BaseModel):
+    """
+    Shared fields for recurring rule schemas.
+    :param kind: "expense" or "income".
+    :param title: Title of the created entries.
+    :param amount: Amount of the created entries.
+    :param currency: ISO 4217 code of the amount; None for the user's base currency.
+    :param description: Optional description of the created entries.
+    :param category_id: Category of the created expenses; required for expense rules.
+    :param frequency: Period unit between occurrences.
+    :param interval: Number of frequency periods between occurrences.
+    :param start_date: First occurrence; defaults to now.
+    :param end_date: Optional last moment an occurrence may fall on.
+    """
+    kind: Literal["expense", "income"]
+    title: str
+    amount: Decimal
+    currency: str | None = Field(None, pattern=CURRENCY_CODE_PATTERN)
+    description: str | None = None
+    category_id: int | None = None
+    frequency: Literal["day", "week", "month", "quarter", "year"]
+    interval: int = Field(1, ge=1)
+    start_date: datetime | None = None
+    end_date: datetime | None = None
+
+class RecurringRuleCreate(RecurringRuleBase):
+    """Schema used when creating a recurring rule. Inherits from RecurringRuleBase."""
+    pass
+
+class RecurringRuleOut(RecurringRuleBase):
+    """
+    Recurring rule representation returned by the API.
+    :param id: Database ID of the rule.
+    :param occurrences: Number of entries created from the rule so far.
+    :param next_run: When the next entry is due; None once the rule has ended.
+    """
+    id: int
+    start_date: datetime
+    occurrences: int
+    next_run: datetime | None = None
+
+    class Config:
+        orm_mode = True
+        json_encoders = {Decimal: lambda v: str(v)}
+
+
+# Batch schemas
+class BatchOperation(BaseModel):
+    """
+    One mutation of a batch request.
+    :param action: "create", "update" or "delete".
+    :param entity: "expense", "income" or "category".
+    :param id: ID of the record to update or delete.
+    :param data: Fields of the created or updated record, as sent to the single-record endpoints.
+    """
+    action: Literal["create", "update", "delete"]
+    entity: Literal["expense", "income", "category"]
+    id: int | None = None
+    data: dict | None = None
+
+class BatchRequest(BaseModel):
+    """
+    Input model of a batch request.
+    :param operations: Mutations, applied in order.
+    :param atomic: When true, nothing is saved unless every operation succeeds.
+    """
+    operations: list[BatchOperation] = Field(..., min_length=1, max_length=BATCH_MAX_OPERATIONS)
+    atomic: bool = False
+
+class BatchOperationResult(BaseModel):
+    """
+    Outcome of one batch operation.
+    :param index: 0-based position of the operation in the request.
+    :param status: HTTP status the single-record endpoint would have answered (424 for operations
+        rolled back because another operation of an atomic batch failed).
+    :param id: ID of the created, updated or deleted record.
+    :param data: The created or updated record.
+    :param error: Error message of a failed operation.
+    """
+    index: int
+    status: int
+    id: int | None = None
+    data: dict | None = None
+    error: str | None = None
+
+class BatchReport(BaseModel):
+    """
+    Outcome of a batch request.
+    :param applied: Number of operations saved.
+    :param failed: Number of operations rejected.
+    :param results: Per-operation results, in request order.
+    :param budget_alerts: Categories the batch pushed over their monthly budget.
+    """
+    applied: int
+    failed: int
+    results: list[BatchOperationResult]
+    budget_alerts: list[BudgetAlert] = []
@@ -0,0 +1,280 @@
+"""
+In-memory analytics over a user's ledger held as columnar NumPy arrays.
+
+A user's expenses and incomes are loaded once into arrays of epoch days, integer cents and
+category indexes, sorted by day. A date range is then two searchsorted calls, and bucketing by
+day/week/month/quarter/year (optionally pivoted by category) one bincount over the range.
+Loaded ledgers are kept in an LRU together with the user's data version; every write bumps the
+version, so the next request after a write reloads the ledger.
+"""
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+import numpy as np
+from fastapi import HTTPException, status
+from sqlalchemy import BigInteger, func, null, select, type_coerce
+from sqlalchemy.orm import Session
+
+from .. import models
+from .async_utils import to_async
+from .cache_utils import TTLCache
+from .constants import ANALYTICS_CACHE_USERS, ANALYTICS_CACHE_TTL_SECONDS, ANALYTICS_MAX_BUCKETS
+from .period_utils import GRANULARITIES
+from .version_utils import get_data_version
+
+
+ANALYTICS_KINDS = ("expenses", "incomes", "net")
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+# Loaded ledgers by user id; an entry whose version differs from the user's data version is reloaded
+ledger_cache = TTLCache(ANALYTICS_CACHE_USERS, ANALYTICS_CACHE_TTL_SECONDS)
+
+
+class LedgerColumns:
+    """
+    One kind of transaction (expenses or incomes) as read-only arrays of equal length, sorted by day.
+    :param days: Epoch day of each transaction (int64).
+    :param cents: Amount in integer cents (int64).
+    :param categories: Column of the transaction's category in UserLedger.category_ids; uncategorized
+        transactions (and all incomes) use len(category_ids).
+    """
+    __slots__ = ("days", "cents", "categories")
+
+    def __init__(self, days: np.ndarray, cents: np.ndarray, categories: np.ndarray):
+        for array in (days, cents, categories):
+            array.flags.writeable = False
+        self.days = days
+        self.cents = cents
+        self.categories = categories
+
+    def window(self, first_day: int, last_day: int) -> slice:
+        """Return the slice of transactions dated between first_day and last_day (inclusive)."""
+        return slice(int(np.searchsorted(self.days, first_day, "left")), int(np.searchsorted(self.days, last_day, "right")))
+
+
+class UserLedger:
+    """A user's loaded ledger at a given data version."""
+    __slots__ = ("version", "category_ids", "category_names", "expenses", "incomes")
+
+    def __init__(self, version: int, category_ids: np.ndarray, category_names: list,
+                 expenses: LedgerColumns, incomes: LedgerColumns):
+        self.version = version
+        self.category_ids = category_ids
+        self.category_names = category_names
+        self.expenses = expenses
+        self.incomes = incomes
+
+
+def to_epoch_day(value) -> int:
+    """Return the epoch day (days since 1970-01-01) of a date or datetime."""
+    return int((np.datetime64(value, "D") - _EPOCH).astype(np.int64))
+
+
+def _cents(column):
+    """SQL expression of an amount column's stored integer cents (0 for NULL), read without building Decimals."""
+    return type_coerce(func.coalesce(column, 0), BigInteger)
+
+
+def _columns(rows, category_ids: np.ndarray) -> LedgerColumns:
+    """Build LedgerColumns from (date, cents, category_id) rows already sorted by date."""
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return LedgerColumns(empty, empty.copy(), empty.copy())
+
+    dates, cents, owners = zip(*rows)
+    days = (np.array(dates, dtype="datetime64[D]") - _EPOCH).astype(np.int64)
+    owners = np.array([-1 if owner is None else owner for owner in owners], dtype=np.int64)
+    # category ids map to their column; unknown or missing categories go to the trailing column
+    categories = np.searchsorted(category_ids, owners)
+    found = categories < len(category_ids)
+    found[found] = category_ids[categories[found]] == owners[found]
+    categories[~found] = len(category_ids)
+    return LedgerColumns(days, np.array(cents, dtype=np.int64), categories.astype(np.int64))
+
+
+def load_user_ledger(db: Session, user_id: int, version: int) -> UserLedger:
+    """
+    Read a user's categories, expenses and incomes into a UserLedger, ordered by date via the (user_id, date) indexes.
+    Amounts are the entries' stored amounts in the user's base currency.
+    """
+    categories = db.execute(
+        select(models.Category.id, models.Category.name).where(models.Category.user_id == user_id).order_by(models.Category.id)
+    ).all()
+    category_ids = np.array([category_id for category_id, _ in categories], dtype=np.int64)
+
+    expenses = db.execute(
+        select(models.Expense.date, _cents(models.Expense.base_amount), models.Expense.category_id)
+        .where(models.Expense.user_id == user_id, models.Expense.date.is_not(None))
+        .order_by(models.Expense.date)
+    ).all()
+    incomes = db.execute(
+        select(models.Income.date, _cents(models.Income.base_amount), null())
+        .where(models.Income.user_id == user_id, models.Income.date.is_not(None))
+        .order_by(models.Income.date)
+    ).all()
+
+    return UserLedger(
+        version=version,
+        category_ids=category_ids,
+        category_names=[name for _, name in categories],
+        expenses=_columns(expenses, category_ids),
+        incomes=_columns(incomes, category_ids),
+    )
+
+
+def get_user_ledger(db: Session, user_id: int, version: Optional[int] = None) -> UserLedger:
+    """
+    Return the user's ledger from ledger_cache, loading it when missing or older than the user's data version.
+    :param version: The user's current data version when already known (e.g. from versioned_response).
+    """
+    if version is None:
+        version = get_data_version(db, user_id)
+    ledger = ledger_cache.get(user_id)
+    if ledger is None or ledger.version != version:
+        ledger = load_user_ledger(db, user_id, version)
+        ledger_cache.set(user_id, ledger)
+    return ledger
+
+
+def bucket_ordinals(days: np.ndarray, granularity: str) -> np.ndarray:
+    """
+    Map epoch days to the ordinal of the period containing them: days, Monday-based weeks,
+    months, quarters or years since the epoch.
+    """
+    if granularity == "day":
+        return days
+    if granularity == "week":
+        # 1970-01-01 was a Thursday, so shifting by three days makes every ordinal start on a Monday
+        return (days + 3) // 7
+    months = (days.astype("datetime64[D]").astype("datetime64[M]") - np.datetime64("1970-01", "M")).astype(np.int64)
+    if granularity == "month":
+        return months
+    if granularity == "quarter":
+        return months // 3
+    return months // 12
+
+
+def bucket_labels(first: int, last: int, granularity: str) -> list:
+    """Return the labels of bucket ordinals first..last, in the format of period_bucket."""
+    ordinals = np.arange(first, last + 1, dtype=np.int64)
+    if granularity == "day":
+        return np.datetime_as_string(_EPOCH + ordinals).tolist()
+    if granularity == "week":
+        return np.datetime_as_string(_EPOCH + ordinals * 7 - 3).tolist()
+    if granularity == "month":
+        return np.datetime_as_string(np.datetime64("1970-01", "M") + ordinals).tolist()
+    if granularity == "quarter":
+        return [f"{1970 + ordinal // 4}-{ordinal % 4 + 1}" for ordinal in ordinals.tolist()]
+    return [str(1970 + ordinal) for ordinal in ordinals.tolist()]
+
+
+def bucket_totals(columns: LedgerColumns, first_day: int, last_day: int, granularity: str, width: int = 1):
+    """
+    Sum and count the transactions dated first_day..last_day per bucket, zero-filling empty buckets.
+    :param width: 1 for plain buckets; the number of category columns for a category pivot.
+    :return: (first ordinal, cents, counts); cents and counts have shape (buckets,) or (buckets, width).
+    """
+    first, last = bucket_ordinals(np.array([first_day, last_day], dtype=np.int64), granularity).tolist()
+    buckets = last - first + 1
+    window = columns.window(first_day, last_day)
+
+    index = bucket_ordinals(columns.days[window], granularity) - first
+    if width > 1:
+        index = index * width + columns.categories[window]
+    # float weights are exact for totals below 2**53 cents
+    cents = np.rint(np.bincount(index, weights=columns.cents[window], minlength=buckets * width)).astype(np.int64)
+    counts = np.bincount(index, minlength=buckets * width)
+    if width > 1:
+        return first, cents.reshape(buckets, width), counts.reshape(buckets, width)
+    return first, cents, counts
+
+
+def _amount(cents) -> Decimal:
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def _day_range(ledger: UserLedger, kind: str, start_date: Optional[datetime], end_date: Optional[datetime]):
+    """Resolve the requested window to epoch days; it defaults to the first transaction through today."""
+    last_day = to_epoch_day(end_date or datetime.utcnow())
+    if start_date is not None:
+        first_day = to_epoch_day(start_date)
+    else:
+        columns = [ledger.expenses, ledger.incomes] if kind == "net" else [getattr(ledger, kind)]
+        starts = [int(c.days[0]) for c in columns if len(c.days)]
+        first_day = min(starts + [last_day])
+    if first_day > last_day:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start_date must not be after end_date")
+    return first_day, last_day
+
+
+def analyze_ledger(db: Session, user_id: int, kind: str = "expenses", granularity: str = "month",
+    start_date: Optional[datetime] = None, end_date: Optional[datetime] = None, group_by: Optional[str] = None,
+    version: Optional[int] = None):
+    """
+    Bucket a user's expenses, incomes or net flow (incomes minus expenses) over an arbitrary window.
+    :param kind: One of ANALYTICS_KINDS.
+    :param granularity: One of GRANULARITIES.
+    :param start_date: First day of the window (whole days); the first transaction when None.
+    :param end_date: Last day of the window (whole days); today when None.
+    :param group_by: "category" to pivot expenses by category; None for plain buckets.
+    :param version: The user's current data version, when already known.
+    """
+    if kind not in ANALYTICS_KINDS or granularity not in GRANULARITIES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid kind or granularity")
+    if group_by == "category" and kind != "expenses":
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only expenses can be grouped by category")
+
+    ledger = get_user_ledger(db, user_id, version)
+    first_day, last_day = _day_range(ledger, kind, start_date, end_date)
+    first, last = bucket_ordinals(np.array([first_day, last_day], dtype=np.int64), granularity).tolist()
+    if last - first + 1 > ANALYTICS_MAX_BUCKETS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"The window spans more than {ANALYTICS_MAX_BUCKETS} {granularity} buckets")
+
+    width = len(ledger.category_ids) + 1 if group_by == "category" else 1
+    if kind == "net":
+        _, income_cents, income_counts = bucket_totals(ledger.incomes, first_day, last_day, granularity)
+        _, expense_cents, expense_counts = bucket_totals(ledger.expenses, first_day, last_day, granularity)
+        cents, counts = income_cents - expense_cents, income_counts + expense_counts
+    else:
+        _, cents, counts = bucket_totals(getattr(ledger, kind), first_day, last_day, granularity, width)
+
+    labels = bucket_labels(first, last, granularity)
+    result = {
+        "kind": kind,
+        "granularity": granularity,
+        "start_date": (_EPOCH + first_day).item(),
+        "end_date": (_EPOCH + last_day).item(),
+        "total": _amount(cents.sum()),
+        "count": int(counts.sum()),
+    }
+    if width == 1:
+        result["periods"] = [
+            {"period": label, "total": _amount(total), "count": count}
+            for label, total, count in zip(labels, cents.tolist(), counts.tolist())
+        ]
+        return result
+
+    # the trailing column holds uncategorized expenses; it is only reported when it has any
+    columns = width if counts[:, -1].any() else width - 1
+    result["categories"] = [{"id": int(category_id), "name": name}
+                            for category_id, name in zip(ledger.category_ids, ledger.category_names)]
+    if columns == width:
+        result["categories"].append({"id": None, "name": None})
+    result["periods"] = [
+        {"period": label, "total": _amount(sum(row)), "count": sum(row_counts),
+         "by_category": [_amount(total) for total in row[:columns]]}
+        for label, row, row_counts in zip(labels, cents.tolist(), counts.tolist())
+    ]
+    return result
+
+
+def analytics_cache_stats():
+    """Return the size and hit/miss/eviction counters of the loaded-ledger cache."""
+    return ledger_cache.stats()
+
+
+# Awaitable variant for the async routers, usable with a Session or an AsyncSession
+analyze_ledger_async = to_async(analyze_ledger)
@@ -0,0 +1,27 @@
+import functools
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """
+    Run a synchronous *_utils function without blocking the event loop.
+    With an AsyncSession the function runs through AsyncSession.run_sync on the async driver;
+    with a plain Session it runs in the threadpool.
+    :param db: Session or AsyncSession.
+    :param fn: Function taking the session as its first argument.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+def to_async(fn):
+    """Return an awaitable variant of a *_utils function that accepts a Session or AsyncSession."""
+    @functools.wraps(fn)
+    async def wrapper(db, *args, **kwargs):
+        return await run_db(db, fn, *args, **kwargs)
+
+    wrapper.__name__ = wrapper.__qualname__ = f"{fn.__name__}_async"
+    return wrapper
@@ -1,89 +1,127 @@
+import time
+from dataclasses import dataclass
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from jose import JWTError, jwt, ExpiredSignatureError
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
-from ..database import get_db
+from ..database import AnySession, get_session
 from .. import models
-from .constants import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from .async_utils import run_db
+from .cache_utils import TTLCache
+from .passwords import truncate_password_for_bcrypt, hash_password, verify_password
+from .constants import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, AUTH_CACHE_SIZE, AUTH_CACHE_TTL_SECONDS
 
 
 bearer_scheme = HTTPBearer(auto_error=False)
 
-# Password hashing configuration
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def truncate_password_for_bcrypt(password: str):
-    """
-    Truncate the password to 72 bytes.
-    """
-    encoded = password.encode("utf-8")
-
-    if len(encoded) <= 72:
-        return password
-    truncated = encoded[:72]
-    
-    return truncated.decode("utf-8", errors="ignore")
-
-def hash_password(password: str):
-    """
-    Hash a plaintext password and return the hash string.
-    """
-    safe_pw = truncate_password_for_bcrypt(password)
-    return pwd_context.hash(safe_pw)
-
-def verify_password(plain_password, hashed_password):
-    """
-    Verify a plaintext password against the stored hash.
-    """
-    safe_pw = truncate_password_for_bcrypt(plain_password)
-    return pwd_context.verify(safe_pw, hashed_password)
-
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     """
     Create a JWT access token.
     :param data: data with token.
     :param expires_delta: Optional expiry override.
     """
+    from jose import jwt
+
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def decode_access_token(token: str):
+def decode_access_token_claims(token: str):
     """
-    Decode a JWT and return username or None for invalid tokens.
+    Decode a JWT and return its claims or None for invalid tokens.
+    Raises jose's ExpiredSignatureError for expired tokens.
     """
+    # jose (and the cryptography backend it loads) is imported on first use rather than at startup
+    from jose import ExpiredSignatureError, JWTError, jwt
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload.get("sub")
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except ExpiredSignatureError:
         raise
     except JWTError:
         return None
-    
-def get_current_user(
+
+def decode_access_token(token: str):
+    """
+    Decode a JWT and return username or None for invalid tokens.
+    """
+    claims = decode_access_token_claims(token)
+    return claims.get("sub") if claims else None
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Lightweight identity of an authenticated user, cached per token.
+    :param id: DB ID of the user.
+    :param username: User's username.
+    """
+    id: int
+    username: str
+
+
+# Verified tokens mapped to their Principal, so repeat requests skip JWT decoding and the users table
+principal_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+
+def invalidate_user(user_id: int):
+    """Drop every cached token of a user, e.g. after the user was changed or deleted."""
+    principal_cache.discard_where(lambda principal: principal.id == user_id)
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    invalidate_user(target.id)
+
+def auth_cache_stats():
+    """Return size and hit/miss counters of the authenticated-user cache."""
+    return principal_cache.stats()
+
+def _load_principal(db: Session, claims: dict):
+    """Load the token's user by id (uid claim) or, for older tokens, by username."""
+    username = claims.get("sub")
+    user_id = claims.get("uid")
+    if user_id is not None:
+        user = db.get(models.User, user_id)
+        if user is not None and user.username != username:
+            user = None
+    else:
+        user = db.query(models.User).filter(models.User.username == username).first()
+    return Principal(id=user.id, username=user.username) if user else None
+
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
-    db: Session = Depends(get_db)):
+    db: AnySession = Depends(get_session)):
     """
-    Returns the authenticated User instance or raises HTTPException.
+    Returns the authenticated user's Principal or raises HTTPException.
+    Verified tokens are served from principal_cache until they expire or the user changes.
     """
     if credentials is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization credentials missing")
     token = credentials.credentials
 
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
+    from jose import ExpiredSignatureError
+
     try:
-        username = decode_access_token(token)
+        claims = decode_access_token_claims(token)
     except ExpiredSignatureError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
     
-    if username is None:
+    if claims is None or claims.get("sub") is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    user = db.query(models.User).filter(models.User.username == username).first()
+    principal = await run_db(db, _load_principal, claims)
 
-    if user is None:
+    if principal is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    
-    return user
\ No newline at end of file
+
+    # never serve a token from the cache past its own expiry
+    remaining = claims["exp"] - time.time() if "exp" in claims else AUTH_CACHE_TTL_SECONDS
+    principal_cache.set(token, principal, ttl=min(AUTH_CACHE_TTL_SECONDS, remaining))
+    return principal
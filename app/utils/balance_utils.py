@@ -0,0 +1,105 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import Integer, String, bindparam, case, func, delete, insert, literal, select, update, true
+from sqlalchemy.orm import Session
+
+from .. import models
+from .period_utils import period_bucket
+from .rollup_utils import dialect_insert, period_of
+from .version_utils import bump_all_data_versions, bump_data_version
+
+
+def shift_balance_checkpoints(db: Session, user_id: int, changes: Iterable[Tuple[datetime, object]]):
+    """
+    Patch the balance checkpoints for ledger changes, inside the caller's transaction.
+    A change dated in month M moves the closing balance of M and of every later checkpointed month.
+    Runs two statements whatever the number of months touched: an executemany creating the missing
+    checkpoints, then one UPDATE adding to every checkpoint the deltas of its month and earlier ones.
+    :param db: SQLAlchemy session; the caller commits.
+    :param user_id: Owner user's id.
+    :param changes: (date, delta) tuples, delta is positive for money in and negative for money out.
+    """
+    deltas = defaultdict(int)
+    for date, delta in changes:
+        deltas[period_of(date)] += delta
+    deltas = {period: delta for period, delta in sorted(deltas.items()) if delta != 0}
+    if not deltas:
+        return
+
+    table = models.BalanceCheckpoint.__table__
+    # a missing checkpoint starts from its predecessor's closing balance as it was before this change;
+    # the rows are inserted in ascending order, so a new checkpoint may copy one created just before it
+    previous = (
+        select(table.c.net)
+        .where(table.c.user_id == bindparam("seed_user_id"), table.c.period < bindparam("seed_period"))
+        .order_by(table.c.period.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    seed = select(bindparam("seed_user_id", type_=Integer), bindparam("seed_period", type_=String), func.coalesce(previous, 0)).where(true())
+    db.execute(
+        dialect_insert(db, table)
+        .from_select(["user_id", "period", "net"], seed)
+        .on_conflict_do_nothing(index_elements=["user_id", "period"]),
+        [{"seed_user_id": user_id, "seed_period": period} for period in deltas],
+    )
+
+    # the deltas are bound as cents, like the net column
+    shift = sum(case((table.c.period >= period, literal(delta, table.c.net.type)), else_=0) for period, delta in deltas.items())
+    db.execute(
+        update(table)
+        .where(table.c.user_id == user_id, table.c.period >= min(deltas))
+        .values(net=table.c.net + shift)
+    )
+
+
+def rebuild_balance_checkpoints(db: Session, user_id: Optional[int] = None):
+    """
+    Regenerate the balance checkpoints from the raw expenses and incomes tables and commit.
+    Amounts are the entries' stored base currency amounts. The rebuilt users' data versions are
+    bumped, so results computed from the old data are not served.
+    :param db: SQLAlchemy session.
+    :param user_id: Only rebuild this user's checkpoints; all users when None.
+    """
+    table = models.BalanceCheckpoint.__table__
+    clear = delete(table)
+    if user_id is not None:
+        clear = clear.where(table.c.user_id == user_id)
+    db.execute(clear)
+
+    income_month = period_bucket(models.Income.date, "month")
+    income_rows = (
+        select(models.Income.user_id, income_month, func.sum(models.Income.base_amount))
+        .where(models.Income.user_id.is_not(None))
+        .group_by(models.Income.user_id, income_month)
+    )
+    expense_month = period_bucket(models.Expense.date, "month")
+    expense_rows = (
+        select(models.Expense.user_id, expense_month, -func.sum(models.Expense.base_amount))
+        .where(models.Expense.user_id.is_not(None))
+        .group_by(models.Expense.user_id, expense_month)
+    )
+    if user_id is not None:
+        income_rows = income_rows.where(models.Income.user_id == user_id)
+        expense_rows = expense_rows.where(models.Expense.user_id == user_id)
+
+    monthly_net = defaultdict(int)
+    for rows in (db.execute(income_rows), db.execute(expense_rows)):
+        for owner_id, period, total in rows:
+            monthly_net[(owner_id, period)] += total or 0
+
+    checkpoints = []
+    running = {}
+    for owner_id, period in sorted(monthly_net):
+        running[owner_id] = running.get(owner_id, 0) + monthly_net[(owner_id, period)]
+        checkpoints.append({"user_id": owner_id, "period": period, "net": running[owner_id]})
+
+    if checkpoints:
+        db.execute(insert(table), checkpoints)
+    if user_id is None:
+        bump_all_data_versions(db)
+    else:
+        bump_data_version(db, user_id)
+    db.commit()
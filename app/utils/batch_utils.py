@@ -0,0 +1,291 @@
+"""
+Many expense, income and category mutations applied in one transaction.
+
+The records an operation refers to are prefetched with one query per table, the operations are then
+applied in order to the loaded objects, and the derived data (rollups, balance checkpoints, data
+version) is updated once for the whole batch before a single flush and commit. Operations fail one
+by one with the status their single-record endpoint would answer; the others are still saved
+unless the batch is atomic.
+"""
+from datetime import datetime
+
+from pydantic import ValidationError
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from .async_utils import to_async
+from .budget_utils import check_budget_overspend, pop_budget_alerts
+from .category_utils import delete_categories
+from .expense_utils import apply_expense_effects
+from .fx_utils import stored_base_amount, to_base_amounts
+from .import_utils import validation_messages
+from .income_utils import INCOME_NOT_FOUND, apply_income_effects
+from .version_utils import bump_data_version
+
+
+class _OperationError(Exception):
+    def __init__(self, status: int, error: str):
+        self.status = status
+        self.error = error
+
+
+_PAYLOADS = {"expense": schemas.ExpenseCreate, "income": schemas.IncomeCreate, "category": schemas.CategoryCreate}
+_OUTPUTS = {"expense": schemas.ExpenseOut, "income": schemas.IncomeOut, "category": schemas.CategoryOut}
+
+
+def _payload(operation: schemas.BatchOperation):
+    if operation.action == "delete":
+        return None
+    try:
+        return _PAYLOADS[operation.entity].model_validate(operation.data or {})
+    except ValidationError as exc:
+        raise _OperationError(422, "; ".join(validation_messages(exc)))
+
+
+def _prefetch(db: Session, user_id: int, operations: list, payloads: list):
+    """
+    Load the user's records referenced by the operations, one query per table.
+    :return: ({category id: Category}, {normalised category name: Category}, {expense id: Expense}, {income id: Income}).
+    """
+    category_ids, category_names, expense_ids, income_ids = set(), set(), set(), set()
+    for operation, payload in zip(operations, payloads):
+        if operation.entity == "category":
+            if operation.action != "delete" and payload is not None:
+                category_names.add(payload.name.strip())
+            if operation.action != "create" and operation.id is not None:
+                category_ids.add(operation.id)
+        elif operation.action != "create" and operation.id is not None:
+            (expense_ids if operation.entity == "expense" else income_ids).add(operation.id)
+        if operation.entity == "expense" and payload is not None:
+            category_ids.add(payload.category_id)
+
+    categories = []
+    if category_ids or category_names:
+        categories = db.query(models.Category).filter(
+            models.Category.user_id == user_id,
+            or_(models.Category.id.in_(category_ids), models.Category.name.in_(category_names))
+        ).all()
+    expenses = []
+    if expense_ids:
+        expenses = db.query(models.Expense).filter(models.Expense.user_id == user_id, models.Expense.id.in_(expense_ids)).all()
+    incomes = []
+    if income_ids:
+        incomes = db.query(models.Income).filter(models.Income.user_id == user_id, models.Income.id.in_(income_ids)).all()
+
+    return ({category.id: category for category in categories}, {category.name: category for category in categories},
+            {expense.id: expense for expense in expenses}, {income.id: income for income in incomes})
+
+
+def apply_batch(db: Session, user_id: int, operations: list, atomic: bool = False):
+    """
+    Apply expense, income and category operations for a user in one transaction and return a
+    per-operation report (see schemas.BatchReport).
+    :param db: SQLAlchemy session.
+    :param user_id: Owner user's id.
+    :param operations: schemas.BatchOperation list, applied in order; later operations see the
+        effect of earlier ones (e.g. an expense cannot be moved to a category deleted before it).
+    :param atomic: Roll everything back when any operation fails.
+    Amounts in other currencies are converted together once all operations are applied, so a
+    missing exchange rate fails the whole batch (422) rather than its operation.
+    """
+    results = [None] * len(operations)
+    payloads = []
+    for index, operation in enumerate(operations):
+        try:
+            payloads.append(_payload(operation))
+        except _OperationError as exc:
+            payloads.append(None)
+            results[index] = {"index": index, "status": exc.status, "error": exc.error}
+
+    categories, category_names, expenses, incomes = _prefetch(db, user_id, operations, payloads)
+    # removals at the stored base amounts, and the records to (re)add once converted
+    expense_changes, income_changes = [], []
+    added_expenses, added_incomes = [], []
+    deleted_category_ids = []
+    categories_changed = False
+    touched = {}
+
+    for index, (operation, payload) in enumerate(zip(operations, payloads)):
+        if results[index] is not None:
+            continue
+        try:
+            if operation.action != "create" and operation.id is None:
+                raise _OperationError(422, "id: Field required")
+
+            if operation.entity == "category":
+                batch_expenses = [record for entity, record in touched.values() if entity == "expense"]
+                record = _apply_category(db, user_id, operation, payload, categories, category_names, batch_expenses, deleted_category_ids)
+                categories_changed = True
+            elif operation.entity == "expense":
+                record = _apply_expense(db, user_id, operation, payload, categories, expenses, expense_changes, added_expenses)
+            else:
+                record = _apply_income(db, user_id, operation, payload, incomes, income_changes, added_incomes)
+        except _OperationError as exc:
+            results[index] = {"index": index, "status": exc.status, "error": exc.error}
+            continue
+
+        status = {"create": 201, "update": 200, "delete": 204}[operation.action]
+        results[index] = {"index": index, "status": status, "id": operation.id}
+        if operation.action != "delete":
+            touched[index] = (operation.entity, record)
+
+    failed = sum(1 for result in results if result["status"] >= 400)
+    if atomic and failed:
+        db.rollback()
+        for result in results:
+            if result["status"] < 400:
+                result.update(status=424, id=None, error="Not applied: another operation of the atomic batch failed")
+        return {"applied": 0, "failed": failed, "results": results}
+
+    # the records are not flushed before their base amounts are set
+    with db.no_autoflush:
+        _set_base_amounts(db, user_id, added_expenses)
+        _set_base_amounts(db, user_id, added_incomes)
+    expense_changes += [(expense.category_id, expense.date, expense.base_amount, 1) for expense in added_expenses]
+    income_changes += [(income.date, income.base_amount, 1) for income in added_incomes]
+    if expense_changes:
+        check_budget_overspend(db, user_id, apply_expense_effects(db, user_id, expense_changes))
+    if income_changes:
+        apply_income_effects(db, user_id, income_changes)
+    if deleted_category_ids:
+        # as a single category delete does; after the expense changes, so that the rollups of expenses
+        # the batch moved out of a deleted category are taken off it before it moves to the uncategorized ones
+        delete_categories(db, user_id, deleted_category_ids)
+    if categories_changed and not (expense_changes or income_changes):
+        bump_data_version(db, user_id)
+
+    # created records get their ids here; the results are read before the commit expires them
+    db.flush()
+    _reload(db, [record for _, record in touched.values()])
+    for index, (entity, record) in touched.items():
+        results[index]["id"] = record.id
+        results[index]["data"] = _OUTPUTS[entity].model_validate(record, from_attributes=True).model_dump(mode="json")
+    db.commit()
+    return {"applied": len(operations) - failed, "failed": failed, "results": results, "budget_alerts": pop_budget_alerts(db)}
+
+
+def _set_base_amounts(db: Session, user_id: int, records: list):
+    """Convert the amounts of created and updated expenses or incomes together and store them on the records."""
+    if records:
+        amounts = to_base_amounts(db, user_id, [(record.currency, record.date, record.amount) for record in records])
+        for record, amount in zip(records, amounts):
+            record.base_amount = amount
+
+
+def _remove(record, removal, changes: list, added: list):
+    """
+    Take an updated or deleted record out of the derived data: records already added by the batch are
+    dropped from added, the others are removed at their stored base amount.
+    """
+    if record in added:
+        added.remove(record)
+    else:
+        changes.append(removal)
+
+
+def _reload(db: Session, records: list):
+    """
+    Read the saved records back, one query per table, so that the results carry the stored values
+    (amounts rounded to cents, dates as the database keeps them) like the single endpoints answer.
+    """
+    by_model = {}
+    for record in records:
+        by_model.setdefault(type(record), []).append(record.id)
+    for model, ids in by_model.items():
+        db.query(model).filter(model.id.in_(ids)).populate_existing().all()
+
+
+def _apply_category(db: Session, user_id: int, operation, payload, categories: dict, category_names: dict,
+                    batch_expenses: list, deleted_ids: list):
+    if operation.action == "create":
+        name = payload.name.strip()
+        if name in category_names:
+            raise _OperationError(409, "Category already exists")
+        category = models.Category(name=name, description=payload.description, user_id=user_id)
+        db.add(category)
+        category_names[name] = category
+        return category
+
+    category = categories.get(operation.id)
+    if category is None:
+        raise _OperationError(404, "Category not found")
+    if operation.action == "update":
+        name = payload.name.strip()
+        if category_names.get(name, category) is not category:
+            raise _OperationError(409, "Category already exists")
+        category_names.pop(category.name, None)
+        category.name = name
+        category.description = payload.description
+        category_names[name] = category
+        return category
+
+    if any(expense.category_id == category.id for expense in batch_expenses):
+        raise _OperationError(409, "Category is used by expenses of this batch")
+    # deleted with one statement after all operations are applied, see apply_batch
+    db.expunge(category)
+    deleted_ids.append(category.id)
+    del categories[operation.id]
+    category_names.pop(category.name, None)
+    return None
+
+
+def _apply_expense(db: Session, user_id: int, operation, payload, categories: dict, expenses: dict, changes: list, added: list):
+    if operation.action != "create":
+        expense = expenses.get(operation.id)
+        if expense is None:
+            raise _OperationError(404, "Expense not found")
+    if operation.action != "delete" and payload.category_id not in categories:
+        raise _OperationError(404, "Category not found")
+
+    if operation.action == "create":
+        expense = models.Expense(title=payload.title, amount=payload.amount, currency=payload.currency, description=payload.description,
+                                 date=payload.date or datetime.utcnow(), category_id=payload.category_id, user_id=user_id)
+        db.add(expense)
+        added.append(expense)
+        return expense
+
+    _remove(expense, (expense.category_id, expense.date, stored_base_amount(expense), -1), changes, added)
+    if operation.action == "delete":
+        db.delete(expense)
+        del expenses[operation.id]
+        return None
+
+    expense.title = payload.title
+    expense.amount = payload.amount
+    expense.currency = payload.currency
+    expense.description = payload.description
+    expense.date = payload.date or expense.date
+    expense.category_id = payload.category_id
+    added.append(expense)
+    return expense
+
+
+def _apply_income(db: Session, user_id: int, operation, payload, incomes: dict, changes: list, added: list):
+    if operation.action == "create":
+        income = models.Income(title=payload.title, amount=payload.amount, currency=payload.currency, description=payload.description,
+                               date=payload.date or datetime.utcnow(), user_id=user_id)
+        db.add(income)
+        added.append(income)
+        return income
+
+    income = incomes.get(operation.id)
+    if income is None:
+        raise _OperationError(404, INCOME_NOT_FOUND)
+    _remove(income, (income.date, stored_base_amount(income), -1), changes, added)
+    if operation.action == "delete":
+        db.delete(income)
+        del incomes[operation.id]
+        return None
+
+    income.title = payload.title
+    income.amount = payload.amount
+    income.currency = payload.currency
+    income.description = payload.description
+    income.date = payload.date or income.date
+    added.append(income)
+    return income
+
+
+# Awaitable variant for the async router, usable with a Session or an AsyncSession
+apply_batch_async = to_async(apply_batch)
@@ -0,0 +1,136 @@
+"""
+Monthly category budgets.
+
+A category's spend in a month is the total of its expense rollup, which the expense write utils
+already keep up to date in the write's own transaction (category moves included), so neither the
+budget status nor the overspend check ever sums expenses.
+"""
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, delete, func, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from .async_utils import to_async
+from .rollup_utils import period_of
+
+
+# Session.info key of the overspend alerts raised by the session's last expense write
+_ALERTS_KEY = "budget_alerts"
+
+
+def set_category_budget(db: Session, category_id: int, user_id: int, monthly_limit) -> models.CategoryBudget:
+    """
+    Create or replace the monthly budget of a category owned by the user. Raises 404 if the category is not found.
+    The category and its current budget are loaded by a single statement.
+    """
+    category, budget = db.query(models.Category, models.CategoryBudget).outerjoin(
+        models.CategoryBudget, models.CategoryBudget.category_id == models.Category.id
+    ).filter(
+        models.Category.id == category_id,
+        models.Category.user_id == user_id
+    ).first() or (None, None)
+
+    if not category:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
+
+    if budget is None:
+        budget = models.CategoryBudget(user_id=user_id, category_id=category_id)
+        db.add(budget)
+    budget.monthly_limit = monthly_limit
+    db.commit()
+    db.refresh(budget)
+    return budget
+
+
+def delete_category_budget(db: Session, category_id: int, user_id: int):
+    """Remove the budget of a category owned by the user. Raises 404 if the category has none."""
+    removed = db.execute(delete(models.CategoryBudget).where(
+        models.CategoryBudget.category_id == category_id,
+        models.CategoryBudget.user_id == user_id
+    )).rowcount
+    if not removed:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Budget not found")
+    db.commit()
+
+
+def get_budget_status(db: Session, user_id: int, period: Optional[str] = None):
+    """
+    Return the spend of every budgeted category of a user in a month, with one indexed read.
+    :param period: Month in YYYY-MM format; defaults to the current month.
+    """
+    period = period or period_of(datetime.utcnow())
+    spent = func.coalesce(models.ExpenseRollup.total, 0)
+    rows = db.execute(
+        select(models.CategoryBudget.category_id, models.Category.name, models.CategoryBudget.monthly_limit, spent)
+        .join(models.Category, models.Category.id == models.CategoryBudget.category_id)
+        .outerjoin(models.ExpenseRollup, and_(
+            models.ExpenseRollup.user_id == models.CategoryBudget.user_id,
+            models.ExpenseRollup.category_id == models.CategoryBudget.category_id,
+            models.ExpenseRollup.period == period,
+        ))
+        .where(models.CategoryBudget.user_id == user_id)
+        .order_by(models.CategoryBudget.category_id)
+    ).all()
+
+    return [
+        {"category_id": category_id, "category": name, "period": period, "monthly_limit": limit, "spent": total,
+         "remaining": limit - total, "over_budget": total > limit}
+        for category_id, name, limit, total in rows
+    ]
+
+
+def check_budget_overspend(db: Session, user_id: int, changes):
+    """
+    Find the budgeted categories that an expense write pushed over their monthly limit, once its
+    rollup changes are applied (inside the write's transaction), and record them on the session
+    for pop_budget_alerts. Costs one indexed read, and none for writes that only remove spend.
+    :param changes: The (category_id, date, amount, sign) tuples returned by apply_expense_effects,
+        amounts in the user's base currency.
+    :return: BudgetAlert dicts.
+    """
+    added = defaultdict(Decimal)
+    for category_id, date, amount, sign in changes:
+        if category_id is not None:
+            added[(category_id, period_of(date))] += Decimal(amount) * sign
+    added = {key: amount for key, amount in added.items() if amount > 0}
+    if not added:
+        return []
+
+    rows = db.execute(
+        select(models.CategoryBudget.category_id, models.ExpenseRollup.period, models.CategoryBudget.monthly_limit, models.ExpenseRollup.total)
+        .join(models.ExpenseRollup, and_(
+            models.ExpenseRollup.user_id == models.CategoryBudget.user_id,
+            models.ExpenseRollup.category_id == models.CategoryBudget.category_id,
+        ))
+        .where(
+            models.CategoryBudget.user_id == user_id,
+            models.CategoryBudget.category_id.in_({category_id for category_id, _ in added}),
+            models.ExpenseRollup.period.in_({period for _, period in added}),
+            models.ExpenseRollup.total > models.CategoryBudget.monthly_limit,
+        )
+    ).all()
+
+    # only the categories that were within their limit before the write
+    alerts = [
+        {"category_id": category_id, "period": period, "monthly_limit": limit, "spent": total}
+        for category_id, period, limit, total in rows
+        if (category_id, period) in added and total - added[(category_id, period)] <= limit
+    ]
+    db.info.setdefault(_ALERTS_KEY, []).extend(alerts)
+    return alerts
+
+
+def pop_budget_alerts(db) -> list:
+    """Return and forget the overspend alerts recorded on a Session or AsyncSession."""
+    return db.info.pop(_ALERTS_KEY, [])
+
+
+# Awaitable variants for the async routers, usable with a Session or an AsyncSession
+set_category_budget_async = to_async(set_category_budget)
+delete_category_budget_async = to_async(delete_category_budget)
+get_budget_status_async = to_async(get_budget_status)
@@ -1,9 +1,13 @@
 from typing import Optional
 from fastapi import HTTPException, status
+from sqlalchemy import delete, or_, update
 from sqlalchemy.orm import Session
 
 from .. import models
 from ..utils.constants import PREDEFINED_CATEGORIES
+from .async_utils import to_async
+from .rollup_utils import uncategorize_expense_rollups
+from .version_utils import bump_data_version
 
 
 def create_category_in_db(db: Session, name: str, description: Optional[str], user_id: int):
@@ -21,14 +25,15 @@ def create_category_in_db(db: Session, name: str, description: Optional[str], us
 
     new_category = models.Category(name=normalised_name, description=description, user_id=user_id)
     db.add(new_category)
+    bump_data_version(db, user_id)
     db.commit()
     db.refresh(new_category)
     return new_category
 
 
 def get_categories_for_user(db: Session, user_id: int):
-    """Return all categories belonging to a user."""
-    return db.query(models.Category).filter(models.Category.user_id == user_id).all()
+    """Return all categories belonging to a user, in creation order."""
+    return db.query(models.Category).filter(models.Category.user_id == user_id).order_by(models.Category.id).all()
 
 
 def get_category_for_user(db: Session, category_id: int, user_id: int) -> models.Category:
@@ -45,17 +50,24 @@ def get_category_for_user(db: Session, category_id: int, user_id: int) -> models
 
 
 def update_category_in_db(db: Session, category_id: int, user_id: int, name: str, description: Optional[str]) -> models.Category:
-    """Update a category's name/description. Raises 404 if not found."""
-    category = db.query(models.Category).filter(
-        models.Category.id == category_id,
-        models.Category.user_id == user_id
-    ).first()
+    """Update a category's name/description. Raises 404 if not found, 409 if another category has the name."""
+    normalised_name = name.strip()
+
+    # the category and any other one already named so, in one query
+    matches = db.query(models.Category).filter(
+        models.Category.user_id == user_id,
+        or_(models.Category.id == category_id, models.Category.name == normalised_name)
+    ).all()
+    category = next((match for match in matches if match.id == category_id), None)
 
     if not category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
-    
-    category.name = name
+    if any(match.id != category_id for match in matches):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Category already exists")
+
+    category.name = normalised_name
     category.description = description
+    bump_data_version(db, user_id)
     db.commit()
     db.refresh(category)
     return category
@@ -71,10 +83,27 @@ def delete_category_in_db(db: Session, category_id: int, user_id: int):
     if not category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
     
-    db.delete(category)
+    delete_categories(db, user_id, [category_id])
+    bump_data_version(db, user_id)
     db.commit()
 
 
+def delete_categories(db: Session, user_id: int, category_ids: list):
+    """
+    Delete categories owned by the user, inside the caller's transaction, with one statement per
+    table: their expenses are kept without a category (their rollups move to the uncategorized ones),
+    their budgets are removed and the recurring rules creating expenses in them are stopped.
+    """
+    db.execute(update(models.Expense).where(models.Expense.user_id == user_id, models.Expense.category_id.in_(category_ids))
+               .values(category_id=None))
+    uncategorize_expense_rollups(db, user_id, category_ids)
+    db.execute(update(models.RecurringRule).where(models.RecurringRule.user_id == user_id, models.RecurringRule.category_id.in_(category_ids))
+               .values(category_id=None, next_run=None))
+    db.execute(delete(models.CategoryBudget).where(models.CategoryBudget.user_id == user_id,
+                                                   models.CategoryBudget.category_id.in_(category_ids)))
+    db.execute(delete(models.Category).where(models.Category.user_id == user_id, models.Category.id.in_(category_ids)))
+
+
 def create_predefined_categories_for_user(db: Session, user_id: int):
     """
     Creates predefined categories for a given (new) user.
@@ -83,4 +112,14 @@ def create_predefined_categories_for_user(db: Session, user_id: int):
         normalised_name = name.strip()
         category = models.Category(name=normalised_name, user_id=user_id)
         db.add(category)
+    bump_data_version(db, user_id)
     db.commit()
+
+
+# Awaitable variants for the async routers, usable with a Session or an AsyncSession
+create_category_in_db_async = to_async(create_category_in_db)
+get_categories_for_user_async = to_async(get_categories_for_user)
+get_category_for_user_async = to_async(get_category_for_user)
+update_category_in_db_async = to_async(update_category_in_db)
+delete_category_in_db_async = to_async(delete_category_in_db)
+create_predefined_categories_for_user_async = to_async(create_predefined_categories_for_user)
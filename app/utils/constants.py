@@ -2,6 +2,37 @@ import os
 
 # Database
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./budget.db")
+# Serve requests through SQLAlchemy's AsyncEngine (aiosqlite / asyncpg) instead of the threadpool
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+# Connection pool of server databases (PostgreSQL); SQLite only uses DB_POOL_SIZE, for its reader pool
+try:
+	DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+except ValueError:
+	DB_POOL_SIZE = 5
+try:
+	DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+except ValueError:
+	DB_MAX_OVERFLOW = 10
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+try:
+	DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+except ValueError:
+	DB_POOL_RECYCLE = 1800
+# SQLite production profile: WAL journaling, tuned pragmas, a reader pool of DB_POOL_SIZE connections
+# and a single serialized writer connection
+SQLITE_PRODUCTION = os.getenv("SQLITE_PRODUCTION", "false").lower() in ("1", "true", "yes")
+try:
+	SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+except ValueError:
+	SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+try:
+	SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+except ValueError:
+	SQLITE_CACHE_SIZE_KB = 65536
+try:
+	SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+except ValueError:
+	SQLITE_BUSY_TIMEOUT_MS = 5000
 
 # Initial balance (1000 by default, if not provided or invalid value)
 try:
@@ -9,6 +40,20 @@ try:
 except ValueError:
 	INITIAL_BALANCE = 1000.00
 
+# Currencies: ISO 4217 code format, base currency of new users, and the currency the FX rate table is quoted against
+CURRENCY_CODE_PATTERN = r"^[A-Z]{3}$"
+DEFAULT_BASE_CURRENCY = os.getenv("DEFAULT_BASE_CURRENCY", "USD").upper()
+FX_REFERENCE_CURRENCY = os.getenv("FX_REFERENCE_CURRENCY", "EUR").upper()
+# In-process cache of FX rates per (currency, day), and how long a rate is trusted after it was read
+try:
+	FX_RATE_CACHE_SIZE = int(os.getenv("FX_RATE_CACHE_SIZE", "10000"))
+except ValueError:
+	FX_RATE_CACHE_SIZE = 10000
+try:
+	FX_RATE_CACHE_TTL_SECONDS = float(os.getenv("FX_RATE_CACHE_TTL_SECONDS", "300"))
+except ValueError:
+	FX_RATE_CACHE_TTL_SECONDS = 300.0
+
 # Auth constants 
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey123")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
@@ -16,6 +61,95 @@ try:
 	ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
 except ValueError:
 	ACCESS_TOKEN_EXPIRE_MINUTES = 60
+# Password hashing: bcrypt cost, worker processes, concurrent hashes and how many may queue before 503
+try:
+	BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+except ValueError:
+	BCRYPT_ROUNDS = 12
+try:
+	PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+except ValueError:
+	PASSWORD_HASH_WORKERS = min(4, os.cpu_count() or 1)
+try:
+	PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", str(max(PASSWORD_HASH_WORKERS, 1))))
+except ValueError:
+	PASSWORD_HASH_CONCURRENCY = max(PASSWORD_HASH_WORKERS, 1)
+try:
+	PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "100"))
+except ValueError:
+	PASSWORD_HASH_MAX_QUEUE = 100
+# Authenticated-user cache: verified tokens kept, and how long a token is trusted without a users lookup
+try:
+	AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+except ValueError:
+	AUTH_CACHE_SIZE = 10000
+try:
+	AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+except ValueError:
+	AUTH_CACHE_TTL_SECONDS = 60.0
+# Server-side cache of computed summaries, keyed on the user's data version
+try:
+	RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "10000"))
+except ValueError:
+	RESULT_CACHE_SIZE = 10000
+try:
+	RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "300"))
+except ValueError:
+	RESULT_CACHE_TTL_SECONDS = 300.0
+# In-memory analytics: users whose ledgers are kept loaded, for how long, and the bucket limit of one query
+try:
+	ANALYTICS_CACHE_USERS = int(os.getenv("ANALYTICS_CACHE_USERS", "256"))
+except ValueError:
+	ANALYTICS_CACHE_USERS = 256
+try:
+	ANALYTICS_CACHE_TTL_SECONDS = float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "600"))
+except ValueError:
+	ANALYTICS_CACHE_TTL_SECONDS = 600.0
+try:
+	ANALYTICS_MAX_BUCKETS = int(os.getenv("ANALYTICS_MAX_BUCKETS", "5000"))
+except ValueError:
+	ANALYTICS_MAX_BUCKETS = 5000
+
+# Request/SQL metrics on /metrics, and the statement duration logged as a slow query
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+try:
+	SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+except ValueError:
+	SLOW_QUERY_MS = 200.0
+# Fail requests that run more SQL statements than their route's query budget (for tests and debugging)
+QUERY_BUDGET_ENFORCE = os.getenv("QUERY_BUDGET_ENFORCE", "false").lower() in ("1", "true", "yes")
+
+# Listing: page size limit and rows fetched per round trip when streaming
+try:
+	MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+except ValueError:
+	MAX_PAGE_SIZE = 1000
+try:
+	STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+except ValueError:
+	STREAM_BATCH_SIZE = 500
+
+# Bulk import: rows inserted and committed per transaction
+try:
+	IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+except ValueError:
+	IMPORT_CHUNK_SIZE = 1000
 
+# Batch endpoint: most operations accepted in one request
+try:
+	BATCH_MAX_OPERATIONS = int(os.getenv("BATCH_MAX_OPERATIONS", "100"))
+except ValueError:
+	BATCH_MAX_OPERATIONS = 100
+
+# Recurring rules: background materializer on/off, seconds between its passes and occurrences inserted per transaction
+RECURRING_SCHEDULER_ENABLED = os.getenv("RECURRING_SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes")
+try:
+	RECURRING_INTERVAL_SECONDS = float(os.getenv("RECURRING_INTERVAL_SECONDS", "60"))
+except ValueError:
+	RECURRING_INTERVAL_SECONDS = 60.0
+try:
+	RECURRING_BATCH_SIZE = int(os.getenv("RECURRING_BATCH_SIZE", "1000"))
+except ValueError:
+	RECURRING_BATCH_SIZE = 1000
 
 PREDEFINED_CATEGORIES = ["Food", "Car", "Accommodation", "Bills"]
\ No newline at end of file
@@ -1,15 +1,43 @@
+from collections import defaultdict
 from datetime import datetime
 from typing import Optional
 from fastapi import HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy import and_, insert, select
 from sqlalchemy.orm import Session
-from sqlalchemy import func, Integer, String, label
 
-from .. import models
+from .. import models, schemas
+from .async_utils import to_async
+from .balance_utils import shift_balance_checkpoints
+from .budget_utils import check_budget_overspend
+from .constants import IMPORT_CHUNK_SIZE
+from .fx_utils import stored_base_amount, to_base_amounts
+from .import_utils import convertible_rows, validation_messages
+from .metrics_utils import extend_query_budget
+from .pagination_utils import apply_keyset, apply_offset, stream_ndjson
+from .rollup_utils import apply_expense_rollup_changes, get_expense_totals_by_category, get_expense_totals_by_period
+from .search_utils import apply_search, dialect_name
+from .version_utils import bump_data_version
 
 
-def create_expense_in_db(db: Session, title: str, amount, description: Optional[str], date: Optional[datetime], category_id: int, user_id: int):
+def apply_expense_effects(db: Session, user_id: int, changes):
     """
-    Create a new Expense for the given user.
+    Keep data derived from expenses in step with a write, inside the caller's transaction.
+    :param changes: (category_id, date, base amount, sign) tuples, sign is 1 for added and -1 for removed
+        expenses; removed ones count for their stored_base_amount.
+    :return: The changes.
+    """
+    apply_expense_rollup_changes(db, user_id, changes)
+    shift_balance_checkpoints(db, user_id, [(date, -amount * sign) for _, date, amount, sign in changes])
+    bump_data_version(db, user_id)
+    return changes
+
+
+def create_expense_in_db(db: Session, title: str, amount, description: Optional[str], date: Optional[datetime], category_id: int, user_id: int,
+    currency: Optional[str] = None):
+    """
+    Create a new Expense for the given user, in currency (None for the user's base currency).
+    Categories it pushes over their monthly budget are recorded for pop_budget_alerts.
     """
     category = db.query(models.Category).filter(
         models.Category.id == category_id,
@@ -19,27 +47,131 @@ def create_expense_in_db(db: Session, title: str, amount, description: Optional[
     if not category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
 
+    date = date or datetime.utcnow()
+    base_amount, = to_base_amounts(db, user_id, [(currency, date, amount)])
     new_expense = models.Expense(
         title=title,
         amount=amount,
+        currency=currency,
+        base_amount=base_amount,
         description=description,
-        date=date or datetime.utcnow(),
+        date=date,
         category_id=category_id,
         user_id=user_id,
     )
     db.add(new_expense)
+    changes = apply_expense_effects(db, user_id, [(category_id, date, base_amount, 1)])
+    check_budget_overspend(db, user_id, changes)
     db.commit()
     db.refresh(new_expense)
 
     return new_expense
 
 
-def get_expenses_for_user(db: Session, user_id: int, category_id: Optional[int] = None, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
-    min_amount: Optional[float] = None, max_amount: Optional[float] = None):
+def insert_expense_rows(db: Session, rows: list):
+    """
+    Insert validated expense rows, of one or several users, with one executemany and update each
+    owner's derived data, inside the caller's transaction.
+    :param rows: Dicts of Expense column values, each with a date and a user_id; their base_amount is set here.
+    """
+    by_user = defaultdict(list)
+    for row in rows:
+        by_user[row["user_id"]].append(row)
+    for user_id, user_rows in by_user.items():
+        amounts = to_base_amounts(db, user_id, [(row.get("currency"), row["date"], row["amount"]) for row in user_rows])
+        for row, base_amount in zip(user_rows, amounts):
+            row["base_amount"] = base_amount
+    # NULLs are sent as values, so that rows with and without a currency or description share one executemany
+    db.execute(insert(models.Expense).execution_options(render_nulls=True), rows)
+    for user_id, user_rows in by_user.items():
+        apply_expense_effects(db, user_id, [(row["category_id"], row["date"], row["base_amount"], 1) for row in user_rows])
+
+
+# Statements one import chunk may run, granted to the request on top of its route's budget: the executemany,
+# the rollups, two for the balance checkpoints and the data version, plus for amounts in other currencies
+# up to two rate lookups (IMPORT_CHUNK_SIZE rows, two rates each) to check the rows, and the base currency
+# and the rates that left rate_cache since to convert them
+IMPORT_CHUNK_STATEMENTS = 10
+
+
+def _insert_expense_chunk(db: Session, chunk: list, base_currency: str, errors: list):
+    """
+    Insert a chunk of validated (row number, expense row) pairs with one executemany and commit it.
+    Rows whose amount has no exchange rate to the base currency are reported in errors instead.
+    """
+    extend_query_budget(IMPORT_CHUNK_STATEMENTS)
+    rows = convertible_rows(db, chunk, base_currency, errors)
+    if rows:
+        insert_expense_rows(db, rows)
+        db.commit()
+    return len(rows)
+
+
+def import_expenses_in_db(db: Session, user_id: int, rows, default_category_id: Optional[int] = None):
+    """
+    Bulk-create expenses from parsed upload rows and return a per-row error report.
+    Categories are resolved by id or name against a single query of the user's categories;
+    valid rows are inserted in chunks of IMPORT_CHUNK_SIZE, one transaction per chunk. Rows in a currency
+    without an exchange rate on or before their date are reported like invalid ones.
+    :param db: SQLAlchemy session.
+    :param user_id: Owner user's id.
+    :param rows: (row number, row) pairs, e.g. from read_import_rows.
+    :param default_category_id: Category for rows that name none.
+    """
+    categories = db.query(models.Category.id, models.Category.name).filter(models.Category.user_id == user_id).all()
+    base_currency = db.scalar(select(models.User.base_currency).where(models.User.id == user_id))
+    category_ids = {category_id for category_id, _ in categories}
+    category_by_name = {name.strip().lower(): category_id for category_id, name in categories}
+
+    imported = 0
+    errors = []
+    chunk = []
+    for row_number, row in rows:
+        category_id = row.get("category_id") or default_category_id
+        if row.get("category") and not row.get("category_id"):
+            category_id = category_by_name.get(row["category"].strip().lower())
+            if category_id is None:
+                errors.append({"row": row_number, "errors": [f"category: Category '{row['category']}' not found"]})
+                continue
+
+        try:
+            expense = schemas.ExpenseCreate.model_validate({**row, "category_id": category_id})
+        except ValidationError as exc:
+            errors.append({"row": row_number, "errors": validation_messages(exc)})
+            continue
+
+        if expense.category_id not in category_ids:
+            errors.append({"row": row_number, "errors": ["category_id: Category not found"]})
+            continue
+
+        chunk.append((row_number, {
+            "title": expense.title,
+            "amount": expense.amount,
+            "currency": expense.currency,
+            "description": expense.description,
+            "date": expense.date or datetime.utcnow(),
+            "category_id": expense.category_id,
+            "user_id": user_id,
+        }))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            imported += _insert_expense_chunk(db, chunk, base_currency, errors)
+            chunk = []
+
+    if chunk:
+        imported += _insert_expense_chunk(db, chunk, base_currency, errors)
+
+    errors.sort(key=lambda error: error["row"])
+    return {"imported": imported, "failed": len(errors), "errors": errors}
+
+
+def _expenses_query(user_id: int, category_id: Optional[int] = None, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+    min_amount: Optional[float] = None, max_amount: Optional[float] = None, cursor: Optional[str] = None, limit: Optional[int] = None,
+    q: Optional[str] = None, dialect: str = "sqlite"):
     """
-    Return expenses for a user with optional filtering
+    Build the filtered expenses select for a user, ordered by (date, id) and continued after cursor.
+    With q, only the matches of the full-text search are kept, best match first, and cursor is an offset cursor.
     """
-    query = db.query(models.Expense).filter(models.Expense.user_id == user_id)
+    query = select(models.Expense).filter(models.Expense.user_id == user_id)
 
     if category_id is not None:
         query = query.filter(models.Expense.category_id == category_id)
@@ -52,7 +184,31 @@ def get_expenses_for_user(db: Session, user_id: int, category_id: Optional[int]
     if max_amount is not None:
         query = query.filter(models.Expense.amount <= max_amount)
 
-    return query.all()
+    if q is not None:
+        return apply_offset(apply_search(query, models.Expense, user_id, q, dialect), cursor, limit)
+    return apply_keyset(query, models.Expense, cursor, limit)
+
+
+def get_expenses_for_user(db: Session, user_id: int, category_id: Optional[int] = None, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+    min_amount: Optional[float] = None, max_amount: Optional[float] = None, cursor: Optional[str] = None, limit: Optional[int] = None,
+    q: Optional[str] = None):
+    """
+    Return expenses for a user with optional filtering, ordered by (date, id).
+    Pass limit to get a single page and the previous page's cursor to continue after it.
+    Pass q to search titles and descriptions instead: matches come best first, paged with next_offset_cursor.
+    """
+    return db.scalars(_expenses_query(user_id, category_id, start_date, end_date, min_amount, max_amount, cursor, limit, q, dialect_name(db))).all()
+
+
+def stream_expenses_for_user(db: Session, user_id: int, category_id: Optional[int] = None, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+    min_amount: Optional[float] = None, max_amount: Optional[float] = None, cursor: Optional[str] = None, limit: Optional[int] = None,
+    q: Optional[str] = None):
+    """
+    Return an iterator of a user's expenses as NDJSON lines, fetching rows in batches so memory stays flat.
+    The iterator is asynchronous when db is an AsyncSession.
+    """
+    query = _expenses_query(user_id, category_id, start_date, end_date, min_amount, max_amount, cursor, limit, q, dialect_name(db))
+    return stream_ndjson(db, query, schemas.ExpenseOut)
 
 
 def get_expense_for_user(db: Session, expense_id: int, user_id: int):
@@ -70,31 +226,40 @@ def get_expense_for_user(db: Session, expense_id: int, user_id: int):
     return expense
 
 
-def update_expense_in_db(db: Session, expense_id: int, user_id: int, title: str, amount, description: Optional[str], date: Optional[datetime], category_id: int):
+def update_expense_in_db(db: Session, expense_id: int, user_id: int, title: str, amount, description: Optional[str], date: Optional[datetime], category_id: int,
+    currency: Optional[str] = None):
     """
     Update an expense. Verifies expense and category ownership. Raises 404 when missing.
+    The expense and the target category are loaded by a single statement.
+    Categories it pushes over their monthly budget are recorded for pop_budget_alerts.
     """
-    expense = db.query(models.Expense).filter(
+    expense, category = db.query(models.Expense, models.Category).outerjoin(
+        models.Category,
+        and_(models.Category.id == category_id, models.Category.user_id == user_id)
+    ).filter(
         models.Expense.id == expense_id,
         models.Expense.user_id == user_id
-    ).first()
+    ).first() or (None, None)
 
     if not expense:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Expense not found")
 
-    category = db.query(models.Category).filter(
-        models.Category.id == category_id,
-        models.Category.user_id == user_id
-    ).first()
-
     if not category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
 
+    removed = (expense.category_id, expense.date, stored_base_amount(expense), -1)
+    date = date or expense.date
+    base_amount, = to_base_amounts(db, user_id, [(currency, date, amount)])
+
     expense.title = title
     expense.amount = amount
+    expense.currency = currency
+    expense.base_amount = base_amount
     expense.description = description
-    expense.date = date or expense.date
+    expense.date = date
     expense.category_id = category_id
+    changes = apply_expense_effects(db, user_id, [removed, (category_id, date, base_amount, 1)])
+    check_budget_overspend(db, user_id, changes)
     db.commit()
     db.refresh(expense)
 
@@ -113,6 +278,7 @@ def delete_expense_in_db(db: Session, expense_id: int, user_id: int):
     if not expense:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Expense not found")
     
+    apply_expense_effects(db, user_id, [(expense.category_id, expense.date, stored_base_amount(expense), -1)])
     db.delete(expense)
     db.commit()
 
@@ -122,44 +288,21 @@ def delete_expense_in_db(db: Session, expense_id: int, user_id: int):
 def get_expense_summary_util(db: Session, user_id: int, period: str = "month"):
     """
     Return summary data: total per category and total per period (month/quarter/year).
+    Totals are read from the monthly expense rollups rather than the raw expenses.
     """
-    category_totals = (
-        db.query(models.Category.name, func.sum(models.Expense.amount))
-        .join(models.Expense)
-        .filter(models.Expense.user_id == user_id)
-        .group_by(models.Category.id)
-        .all()
-    )
-
-    if period == "month":
-        period_total = (
-            db.query(func.strftime("%Y-%m", models.Expense.date), func.sum(models.Expense.amount))
-            .filter(models.Expense.user_id == user_id)
-            .group_by(func.strftime("%Y-%m", models.Expense.date))
-            .all()
-        )
-    elif period == "quarter":
-        quarter_label = label(
-            "quarter",
-            (func.strftime("%Y", models.Expense.date) + "-" +
-            ((func.strftime("%m", models.Expense.date).cast(Integer)-1)/3 + 1).cast(String))
-        )
-
-        period_total = (
-            db.query(quarter_label, func.sum(models.Expense.amount))
-            .filter(models.Expense.user_id == user_id)
-            .group_by(quarter_label)
-            .all()
-        )
-    else:  # year
-        period_total = (
-            db.query(func.strftime("%Y", models.Expense.date), func.sum(models.Expense.amount))
-            .filter(models.Expense.user_id == user_id)
-            .group_by(func.strftime("%Y", models.Expense.date))
-            .all()
-        )
+    category_totals = get_expense_totals_by_category(db, user_id)
+    period_total = get_expense_totals_by_period(db, user_id, period)
 
     return {
         "total_per_category": [{"category": c, "total": t} for c, t in category_totals],
         "total_per_period": [{"period": p, "total": t} for p, t in period_total],
     }
+
+
+# Awaitable variants for the async routers, usable with a Session or an AsyncSession
+create_expense_in_db_async = to_async(create_expense_in_db)
+get_expenses_for_user_async = to_async(get_expenses_for_user)
+get_expense_for_user_async = to_async(get_expense_for_user)
+update_expense_in_db_async = to_async(update_expense_in_db)
+delete_expense_in_db_async = to_async(delete_expense_in_db)
+get_expense_summary_util_async = to_async(get_expense_summary_util)
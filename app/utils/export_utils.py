@@ -0,0 +1,163 @@
+import csv
+import io
+import json
+import tempfile
+from datetime import datetime
+from typing import Iterator, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import literal, null, select, union_all
+from sqlalchemy.orm import Session
+
+from .. import models
+from .constants import STREAM_BATCH_SIZE
+
+
+EXPORT_COLUMNS = ["kind", "id", "date", "title", "description", "amount", "currency", "category"]
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def ledger_statement(user_id: int, kind: str = "all", category_id: Optional[int] = None, start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None, min_amount: Optional[float] = None, max_amount: Optional[float] = None):
+    """
+    Build the statement selecting a user's expenses (with category names) and incomes as one ledger
+    ordered by date. Filters match get_expenses_for_user; a category filter only keeps expenses.
+    :param kind: "all", "expenses" or "incomes".
+    """
+    parts = []
+    if kind in ("all", "expenses"):
+        expenses = (
+            select(literal("expense").label("kind"), models.Expense.id, models.Expense.date, models.Expense.title,
+                   models.Expense.description, models.Expense.amount, models.Expense.currency, models.Category.name.label("category"))
+            .outerjoin(models.Category, models.Expense.category_id == models.Category.id)
+            .where(models.Expense.user_id == user_id)
+        )
+        if category_id is not None:
+            expenses = expenses.where(models.Expense.category_id == category_id)
+        if start_date is not None:
+            expenses = expenses.where(models.Expense.date >= start_date)
+        if end_date is not None:
+            expenses = expenses.where(models.Expense.date <= end_date)
+        if min_amount is not None:
+            expenses = expenses.where(models.Expense.amount >= min_amount)
+        if max_amount is not None:
+            expenses = expenses.where(models.Expense.amount <= max_amount)
+        parts.append(expenses)
+
+    if kind in ("all", "incomes") and category_id is None:
+        incomes = (
+            select(literal("income").label("kind"), models.Income.id, models.Income.date, models.Income.title,
+                   models.Income.description, models.Income.amount, models.Income.currency, null().label("category"))
+            .where(models.Income.user_id == user_id)
+        )
+        if start_date is not None:
+            incomes = incomes.where(models.Income.date >= start_date)
+        if end_date is not None:
+            incomes = incomes.where(models.Income.date <= end_date)
+        if min_amount is not None:
+            incomes = incomes.where(models.Income.amount >= min_amount)
+        if max_amount is not None:
+            incomes = incomes.where(models.Income.amount <= max_amount)
+        parts.append(incomes)
+
+    if not parts:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Category filter only applies to expenses")
+
+    ledger = (parts[0] if len(parts) == 1 else union_all(*parts)).subquery()
+    return select(ledger).order_by(ledger.c.date, ledger.c.kind, ledger.c.id)
+
+
+def _ledger_batches(db: Session, statement):
+    """Yield lists of ledger rows from a server-side cursor, STREAM_BATCH_SIZE rows at a time."""
+    result = db.execute(statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+    for batch in result.partitions():
+        yield batch
+
+
+def _csv_chunks(db: Session, statement) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in _ledger_batches(db, statement):
+        for row in batch:
+            writer.writerow([row.kind, row.id, row.date.isoformat() if row.date else "", row.title,
+                             row.description or "", row.amount, row.currency or "", row.category or ""])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _ndjson_chunks(db: Session, statement) -> Iterator[str]:
+    for batch in _ledger_batches(db, statement):
+        yield "".join(
+            json.dumps({
+                "kind": row.kind,
+                "id": row.id,
+                "date": row.date.isoformat() if row.date else None,
+                "title": row.title,
+                "description": row.description,
+                "amount": str(row.amount),
+                "currency": row.currency,
+                "category": row.category,
+            }) + "\n"
+            for row in batch
+        )
+
+
+def _parquet_chunks(db: Session, statement) -> Iterator[bytes]:
+    """
+    Write the ledger as Parquet, one row group per batch, then stream the file.
+    Parquet keeps its footer at the end, so the file is staged in a spooled temporary file
+    (in memory while small, on disk once large) instead of being held in memory.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("kind", pa.string()),
+        ("id", pa.int64()),
+        ("date", pa.timestamp("us")),
+        ("title", pa.string()),
+        ("description", pa.string()),
+        ("amount", pa.decimal128(12, 2)),
+        ("currency", pa.string()),
+        ("category", pa.string()),
+    ])
+
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as staged:
+        with pq.ParquetWriter(staged, schema) as writer:
+            for batch in _ledger_batches(db, statement):
+                columns = list(zip(*batch))
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                    schema=schema,
+                ))
+        staged.seek(0)
+        while chunk := staged.read(64 * 1024):
+            yield chunk
+
+
+def export_ledger(db: Session, file_format: str, statement):
+    """
+    Return an iterator streaming the ledger selected by statement in the requested format.
+    Raises HTTPException when the format is unknown or its optional dependency is missing.
+    :param file_format: "csv", "ndjson" or "parquet".
+    """
+    if file_format == "csv":
+        return _csv_chunks(db, statement)
+    if file_format == "ndjson":
+        return _ndjson_chunks(db, statement)
+    if file_format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Parquet export requires pyarrow")
+        return _parquet_chunks(db, statement)
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported export format")
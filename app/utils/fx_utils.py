@@ -0,0 +1,213 @@
+"""
+Currency conversion to each user's base currency.
+
+Expenses, incomes and recurring rules may carry a currency code; entries without one are in their
+owner's base currency and are never converted. The fx_rates table holds, per day, the price of one
+FX_REFERENCE_CURRENCY unit in each currency, loaded from a file (python -m app.manage load-fx-rates);
+an amount dated d converts with the latest rates on or before d, crossing through the reference
+currency. Each expense and income stores its amount in its owner's base currency (base_amount),
+converted in one batch per write with hot (currency, day) rates served from rate_cache; the derived
+data (rollups, balance checkpoints) and every total are built from these stored amounts, so loading
+rates only affects the entries written afterwards.
+"""
+import csv
+import io
+import re
+from datetime import date as date_type, datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .. import models
+from .cache_utils import TTLCache
+from .constants import CURRENCY_CODE_PATTERN, FX_RATE_CACHE_SIZE, FX_RATE_CACHE_TTL_SECONDS, FX_REFERENCE_CURRENCY, IMPORT_CHUNK_SIZE
+from .rollup_utils import dialect_insert
+
+
+_CURRENCY = re.compile(CURRENCY_CODE_PATTERN)
+_CENT = Decimal("0.01")
+# (currency, day) rates looked up by one statement, each one index seek; the statement selects one
+# column per rate, within SQLite's default limit of 2000
+_LOOKUP_CHUNK = 1000
+
+# Rates in effect per (currency, day); rates of loaded days rarely change, so they are only re-read after the TTL
+rate_cache = TTLCache(maxsize=FX_RATE_CACHE_SIZE, ttl=FX_RATE_CACHE_TTL_SECONDS)
+
+
+def fx_cache_stats():
+    """Return size and hit/miss counters of the FX rate cache."""
+    return rate_cache.stats()
+
+
+def _day(value) -> date_type:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _rate_in_effect(currency, day):
+    """Scalar subquery of the latest rate of currency on or before day (values or columns)."""
+    return (
+        select(models.FxRate.rate)
+        .where(models.FxRate.currency == currency, models.FxRate.date <= day)
+        .order_by(models.FxRate.date.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def get_rates(db: Session, pairs: Iterable) -> dict:
+    """
+    Return {(currency, day): rate} for (currency, date or datetime) pairs; the reference currency is
+    always 1 and pairs without any rate on or before their day are left out. Pairs missing from
+    rate_cache are read together, with one statement per _LOOKUP_CHUNK pairs.
+    """
+    rates, missing = {}, []
+    for currency, day in {(currency, _day(day)) for currency, day in pairs}:
+        if currency == FX_REFERENCE_CURRENCY:
+            rates[(currency, day)] = Decimal(1)
+            continue
+        rate = rate_cache.get((currency, day))
+        if rate is None:
+            missing.append((currency, day))
+        else:
+            rates[(currency, day)] = rate
+
+    for start in range(0, len(missing), _LOOKUP_CHUNK):
+        chunk = missing[start:start + _LOOKUP_CHUNK]
+        row = db.execute(select(*(_rate_in_effect(currency, day) for currency, day in chunk))).one()
+        for pair, rate in zip(chunk, row):
+            if rate is not None:
+                rates[pair] = Decimal(str(rate))
+                rate_cache.set(pair, rates[pair])
+    return rates
+
+
+def _read_rates(db: Session, entries: Iterable) -> dict:
+    """Return get_rates for the pairs converting (currency, base currency, day) entries in another currency."""
+    return get_rates(db, [pair for currency, base, day in entries if currency not in (None, base) for pair in ((currency, day), (base, day))])
+
+
+def _missing_rate(rates: dict, currency, base, day) -> Optional[str]:
+    """Return the error of a rate missing from rates to convert currency to base on day, or None."""
+    for needed in (currency, base):
+        if (needed, day) not in rates:
+            return f"No {needed} exchange rate on or before {day.isoformat()}"
+    return None
+
+
+def rate_errors(db: Session, entries: list) -> list:
+    """
+    Return, for each (currency, base currency, date) entry, the error of a rate missing to convert it
+    (the message to_base_amounts would raise with), or None when it converts or needs no conversion.
+    Entries in other currencies cost get_rates, whose reads stay in rate_cache for the conversion.
+    """
+    entries = [(currency, base, _day(date)) for currency, base, date in entries]
+    rates = _read_rates(db, entries)
+    return [None if currency in (None, base) else _missing_rate(rates, currency, base, day) for currency, base, day in entries]
+
+
+def to_base_amounts(db: Session, user_id: int, entries: list) -> list:
+    """
+    Convert a user's (currency, date, amount) entries to the user's base currency, rounded to cents.
+    Without any currency set, the amounts are returned as they are and nothing is read; otherwise the
+    base currency and the uncached rates cost one statement each. Raises 422 when a rate is missing:
+    writes of many entries check them beforehand with rate_errors.
+    """
+    if all(currency is None for currency, _, _ in entries):
+        return [amount for _, _, amount in entries]
+
+    base = db.scalar(select(models.User.base_currency).where(models.User.id == user_id))
+    rates = _read_rates(db, [(currency, base, _day(date)) for currency, date, _ in entries])
+
+    amounts = []
+    for currency, date, amount in entries:
+        if currency in (None, base):
+            amounts.append(amount)
+            continue
+        day = _day(date)
+        missing = _missing_rate(rates, currency, base, day)
+        if missing:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=missing)
+        amounts.append((Decimal(amount) * rates[(base, day)] / rates[(currency, day)]).quantize(_CENT, ROUND_HALF_UP))
+    return amounts
+
+
+def stored_base_amount(entry) -> Decimal:
+    """
+    Return what an expense or income counts for in its owner's base currency: its amount as converted
+    when it was written. Entries stored without one (no rate when the column was added) count for
+    nothing, as they are left out of the sums.
+    """
+    return entry.base_amount if entry.base_amount is not None else Decimal("0.00")
+
+
+def _rate_row(row_number: int, day, currency, rate) -> dict:
+    try:
+        day = date_type.fromisoformat((day or "").strip()[:10])
+    except ValueError:
+        raise ValueError(f"Row {row_number}: invalid date {day!r}")
+    currency = (currency or "").strip().upper()
+    if not _CURRENCY.match(currency):
+        raise ValueError(f"Row {row_number}: invalid currency {currency!r}")
+    try:
+        rate = Decimal(rate.strip())
+    except (InvalidOperation, AttributeError):
+        raise ValueError(f"Row {row_number}: invalid rate {rate!r}")
+    if not rate > 0:
+        raise ValueError(f"Row {row_number}: rate must be positive")
+    return {"currency": currency, "date": day, "rate": rate}
+
+
+def read_fx_rates_csv(stream: BinaryIO) -> Iterator[dict]:
+    """
+    Yield {currency, date, rate} rows from a CSV rates file, either long (date, currency, rate
+    columns) or wide like the ECB reference rates history (a date column, then one column per
+    currency; empty and N/A cells are skipped). Raises ValueError on an invalid row.
+    """
+    reader = csv.reader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    header = [name.strip().lower() for name in next(reader, [])]
+    if "date" not in header:
+        raise ValueError("The rates file has no date column")
+    date_index = header.index("date")
+    long_format = "currency" in header and "rate" in header
+
+    for row_number, row in enumerate(reader, start=1):
+        if not any(cell.strip() for cell in row):
+            continue
+        if long_format:
+            yield _rate_row(row_number, row[date_index], row[header.index("currency")], row[header.index("rate")])
+            continue
+        for index, cell in enumerate(row):
+            if index != date_index and index < len(header) and header[index] and cell.strip() not in ("", "N/A"):
+                yield _rate_row(row_number, row[date_index], header[index], cell)
+
+
+def load_fx_rates(db: Session, rows: Iterable[dict]) -> int:
+    """
+    Insert or replace FX rates, IMPORT_CHUNK_SIZE rows per executemany, and commit.
+    Stored entries keep the base amounts they were converted to, so no derived data or cached result
+    changes; the rates apply to the entries written afterwards. rate_cache is per process: this one is
+    cleared, other workers keep converting with the rates they cached until FX_RATE_CACHE_TTL_SECONDS.
+    :param rows: {currency, date, rate} dicts, e.g. from read_fx_rates_csv.
+    :return: Number of rates loaded.
+    """
+    table = models.FxRate.__table__
+    stmt = dialect_insert(db, table)
+    stmt = stmt.on_conflict_do_update(index_elements=["currency", "date"], set_={"rate": stmt.excluded.rate})
+
+    loaded = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            db.execute(stmt, chunk)
+            loaded += len(chunk)
+            chunk = []
+    if chunk:
+        db.execute(stmt, chunk)
+        loaded += len(chunk)
+    db.commit()
+    rate_cache.clear()
+    return loaded
@@ -0,0 +1,125 @@
+import csv
+import io
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import BinaryIO, Iterable, Iterator, Tuple
+
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+
+from .fx_utils import rate_errors
+
+
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)")
+
+
+def _text_stream(stream: BinaryIO):
+    """Wrap an uploaded binary file as text, accepting an optional UTF-8 BOM."""
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+
+def parse_csv_rows(stream: BinaryIO) -> Iterator[Tuple[int, dict]]:
+    """
+    Yield (row number, row) pairs from a CSV upload, one line at a time.
+    Header names are matched case-insensitively; empty cells are returned as None.
+    :param stream: Binary file object of the upload.
+    """
+    reader = csv.DictReader(_text_stream(stream))
+    for row_number, row in enumerate(reader, start=1):
+        yield row_number, {
+            (key or "").strip().lower(): (value.strip() or None) if isinstance(value, str) else value
+            for key, value in row.items()
+        }
+
+
+def _parse_ofx_date(value: str):
+    """Parse an OFX date (YYYYMMDD[HHMMSS[.XXX]][TZ]) into a naive datetime."""
+    digits = re.match(r"\d+", value.strip())
+    if digits is None:
+        return value
+    digits = digits.group(0)
+    if len(digits) >= 14:
+        return datetime.strptime(digits[:14], "%Y%m%d%H%M%S")
+    return datetime.strptime(digits[:8], "%Y%m%d")
+
+
+def parse_ofx_rows(stream: BinaryIO) -> Iterator[Tuple[int, dict]]:
+    """
+    Yield (transaction number, row) pairs from the STMTTRN entries of an OFX upload.
+    Rows carry title, description, date and the signed amount (negative for debits).
+    :param stream: Binary file object of the upload.
+    """
+    transaction = None
+    row_number = 0
+    for line in _text_stream(stream):
+        for closing, tag, value in _OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if closing and transaction is not None:
+                    row_number += 1
+                    yield row_number, transaction
+                    transaction = None
+                elif not closing:
+                    transaction = {}
+            elif transaction is not None and not closing:
+                value = value.strip()
+                if tag == "TRNAMT":
+                    transaction["amount"] = value
+                elif tag == "DTPOSTED":
+                    try:
+                        transaction["date"] = _parse_ofx_date(value)
+                    except ValueError:
+                        transaction["date"] = value
+                elif tag == "NAME":
+                    transaction["title"] = value
+                elif tag == "MEMO":
+                    transaction["description"] = value
+
+
+def _signed_rows(rows: Iterable[Tuple[int, dict]], sign: int) -> Iterator[Tuple[int, dict]]:
+    for row_number, row in rows:
+        try:
+            amount = Decimal(row.get("amount") or "0") * sign
+        except InvalidOperation:
+            yield row_number, row
+            continue
+        if amount > 0:
+            yield row_number, {**row, "amount": amount}
+
+
+def read_import_rows(stream: BinaryIO, file_format: str, kind: str) -> Iterator[Tuple[int, dict]]:
+    """
+    Return an iterator of (row number, row) pairs for an expense or income upload.
+    OFX statements contain both directions, so only debits are kept for expenses and
+    only credits for incomes, with the amount made positive.
+    :param stream: Binary file object of the upload.
+    :param file_format: "csv" or "ofx".
+    :param kind: "expense" or "income".
+    """
+    if file_format == "csv":
+        return parse_csv_rows(stream)
+    if file_format == "ofx":
+        return _signed_rows(parse_ofx_rows(stream), -1 if kind == "expense" else 1)
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported import format")
+
+
+def validation_messages(exc: ValidationError):
+    """Flatten a pydantic ValidationError into "field: message" strings."""
+    return [f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}" for error in exc.errors()]
+
+
+def convertible_rows(db, chunk: list, base_currency: str, errors: list) -> list:
+    """
+    Return the rows of (row number, row) pairs whose amount converts to the owner's base currency,
+    and add an error for each of the others to errors, without raising, so that one row in a
+    currency without a rate does not fail the rest of the upload.
+    """
+    messages = rate_errors(db, [(row["currency"], base_currency, row["date"]) for _, row in chunk])
+    rows = []
+    for (row_number, row), message in zip(chunk, messages):
+        if message is None:
+            rows.append(row)
+        else:
+            errors.append({"row": row_number, "errors": [f"currency: {message}"]})
+    return rows
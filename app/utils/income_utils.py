@@ -1,36 +1,149 @@
+from collections import defaultdict
 from datetime import datetime
 from typing import Optional
 from fastapi import HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
-from sqlalchemy import func, Integer, String, label
 
-from .. import models
+from .. import models, schemas
+from .async_utils import to_async
+from .balance_utils import shift_balance_checkpoints
+from .constants import IMPORT_CHUNK_SIZE
+from .fx_utils import stored_base_amount, to_base_amounts
+from .import_utils import convertible_rows, validation_messages
+from .metrics_utils import extend_query_budget
+from .pagination_utils import apply_keyset, apply_offset, stream_ndjson
+from .rollup_utils import apply_income_rollup_changes, get_income_totals_by_period
+from .search_utils import apply_search, dialect_name
+from .version_utils import bump_data_version
 
 
-def create_income_in_db(db: Session, title: str, amount, description: Optional[str], date: Optional[datetime], user_id: int):
+# 404 detail of a missing or foreign income, shared with the batch operations
+INCOME_NOT_FOUND = "Income not found"
+
+
+def apply_income_effects(db: Session, user_id: int, changes):
+    """
+    Keep data derived from incomes in step with a write, inside the caller's transaction.
+    :param changes: (date, base amount, sign) tuples, sign is 1 for added and -1 for removed incomes;
+        removed ones count for their stored_base_amount.
+    """
+    apply_income_rollup_changes(db, user_id, changes)
+    shift_balance_checkpoints(db, user_id, [(date, amount * sign) for date, amount, sign in changes])
+    bump_data_version(db, user_id)
+
+
+def create_income_in_db(db: Session, title: str, amount, description: Optional[str], date: Optional[datetime], user_id: int,
+    currency: Optional[str] = None):
     """
-    Create a new income record for the given user.
+    Create a new income record for the given user, in currency (None for the user's base currency).
     """
+    date = date or datetime.utcnow()
+    base_amount, = to_base_amounts(db, user_id, [(currency, date, amount)])
     new_income = models.Income(
         title=title,
         amount=amount,
+        currency=currency,
+        base_amount=base_amount,
         description=description,
-        date=date or datetime.utcnow(),
+        date=date,
         user_id=user_id,
     )
     db.add(new_income)
+    apply_income_effects(db, user_id, [(date, base_amount, 1)])
     db.commit()
     db.refresh(new_income)
 
     return new_income
 
 
-def get_incomes_for_user(db: Session, user_id: int, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
-    min_amount: Optional[float] = None, max_amount: Optional[float] = None):
+def insert_income_rows(db: Session, rows: list):
     """
-    Return incomes for a user with optional filtering
+    Insert validated income rows, of one or several users, with one executemany and update each
+    owner's derived data, inside the caller's transaction.
+    :param rows: Dicts of Income column values, each with a date and a user_id; their base_amount is set here.
     """
-    query = db.query(models.Income).filter(models.Income.user_id == user_id)
+    by_user = defaultdict(list)
+    for row in rows:
+        by_user[row["user_id"]].append(row)
+    for user_id, user_rows in by_user.items():
+        amounts = to_base_amounts(db, user_id, [(row.get("currency"), row["date"], row["amount"]) for row in user_rows])
+        for row, base_amount in zip(user_rows, amounts):
+            row["base_amount"] = base_amount
+    # NULLs are sent as values, so that rows with and without a currency or description share one executemany
+    db.execute(insert(models.Income).execution_options(render_nulls=True), rows)
+    for user_id, user_rows in by_user.items():
+        apply_income_effects(db, user_id, [(row["date"], row["base_amount"], 1) for row in user_rows])
+
+
+# Statements one import chunk may run, granted to the request on top of its route's budget: the executemany,
+# the rollups, two for the balance checkpoints and the data version, plus for amounts in other currencies
+# up to two rate lookups (IMPORT_CHUNK_SIZE rows, two rates each) to check the rows, and the base currency
+# and the rates that left rate_cache since to convert them
+IMPORT_CHUNK_STATEMENTS = 10
+
+
+def _insert_income_chunk(db: Session, chunk: list, base_currency: str, errors: list):
+    """
+    Insert a chunk of validated (row number, income row) pairs with one executemany and commit it.
+    Rows whose amount has no exchange rate to the base currency are reported in errors instead.
+    """
+    extend_query_budget(IMPORT_CHUNK_STATEMENTS)
+    rows = convertible_rows(db, chunk, base_currency, errors)
+    if rows:
+        insert_income_rows(db, rows)
+        db.commit()
+    return len(rows)
+
+
+def import_incomes_in_db(db: Session, user_id: int, rows):
+    """
+    Bulk-create incomes from parsed upload rows and return a per-row error report.
+    Valid rows are inserted in chunks of IMPORT_CHUNK_SIZE, one transaction per chunk. Rows in a currency
+    without an exchange rate on or before their date are reported like invalid ones.
+    :param db: SQLAlchemy session.
+    :param user_id: Owner user's id.
+    :param rows: (row number, row) pairs, e.g. from read_import_rows.
+    """
+    base_currency = db.scalar(select(models.User.base_currency).where(models.User.id == user_id))
+    imported = 0
+    errors = []
+    chunk = []
+    for row_number, row in rows:
+        try:
+            income = schemas.IncomeCreate.model_validate(row)
+        except ValidationError as exc:
+            errors.append({"row": row_number, "errors": validation_messages(exc)})
+            continue
+
+        chunk.append((row_number, {
+            "title": income.title,
+            "amount": income.amount,
+            "currency": income.currency,
+            "description": income.description,
+            "date": income.date or datetime.utcnow(),
+            "user_id": user_id,
+        }))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            imported += _insert_income_chunk(db, chunk, base_currency, errors)
+            chunk = []
+
+    if chunk:
+        imported += _insert_income_chunk(db, chunk, base_currency, errors)
+
+    errors.sort(key=lambda error: error["row"])
+    return {"imported": imported, "failed": len(errors), "errors": errors}
+
+
+def _incomes_query(user_id: int, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+    min_amount: Optional[float] = None, max_amount: Optional[float] = None, cursor: Optional[str] = None, limit: Optional[int] = None,
+    q: Optional[str] = None, dialect: str = "sqlite"):
+    """
+    Build the filtered incomes select for a user, ordered by (date, id) and continued after cursor.
+    With q, only the matches of the full-text search are kept, best match first, and cursor is an offset cursor.
+    """
+    query = select(models.Income).filter(models.Income.user_id == user_id)
 
     if start_date is not None:
         query = query.filter(models.Income.date >= start_date)
@@ -41,7 +154,31 @@ def get_incomes_for_user(db: Session, user_id: int, start_date: Optional[datetim
     if max_amount is not None:
         query = query.filter(models.Income.amount <= max_amount)
 
-    return query.all()
+    if q is not None:
+        return apply_offset(apply_search(query, models.Income, user_id, q, dialect), cursor, limit)
+    return apply_keyset(query, models.Income, cursor, limit)
+
+
+def get_incomes_for_user(db: Session, user_id: int, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+    min_amount: Optional[float] = None, max_amount: Optional[float] = None, cursor: Optional[str] = None, limit: Optional[int] = None,
+    q: Optional[str] = None):
+    """
+    Return incomes for a user with optional filtering, ordered by (date, id).
+    Pass limit to get a single page and the previous page's cursor to continue after it.
+    Pass q to search titles and descriptions instead: matches come best first, paged with next_offset_cursor.
+    """
+    return db.scalars(_incomes_query(user_id, start_date, end_date, min_amount, max_amount, cursor, limit, q, dialect_name(db))).all()
+
+
+def stream_incomes_for_user(db: Session, user_id: int, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+    min_amount: Optional[float] = None, max_amount: Optional[float] = None, cursor: Optional[str] = None, limit: Optional[int] = None,
+    q: Optional[str] = None):
+    """
+    Return an iterator of a user's incomes as NDJSON lines, fetching rows in batches so memory stays flat.
+    The iterator is asynchronous when db is an AsyncSession.
+    """
+    query = _incomes_query(user_id, start_date, end_date, min_amount, max_amount, cursor, limit, q, dialect_name(db))
+    return stream_ndjson(db, query, schemas.IncomeOut)
 
 
 def get_income_for_user(db: Session, income_id: int, user_id: int):
@@ -54,12 +191,13 @@ def get_income_for_user(db: Session, income_id: int, user_id: int):
     ).first()
 
     if not income:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="income not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=INCOME_NOT_FOUND)
     
     return income
 
 
-def update_income_in_db(db: Session, income_id: int, user_id: int, title: str, amount, description: Optional[str], date: Optional[datetime]):
+def update_income_in_db(db: Session, income_id: int, user_id: int, title: str, amount, description: Optional[str], date: Optional[datetime],
+    currency: Optional[str] = None):
     """
     Update an income. Verifies income. Raises 404 when missing.
     """
@@ -69,12 +207,19 @@ def update_income_in_db(db: Session, income_id: int, user_id: int, title: str, a
     ).first()
 
     if not income:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="income not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=INCOME_NOT_FOUND)
+
+    removed = (income.date, stored_base_amount(income), -1)
+    date = date or income.date
+    base_amount, = to_base_amounts(db, user_id, [(currency, date, amount)])
 
     income.title = title
     income.amount = amount
+    income.currency = currency
+    income.base_amount = base_amount
     income.description = description
-    income.date = date or income.date
+    income.date = date
+    apply_income_effects(db, user_id, [removed, (date, base_amount, 1)])
     db.commit()
     db.refresh(income)
 
@@ -91,8 +236,9 @@ def delete_income_in_db(db: Session, income_id: int, user_id: int):
     ).first()
 
     if not income:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="income not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=INCOME_NOT_FOUND)
     
+    apply_income_effects(db, user_id, [(income.date, stored_base_amount(income), -1)])
     db.delete(income)
     db.commit()
 
@@ -101,36 +247,20 @@ def delete_income_in_db(db: Session, income_id: int, user_id: int):
 
 def get_income_summary_util(db: Session, user_id: int, period: str = "month"):
     """
-    Return summary data: total per category and total per period (month/quarter/year).
-    """
-    if period == "month":
-        period_total = (
-            db.query(func.strftime("%Y-%m", models.Income.date), func.sum(models.Income.amount))
-            .filter(models.Income.user_id == user_id)
-            .group_by(func.strftime("%Y-%m", models.Income.date))
-            .all()
-        )
-    elif period == "quarter":
-        quarter_label = label(
-            "quarter",
-            (func.strftime("%Y", models.Income.date) + "-" +
-            ((func.strftime("%m", models.Income.date).cast(Integer)-1)/3 + 1).cast(String))
-        )
-
-        period_total = (
-            db.query(quarter_label, func.sum(models.Income.amount))
-            .filter(models.Income.user_id == user_id)
-            .group_by(quarter_label)
-            .all()
-        )
-    else:  # year
-        period_total = (
-            db.query(func.strftime("%Y", models.Income.date), func.sum(models.Income.amount))
-            .filter(models.Income.user_id == user_id)
-            .group_by(func.strftime("%Y", models.Income.date))
-            .all()
-        )
+    Return summary data: total per period (month/quarter/year).
+    Totals are read from the monthly income rollups rather than the raw incomes.
+    """
+    period_total = get_income_totals_by_period(db, user_id, period)
 
     return {
         "total_per_period": [{"period": p, "total": t} for p, t in period_total],
-    }
\ No newline at end of file
+    }
+
+
+# Awaitable variants for the async routers, usable with a Session or an AsyncSession
+create_income_in_db_async = to_async(create_income_in_db)
+get_incomes_for_user_async = to_async(get_incomes_for_user)
+get_income_for_user_async = to_async(get_income_for_user)
+update_income_in_db_async = to_async(update_income_in_db)
+delete_income_in_db_async = to_async(delete_income_in_db)
+get_income_summary_util_async = to_async(get_income_summary_util)
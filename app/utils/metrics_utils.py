@@ -0,0 +1,280 @@
+"""
+Request and SQL metrics in the Prometheus text format.
+
+SQLAlchemy cursor events count and time every statement; a pure ASGI middleware attributes them
+to the request that ran them (through a context variable, which the threadpool and AsyncSession
+greenlets inherit) and records per-route latency. Pool checkouts are timed by wrapping each
+engine pool's connect(). Metrics live in process memory, so each worker exposes its own.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from .constants import SLOW_QUERY_MS
+from .query_budget_utils import check_statement, report_request, route_query_budget
+
+
+logger = logging.getLogger("app.sql")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names."""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield f"{self.name}{_labels(self.labels, label_values)} {_number(value)}"
+
+
+class Histogram:
+    """Cumulative histogram with a fixed set of label names."""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # per-bucket counts (the last one is +Inf), then the sum of observations
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = sorted((label_values, list(values)) for label_values, values in self._series.items())
+        for label_values, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.labels + ('le',), label_values + (_number(bound),))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, label_values)} {_number(values[-1])}"
+            yield f"{self.name}_count{_labels(self.labels, label_values)} {cumulative}"
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+http_requests = Counter("budget_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+http_latency = Histogram("budget_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+http_db_time = Histogram("budget_http_request_db_seconds", "Time spent executing SQL per HTTP request.", ("method", "route"))
+http_queries = Histogram("budget_http_request_queries", "SQL statements executed per HTTP request.", ("method", "route"), COUNT_BUCKETS)
+db_queries = Counter("budget_db_queries_total", "SQL statements executed, by engine.", ("engine",))
+db_query_time = Histogram("budget_db_query_duration_seconds", "SQL statement execution time, by engine.", ("engine",))
+db_slow_queries = Counter("budget_db_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS, by engine.", ("engine",))
+pool_checkout_time = Histogram("budget_db_pool_checkout_seconds", "Time waited for a pooled connection, by engine.", ("engine",))
+over_budget = Counter("budget_http_requests_over_query_budget_total", "HTTP requests that ran more SQL statements than their route's budget.",
+                      ("method", "route"))
+
+METRICS = [http_requests, http_latency, http_db_time, http_queries, db_queries, db_query_time, db_slow_queries, pool_checkout_time, over_budget]
+
+
+class RequestStats:
+    """SQL work attributed to one HTTP request."""
+    __slots__ = ("scope", "queries", "db_seconds", "extra_budget")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.queries = 0
+        self.db_seconds = 0.0
+        # statements granted on top of the route's budget by extend_query_budget
+        self.extra_budget = 0
+
+    @property
+    def route(self) -> str:
+        """Path template of the matched route, or "unmatched" (also before routing)."""
+        return getattr(self.scope.get("route"), "path", "unmatched")
+
+    @property
+    def budget(self):
+        """Query budget of the matched route, if it declares one, plus the statements granted while serving it."""
+        budget = route_query_budget(self.scope.get("route"))
+        return None if budget is None else budget + self.extra_budget
+
+
+# Stats of the request being served; None outside requests (e.g. maintenance commands)
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def extend_query_budget(statements: int):
+    """
+    Allow the request being served to run more statements than its route's budget, for work whose
+    size depends on the request (e.g. each chunk of a streamed import). A no-op outside requests.
+    """
+    stats = current_request.get()
+    if stats is not None:
+        stats.extra_budget += statements
+
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """Collapse a statement to its shape: literals become ?, IN lists (?, ...) and whitespace single spaces."""
+    statement = _LITERALS.sub("?", statement)
+    statement = _IN_LISTS.sub("(?, ...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def instrument_engine(engine, name: str):
+    """
+    Count and time the statements and pool checkouts of an engine (sync, or the sync_engine of an AsyncEngine).
+    :param name: Engine label on the metrics, e.g. "writer" or "reader".
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            check_statement(stats.route, stats.budget, stats.queries, statement)
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        db_queries.inc(name)
+        db_query_time.observe(elapsed, name)
+        stats = current_request.get()
+        if stats is not None:
+            stats.db_seconds += elapsed
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            db_slow_queries.inc(name)
+            logger.warning("Slow query (%.1f ms, %s, %s): %s", elapsed * 1000, name,
+                           stats.route if stats is not None else "-", normalize_sql(statement))
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+    _time_pool_checkouts(engine.pool, name)
+
+
+def _time_pool_checkouts(pool, name: str):
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            pool_checkout_time.observe(time.perf_counter() - started, name)
+
+    pool.connect = timed_connect
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, SQL statement count and SQL time of every HTTP request,
+    labelled with the matched route's path template (or "unmatched").
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            method, route = scope["method"], stats.route
+            http_requests.inc(method, route, status_code)
+            http_latency.observe(elapsed, method, route)
+            http_db_time.observe(stats.db_seconds, method, route)
+            http_queries.observe(stats.queries, method, route)
+            if report_request(method, route, stats.budget, stats.queries):
+                over_budget.inc(method, route)
+
+
+def render_metrics(extra_collectors=()) -> str:
+    """
+    Render every metric in the Prometheus text exposition format.
+    :param extra_collectors: Callables yielding additional exposition lines (e.g. cache gauges).
+    """
+    lines = [line for metric in METRICS for line in metric.render()]
+    for collector in extra_collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
+
+
+def _family_lines(name: str, documentation: str, metric_type: str, label: str, values: dict):
+    yield f"# HELP {name} {documentation}"
+    yield f"# TYPE {name} {metric_type}"
+    for label_value, value in sorted(values.items()):
+        yield f"{name}{_labels((label,), (label_value,))} {_number(value)}"
+
+
+def gauge_lines(name: str, documentation: str, label: str, values: dict):
+    """Yield the exposition lines of a gauge family from {label value: number}."""
+    yield from _family_lines(name, documentation, "gauge", label, values)
+
+
+def counter_lines(name: str, documentation: str, label: str, values: dict):
+    """Yield the exposition lines of a counter family from {label value: total so far}; name ends in _total."""
+    yield from _family_lines(name, documentation, "counter", label, values)
@@ -0,0 +1,113 @@
+import base64
+from datetime import datetime
+from typing import AsyncIterator, Iterator, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .constants import STREAM_BATCH_SIZE
+
+
+def encode_cursor(date: datetime, row_id: int) -> str:
+    """Encode the (date, id) position of a row as an opaque cursor string."""
+    raw = f"{date.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    """
+    Decode a cursor produced by encode_cursor back into (date, id).
+    Raises HTTPException 400 for malformed cursors.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        date, row_id = raw.split("|")
+        return datetime.fromisoformat(date), int(row_id)
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def apply_keyset(query, model, cursor: Optional[str] = None, limit: Optional[int] = None):
+    """
+    Order query by (date, id) and continue after cursor.
+    :param query: Query or select over model.
+    :param model: Mapped class with `date` and `id` columns.
+    :param cursor: Optional cursor of the last row of the previous page.
+    :param limit: Optional maximum number of rows.
+    """
+    if cursor is not None:
+        query = query.filter(tuple_(model.date, model.id) > tuple_(*decode_cursor(cursor)))
+    query = query.order_by(model.date, model.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def next_cursor(rows: list, limit: Optional[int]):
+    """Return the cursor of the page after rows, or None when rows was the last page."""
+    if limit is None or len(rows) < limit:
+        return None
+    return encode_cursor(rows[-1].date, rows[-1].id)
+
+
+def encode_offset_cursor(offset: int) -> str:
+    """Encode a position in a ranked result list as an opaque cursor string."""
+    return base64.urlsafe_b64encode(f"offset|{offset}".encode("utf-8")).decode("ascii")
+
+
+def decode_offset_cursor(cursor: str) -> int:
+    """
+    Decode a cursor produced by encode_offset_cursor back into the offset.
+    Raises HTTPException 400 for malformed cursors.
+    """
+    try:
+        kind, offset = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+        if kind != "offset" or int(offset) < 0:
+            raise ValueError(kind)
+        return int(offset)
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def apply_offset(query, cursor: Optional[str] = None, limit: Optional[int] = None):
+    """
+    Continue an already ordered query after cursor. Used for results ranked by relevance: the
+    ranking scores every match anyway, so skipping the previous pages' rows costs no more than a keyset.
+    """
+    if cursor is not None:
+        query = query.offset(decode_offset_cursor(cursor))
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def next_offset_cursor(cursor: Optional[str], rows: list, limit: Optional[int]):
+    """Return the cursor of the ranked page after rows, or None when rows was the last page."""
+    if limit is None or len(rows) < limit:
+        return None
+    return encode_offset_cursor((decode_offset_cursor(cursor) if cursor is not None else 0) + len(rows))
+
+
+def stream_ndjson(db, statement, schema):
+    """
+    Return an iterator of the statement's rows as newline-delimited JSON, fetching STREAM_BATCH_SIZE
+    rows at a time. An async iterator is returned for an AsyncSession.
+    :param db: Session or AsyncSession.
+    :param statement: Select producing ORM rows.
+    :param schema: Pydantic model used to serialize each row.
+    """
+    statement = statement.execution_options(yield_per=STREAM_BATCH_SIZE)
+    if isinstance(db, AsyncSession):
+        return _stream_ndjson_async(db, statement, schema)
+    return _stream_ndjson(db, statement, schema)
+
+
+def _stream_ndjson(db, statement, schema) -> Iterator[str]:
+    for row in db.scalars(statement):
+        yield schema.model_validate(row, from_attributes=True).model_dump_json() + "\n"
+
+
+async def _stream_ndjson_async(db, statement, schema) -> AsyncIterator[str]:
+    async for row in await db.stream_scalars(statement):
+        yield schema.model_validate(row, from_attributes=True).model_dump_json() + "\n"
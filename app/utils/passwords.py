@@ -0,0 +1,132 @@
+"""
+Password hashing and the worker pool that keeps bcrypt off the request path.
+
+Nothing from the application beyond the constants is imported here, so pool workers start cheaply.
+"""
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+
+from .constants import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_CONCURRENCY, PASSWORD_HASH_MAX_QUEUE
+
+
+@functools.lru_cache(maxsize=None)
+def get_pwd_context():
+    """
+    Return the password hashing context; hashes with any other bcrypt cost are flagged for rehashing.
+    passlib is imported on first use, so importing the application (or a pool worker) stays cheap.
+    """
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS,
+        bcrypt__max_rounds=BCRYPT_ROUNDS,
+    )
+
+def truncate_password_for_bcrypt(password: str):
+    """
+    Truncate the password to 72 bytes.
+    """
+    encoded = password.encode("utf-8")
+
+    if len(encoded) <= 72:
+        return password
+    truncated = encoded[:72]
+
+    return truncated.decode("utf-8", errors="ignore")
+
+def hash_password(password: str):
+    """
+    Hash a plaintext password and return the hash string.
+    """
+    safe_pw = truncate_password_for_bcrypt(password)
+    return get_pwd_context().hash(safe_pw)
+
+def verify_password(plain_password, hashed_password):
+    """
+    Verify a plaintext password against the stored hash.
+    """
+    safe_pw = truncate_password_for_bcrypt(plain_password)
+    return get_pwd_context().verify(safe_pw, hashed_password)
+
+def verify_and_update_password(plain_password, hashed_password):
+    """
+    Verify a plaintext password and return (valid, new_hash).
+    new_hash is set when the stored hash uses another bcrypt cost and should be replaced.
+    """
+    safe_pw = truncate_password_for_bcrypt(plain_password)
+    return get_pwd_context().verify_and_update(safe_pw, hashed_password)
+
+
+_executor = None
+_slots = None
+_stats = {"running": 0, "waiting": 0, "completed": 0, "rejected": 0}
+
+def _get_executor():
+    global _executor
+    if _executor is None and PASSWORD_HASH_WORKERS > 0:
+        # spawn rather than fork: the server process runs threads that must not be duplicated
+        _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+async def _run_in_pool(fn, *args):
+    """
+    Run a hashing function on the worker pool, at most PASSWORD_HASH_CONCURRENCY at a time.
+    Raises HTTPException 503 when more than PASSWORD_HASH_MAX_QUEUE calls are already waiting.
+    """
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(PASSWORD_HASH_CONCURRENCY)
+
+    if _slots.locked() and _stats["waiting"] >= PASSWORD_HASH_MAX_QUEUE:
+        _stats["rejected"] += 1
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many authentication requests, retry later",
+                            headers={"Retry-After": "1"})
+
+    _stats["waiting"] += 1
+    try:
+        await _slots.acquire()
+    finally:
+        _stats["waiting"] -= 1
+
+    _stats["running"] += 1
+    try:
+        executor = _get_executor()
+        if executor is None:
+            return await run_in_threadpool(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+    finally:
+        _stats["running"] -= 1
+        _stats["completed"] += 1
+        _slots.release()
+
+async def hash_password_async(password: str):
+    """Hash a plaintext password on the worker pool."""
+    return await _run_in_pool(hash_password, password)
+
+async def verify_and_update_password_async(plain_password, hashed_password):
+    """Verify a plaintext password on the worker pool; see verify_and_update_password."""
+    return await _run_in_pool(verify_and_update_password, plain_password, hashed_password)
+
+def password_pool_stats():
+    """Return the pool size and concurrency limit with its running/waiting (queue depth) counters."""
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "concurrency": PASSWORD_HASH_CONCURRENCY,
+        "max_queue": PASSWORD_HASH_MAX_QUEUE,
+        **_stats,
+    }
+
+def shutdown_password_pool():
+    """Stop the worker processes, if they were started."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
@@ -0,0 +1,129 @@
+"""
+Dialect-neutral bucketing of timestamps into period labels.
+
+period_bucket(column, granularity) renders as strftime() on SQLite and date_trunc()/to_char() on
+PostgreSQL, and produces the same text labels on both:
+day "YYYY-MM-DD", week "YYYY-MM-DD" (the Monday starting the week), month "YYYY-MM",
+quarter "YYYY-Q" and year "YYYY". period_start, add_periods and period_label do the same
+bucketing for Python datetimes, and month_period_start turns month labels back into dates.
+"""
+import calendar
+from datetime import datetime, timedelta
+
+from sqlalchemy import Date, String
+from sqlalchemy.exc import CompileError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+
+GRANULARITIES = ("day", "week", "month", "quarter", "year")
+
+
+class period_bucket(FunctionElement):
+    """
+    SQL expression labelling a timestamp column with the period it falls in.
+    :param column: Timestamp column or expression.
+    :param granularity: One of GRANULARITIES.
+    """
+    type = String()
+    name = "period_bucket"
+    inherit_cache = True
+
+    def __init__(self, column, granularity: str):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unsupported period granularity: {granularity}")
+        self.granularity = granularity
+        super().__init__(column)
+
+    # the granularity is rendered into the SQL text, so it must be part of the statement cache key
+    _traverse_internals = FunctionElement._traverse_internals + [("granularity", InternalTraversal.dp_string)]
+
+
+_SQLITE_FORMATS = {"day": "%Y-%m-%d", "month": "%Y-%m", "year": "%Y"}
+
+
+@compiles(period_bucket, "sqlite")
+def _period_bucket_sqlite(element, compiler, **kw):
+    column = compiler.process(list(element.clauses)[0], **kw)
+    if element.granularity == "week":
+        # 'weekday 0' moves forward to Sunday (or stays on it); six days back is that week's Monday
+        return f"date({column}, 'weekday 0', '-6 days')"
+    if element.granularity == "quarter":
+        return f"(strftime('%Y', {column}) || '-' || ((CAST(strftime('%m', {column}) AS INTEGER) + 2) / 3))"
+    return f"strftime('{_SQLITE_FORMATS[element.granularity]}', {column})"
+
+
+_POSTGRESQL_FORMATS = {"day": "YYYY-MM-DD", "week": "YYYY-MM-DD", "month": "YYYY-MM", "quarter": "YYYY-Q", "year": "YYYY"}
+
+
+@compiles(period_bucket, "postgresql")
+def _period_bucket_postgresql(element, compiler, **kw):
+    column = compiler.process(list(element.clauses)[0], **kw)
+    return f"to_char(date_trunc('{element.granularity}', {column}), '{_POSTGRESQL_FORMATS[element.granularity]}')"
+
+
+@compiles(period_bucket)
+def _period_bucket_default(element, compiler, **kw):
+    raise CompileError(f"period_bucket is not supported on the {compiler.dialect.name} dialect")
+
+
+class month_period_start(FunctionElement):
+    """
+    SQL expression of the first day of a "YYYY-MM" month label column (e.g. a rollup period), which
+    period_bucket can bucket further into quarters and years.
+    """
+    type = Date()
+    name = "month_period_start"
+    inherit_cache = True
+
+
+@compiles(month_period_start, "sqlite")
+def _month_period_start_sqlite(element, compiler, **kw):
+    # SQLite date functions take the text as it is
+    return f"({compiler.process(list(element.clauses)[0], **kw)} || '-01')"
+
+
+@compiles(month_period_start, "postgresql")
+def _month_period_start_postgresql(element, compiler, **kw):
+    return f"to_date({compiler.process(list(element.clauses)[0], **kw)}, 'YYYY-MM')"
+
+
+@compiles(month_period_start)
+def _month_period_start_default(element, compiler, **kw):
+    raise CompileError(f"month_period_start is not supported on the {compiler.dialect.name} dialect")
+
+
+def period_start(moment: datetime, granularity: str) -> datetime:
+    """Return the start of the granularity period containing moment (weeks start on Monday)."""
+    day = datetime(moment.year, moment.month, moment.day)
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return datetime(moment.year, moment.month, 1)
+    if granularity == "quarter":
+        return datetime(moment.year, 3 * ((moment.month - 1) // 3) + 1, 1)
+    if granularity == "year":
+        return datetime(moment.year, 1, 1)
+    raise ValueError(f"Unsupported period granularity: {granularity}")
+
+
+def add_periods(start: datetime, granularity: str, count: int) -> datetime:
+    """
+    Move a timestamp by count periods (negative to go back).
+    A day of month past the end of the target month is clamped to its last day (Jan 31 + 1 month is Feb 28/29).
+    """
+    if granularity in ("day", "week"):
+        return start + timedelta(days=count * (7 if granularity == "week" else 1))
+    months = {"month": 1, "quarter": 3, "year": 12}[granularity] * count
+    year, month = divmod(start.year * 12 + start.month - 1 + months, 12)
+    return start.replace(year=year, month=month + 1, day=min(start.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def period_label(start: datetime, granularity: str) -> str:
+    """Return the label period_bucket gives to the period starting at start."""
+    if granularity == "quarter":
+        return f"{start.year}-{(start.month + 2) // 3}"
+    return start.strftime({"day": "%Y-%m-%d", "week": "%Y-%m-%d", "month": "%Y-%m", "year": "%Y"}[granularity])
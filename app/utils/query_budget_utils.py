@@ -0,0 +1,63 @@
+"""
+Per-route limits on the SQL statements one request may execute.
+
+Routes declare their budget with @query_budget(n), placed below the router decorator. The SQL
+instrumentation of metrics_utils counts every request's statements against its route's budget:
+with QUERY_BUDGET_ENFORCE set (tests, debugging) the statement that goes over the budget raises
+QueryBudgetExceeded instead of running; otherwise the request is logged and counted on /metrics.
+"""
+import logging
+from typing import Optional
+
+from fastapi.routing import APIRoute
+
+from .constants import QUERY_BUDGET_ENFORCE
+
+
+logger = logging.getLogger("app.sql")
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """Raised in enforcing mode by the statement that takes a request over its route's query budget."""
+
+
+def query_budget(max_statements: int):
+    """
+    Declare the most SQL statements a request to the decorated route may execute, including its
+    dependencies (authentication, conditional-request checks).
+    """
+    def decorator(endpoint):
+        endpoint.query_budget = max_statements
+        return endpoint
+    return decorator
+
+
+def route_query_budget(route) -> Optional[int]:
+    """Return the query budget declared for a route's endpoint, or None."""
+    return getattr(getattr(route, "endpoint", None), "query_budget", None)
+
+
+def routes_without_budget(app) -> list:
+    """Return "METHOD path" for every API route of app that declares no query budget."""
+    return [
+        f"{','.join(sorted(route.methods))} {route.path}"
+        for route in app.routes
+        if isinstance(route, APIRoute) and route_query_budget(route) is None
+    ]
+
+
+def check_statement(route: str, budget: Optional[int], statements: int, statement: str):
+    """
+    Called before each statement of a request with the count including it; raises
+    QueryBudgetExceeded in enforcing mode once the count passes the route's budget.
+    """
+    if QUERY_BUDGET_ENFORCE and budget is not None and statements > budget:
+        raise QueryBudgetExceeded(f"{route} exceeded its query budget of {budget} statements with: {' '.join(statement.split())}")
+
+
+def report_request(method: str, route: str, budget: Optional[int], statements: int) -> bool:
+    """Log a finished request that ran more statements than its route's budget; return whether it did."""
+    if budget is None or statements <= budget:
+        return False
+    logger.warning("%s %s ran %d SQL statements, over its query budget of %d", method, route, statements, budget)
+    return True
@@ -0,0 +1,182 @@
+"""
+EXPLAIN QUERY PLAN checks for the queries issued by the utils.
+
+The utils are run against a scratch in-memory SQLite database built from the models; every statement
+they issue is captured and explained, and any plan step that scans a whole table is reported (except
+the whole-table updates some maintenance steps exist for, listed in _EXPECTED_SCANS).
+"""
+import re
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from ..database import Base
+from ..schemas import BatchOperation, RecurringRuleCreate, UserCreate
+from . import analytics_utils, batch_utils, budget_utils, category_utils, expense_utils, fx_utils, income_utils, recurring_utils, summary_utils, user_utils
+from .export_utils import export_ledger, ledger_statement
+from .pagination_utils import encode_cursor, encode_offset_cursor
+
+
+_SCAN = re.compile(r"\bSCAN (\w+)")
+# (step label, table) scans that are the point of the step: loading rates bumps every user's data version
+_EXPECTED_SCANS = {("load_fx_rates", "users")}
+
+
+def _workload(db):
+    """Yield (label, callable) pairs covering the util queries, in an order where each step can succeed."""
+    now = datetime.utcnow()
+    state = {}
+
+    def create_user():
+        user = user_utils.create_user_in_db(db, UserCreate(username="planner", email="planner@example.com", password="x" * 8),
+                                            password_hash="not-a-real-hash")
+        state["user_id"] = user.id
+
+    def create_category():
+        state["category_id"] = category_utils.create_category_in_db(db, "Plans", None, state["user_id"]).id
+
+    def create_expense():
+        state["expense_id"] = expense_utils.create_expense_in_db(db, "Plan", Decimal("12.50"), None, now - timedelta(days=40),
+                                                                 state["category_id"], state["user_id"]).id
+
+    def create_income():
+        state["income_id"] = income_utils.create_income_in_db(db, "Plan", Decimal("99.00"), None, now - timedelta(days=40), state["user_id"]).id
+
+    def list_expenses_page():
+        rows = expense_utils.get_expenses_for_user(db, state["user_id"], limit=1)
+        expense_utils.get_expenses_for_user(db, state["user_id"], cursor=encode_cursor(rows[0].date, rows[0].id), limit=1)
+
+    yield "get_user_by_username", lambda: user_utils.get_user_by_username(db, "planner")
+    yield "create_user_in_db", create_user
+    yield "get_user_by_username", lambda: user_utils.get_user_by_username(db, "planner")
+    yield "get_user_by_email", lambda: user_utils.get_user_by_email(db, "planner@example.com")
+    yield "user_exists", lambda: user_utils.user_exists(db, "planner", "planner@example.com")
+    yield "create_predefined_categories_for_user", lambda: category_utils.create_predefined_categories_for_user(db, state["user_id"])
+    yield "create_category_in_db", create_category
+    yield "get_categories_for_user", lambda: category_utils.get_categories_for_user(db, state["user_id"])
+    yield "get_category_for_user", lambda: category_utils.get_category_for_user(db, state["category_id"], state["user_id"])
+    yield "update_category_in_db", lambda: category_utils.update_category_in_db(db, state["category_id"], state["user_id"], "Plans", "Renamed")
+
+    yield "create_expense_in_db", create_expense
+    yield "load_fx_rates", lambda: fx_utils.load_fx_rates(db, [
+        {"currency": currency, "date": (now - timedelta(days=30)).date(), "rate": rate} for currency, rate in (("USD", Decimal("1.10")), ("GBP", Decimal("0.85")))])
+    yield "create_expense_in_db (currency)", lambda: expense_utils.create_expense_in_db(
+        db, "Abroad", Decimal("9.00"), None, now, state["category_id"], state["user_id"], "GBP")
+    yield "import_expenses_in_db", lambda: expense_utils.import_expenses_in_db(
+        db, state["user_id"], [(1, {"title": "Imported", "amount": "3.00", "category": "Plans"})])
+    yield "get_expenses_for_user", lambda: expense_utils.get_expenses_for_user(db, state["user_id"])
+    yield "get_expenses_for_user (category, dates)", lambda: expense_utils.get_expenses_for_user(
+        db, state["user_id"], category_id=state["category_id"], start_date=now - timedelta(days=90), end_date=now)
+    yield "get_expenses_for_user (cursor)", list_expenses_page
+    yield "get_expenses_for_user (search)", lambda: expense_utils.get_expenses_for_user(
+        db, state["user_id"], category_id=state["category_id"], q="imp", cursor=encode_offset_cursor(1), limit=1)
+    yield "stream_expenses_for_user", lambda: list(expense_utils.stream_expenses_for_user(db, state["user_id"]))
+    yield "get_expense_for_user", lambda: expense_utils.get_expense_for_user(db, state["expense_id"], state["user_id"])
+    yield "update_expense_in_db", lambda: expense_utils.update_expense_in_db(
+        db, state["expense_id"], state["user_id"], "Plan", Decimal("15.00"), None, now - timedelta(days=5), state["category_id"])
+    for period in ("month", "quarter", "year"):
+        yield f"get_expense_summary_util ({period})", lambda period=period: expense_utils.get_expense_summary_util(db, state["user_id"], period)
+
+    yield "create_income_in_db", create_income
+    yield "import_incomes_in_db", lambda: income_utils.import_incomes_in_db(db, state["user_id"], [(1, {"title": "Imported", "amount": "7.00"})])
+    yield "get_incomes_for_user", lambda: income_utils.get_incomes_for_user(db, state["user_id"], start_date=now - timedelta(days=90), end_date=now)
+    yield "get_incomes_for_user (search)", lambda: income_utils.get_incomes_for_user(db, state["user_id"], q="plan", limit=50)
+    yield "stream_incomes_for_user", lambda: list(income_utils.stream_incomes_for_user(db, state["user_id"]))
+    yield "get_income_for_user", lambda: income_utils.get_income_for_user(db, state["income_id"], state["user_id"])
+    yield "update_income_in_db", lambda: income_utils.update_income_in_db(
+        db, state["income_id"], state["user_id"], "Plan", Decimal("90.00"), None, now - timedelta(days=3))
+    for period in ("month", "quarter", "year"):
+        yield f"get_income_summary_util ({period})", lambda period=period: income_utils.get_income_summary_util(db, state["user_id"], period)
+
+    yield "get_financial_summary", lambda: summary_utils.get_financial_summary(db, state["user_id"], "month")
+    for granularity in ("week", "month"):
+        yield f"get_financial_timeseries ({granularity})", lambda granularity=granularity: summary_utils.get_financial_timeseries(
+            db, state["user_id"], granularity, 6)
+    yield "compute_balance_at", lambda: summary_utils.compute_balance_at(db, state["user_id"], now - timedelta(days=10))
+    yield "load_user_ledger", lambda: analytics_utils.load_user_ledger(db, state["user_id"], 0)
+    yield "export_ledger", lambda: list(export_ledger(db, "csv", ledger_statement(state["user_id"], start_date=now - timedelta(days=90))))
+
+    yield "set_category_budget", lambda: budget_utils.set_category_budget(db, state["category_id"], state["user_id"], Decimal("10.00"))
+    yield "check_budget_overspend", lambda: budget_utils.check_budget_overspend(db, state["user_id"], [(state["category_id"], now, Decimal("20.00"), 1)])
+    yield "get_budget_status", lambda: budget_utils.get_budget_status(db, state["user_id"])
+    yield "delete_category_budget", lambda: budget_utils.delete_category_budget(db, state["category_id"], state["user_id"])
+
+    yield "create_recurring_rule_in_db", lambda: state.update(rule_id=recurring_utils.create_recurring_rule_in_db(db, RecurringRuleCreate(
+        kind="expense", title="Rent", amount=Decimal("800.00"), category_id=state["category_id"], frequency="month",
+        start_date=now - timedelta(days=70)), state["user_id"]).id)
+    yield "get_recurring_rules_for_user", lambda: recurring_utils.get_recurring_rules_for_user(db, state["user_id"])
+    yield "materialize_due_rules", lambda: recurring_utils.materialize_due_rules(db, now)
+    yield "delete_recurring_rule_in_db", lambda: recurring_utils.delete_recurring_rule_in_db(db, state["rule_id"], state["user_id"])
+
+    def apply_batch():
+        expense = {"title": "Batch", "amount": "3.00", "category_id": state["category_id"], "date": now.isoformat()}
+        income = {"title": "Batch", "amount": "5.00", "date": now.isoformat()}
+        report = batch_utils.apply_batch(db, state["user_id"], [BatchOperation(**operation) for operation in (
+            {"action": "create", "entity": "category", "data": {"name": "Batch"}},
+            {"action": "create", "entity": "expense", "data": expense},
+            {"action": "create", "entity": "income", "data": income},
+            {"action": "update", "entity": "expense", "id": state["expense_id"], "data": expense},
+            {"action": "update", "entity": "income", "id": state["income_id"], "data": income},
+        )])
+        category_id, expense_id, income_id = (result["id"] for result in report["results"][:3])
+        batch_utils.apply_batch(db, state["user_id"], [BatchOperation(**operation) for operation in (
+            {"action": "delete", "entity": "expense", "id": expense_id},
+            {"action": "delete", "entity": "income", "id": income_id},
+            {"action": "delete", "entity": "category", "id": category_id},
+        )])
+
+    yield "apply_batch", apply_batch
+
+    yield "delete_expense_in_db", lambda: expense_utils.delete_expense_in_db(db, state["expense_id"], state["user_id"])
+    yield "delete_income_in_db", lambda: income_utils.delete_income_in_db(db, state["income_id"], state["user_id"])
+    yield "delete_category_in_db", lambda: category_utils.delete_category_in_db(
+        db, category_utils.create_category_in_db(db, "Disposable", None, state["user_id"]).id, state["user_id"])
+
+
+def collect_query_plans():
+    """
+    Run the util workload on a scratch SQLite database and return one entry per captured statement:
+    {"label", "statement", "plan": [plan step details], "full_scans": [table names]}.
+    """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    tables = set(Base.metadata.tables)
+
+    captured = []
+    label = None
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT", "WITH")):
+            # every parameter set of an executemany runs the same plan: the first one is explained
+            if executemany and isinstance(parameters, list):
+                parameters = parameters[0]
+            captured.append((label, statement, parameters))
+
+    db = sessionmaker(bind=engine, autoflush=False, autocommit=False)()
+    try:
+        for label, step in _workload(db):
+            step()
+    finally:
+        db.close()
+
+    plans = []
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for label, statement, parameters in captured:
+            steps = [row[-1] for row in cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()]
+            plans.append({
+                "label": label,
+                "statement": statement,
+                "plan": steps,
+                "full_scans": [match.group(1) for step in steps for match in [_SCAN.search(step)]
+                               if match and match.group(1) in tables and (label, match.group(1)) not in _EXPECTED_SCANS],
+            })
+    finally:
+        connection.close()
+        engine.dispose()
+    return plans
@@ -0,0 +1,247 @@
+"""
+Recurring expense and income rules and the background materializer that turns them into entries.
+
+Each pass selects the due rules (next_run <= now) in batches, computes their occurrences up to now
+(catching up on any missed while the service was down), inserts them with one executemany per
+table, updates the derived data of every owner and advances the rules, all in one transaction per
+batch. A rule only advances together with the entries created for it, so a pass that fails or is
+interrupted leaves nothing half done and the next pass picks up where the last commit ended.
+Concurrent passes (one per worker process) never create an occurrence twice: on PostgreSQL they skip
+the rules another pass holds locked, and on SQLite, which ignores the row locks, a rule only advances
+from the occurrence count its batch read, so a batch racing another pass is rolled back and retried.
+A rule whose amount has no exchange rate is logged and skipped, without holding back the others.
+"""
+import logging
+import threading
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, bindparam, select, update
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from .async_utils import to_async
+from .constants import RECURRING_BATCH_SIZE, RECURRING_INTERVAL_SECONDS
+from .expense_utils import insert_expense_rows
+from .fx_utils import rate_errors
+from .income_utils import insert_income_rows
+from .period_utils import add_periods
+
+
+logger = logging.getLogger("app.recurring")
+
+
+def occurrence_at(start_date: datetime, frequency: str, interval: int, index: int) -> datetime:
+    """Return the timestamp of a rule's occurrence number index (0 is start_date)."""
+    return add_periods(start_date, frequency, interval * index)
+
+
+def create_recurring_rule_in_db(db: Session, rule: schemas.RecurringRuleCreate, user_id: int):
+    """
+    Create a recurring rule for the given user. Expense rules need a category owned by the user, and
+    rules in another currency an exchange rate on or before start_date (422 otherwise), so that all
+    their occurrences convert. Occurrences already due (a start_date in the past) are created by the
+    next materializer pass.
+    """
+    category_id = None
+    if rule.kind == "expense":
+        if rule.category_id is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expense rules need a category_id")
+        category = db.query(models.Category.id).filter(
+            models.Category.id == rule.category_id,
+            models.Category.user_id == user_id
+        ).first()
+        if not category:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
+        category_id = rule.category_id
+
+    start_date = rule.start_date or datetime.utcnow()
+    if rule.end_date is not None and rule.end_date < start_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="end_date is before start_date")
+
+    if rule.currency is not None:
+        base_currency = db.scalar(select(models.User.base_currency).where(models.User.id == user_id))
+        missing, = rate_errors(db, [(rule.currency, base_currency, start_date)])
+        if missing:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=missing)
+
+    new_rule = models.RecurringRule(
+        user_id=user_id,
+        kind=rule.kind,
+        title=rule.title,
+        amount=rule.amount,
+        currency=rule.currency,
+        description=rule.description,
+        category_id=category_id,
+        frequency=rule.frequency,
+        interval=rule.interval,
+        start_date=start_date,
+        end_date=rule.end_date,
+        occurrences=0,
+        next_run=start_date,
+    )
+    db.add(new_rule)
+    db.commit()
+    db.refresh(new_rule)
+    return new_rule
+
+
+def get_recurring_rules_for_user(db: Session, user_id: int):
+    """Return all recurring rules belonging to a user, in creation order."""
+    return db.query(models.RecurringRule).filter(models.RecurringRule.user_id == user_id).order_by(models.RecurringRule.id).all()
+
+
+def delete_recurring_rule_in_db(db: Session, rule_id: int, user_id: int):
+    """Delete a recurring rule owned by the user; the entries it created are kept. Raises 404 if not found."""
+    rule = db.query(models.RecurringRule).filter(
+        models.RecurringRule.id == rule_id,
+        models.RecurringRule.user_id == user_id
+    ).first()
+
+    if not rule:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Recurring rule not found")
+
+    db.delete(rule)
+    db.commit()
+
+
+def _materialize_batch(db: Session, now: datetime, batch_size: int, skipped: set):
+    """
+    Materialize up to batch_size occurrences of the earliest due rules and commit.
+    Rules whose amount has no exchange rate to their owner's base currency are logged, left due and
+    added to skipped, which the next batches of the pass leave out.
+    :return: (due rules selected, entries created, rules advanced).
+    """
+    rules = models.RecurringRule.__table__
+    query = (
+        select(rules, models.Category.id.label("owned_category_id"), models.User.base_currency)
+        .join(models.User, models.User.id == rules.c.user_id)
+        .outerjoin(models.Category, and_(models.Category.id == rules.c.category_id, models.Category.user_id == rules.c.user_id))
+        .where(rules.c.next_run <= now)
+        .order_by(rules.c.next_run, rules.c.id)
+        .limit(batch_size)
+        .with_for_update(of=rules, skip_locked=True)
+    )
+    if skipped:
+        query = query.where(rules.c.id.not_in(skipped))
+    due = db.execute(query).all()
+    # later occurrences convert with the rates in effect on their own, later days
+    missing_rates = rate_errors(db, [(rule.currency, rule.base_currency, rule.next_run) for rule in due])
+
+    expenses, incomes, advanced = [], [], []
+    for rule, missing in zip(due, missing_rates):
+        if len(expenses) + len(incomes) >= batch_size:
+            break
+        if rule.kind == "expense" and rule.owned_category_id is None:
+            # the category was deleted: the rule cannot create expenses any more
+            advanced.append({"rule_id": rule.id, "old_occurrences": rule.occurrences, "new_occurrences": rule.occurrences,
+                             "new_next_run": None})
+            continue
+        if missing:
+            # retried by the next pass, once the rates are loaded
+            logger.warning("Skipping recurring rule %d: %s", rule.id, missing)
+            skipped.add(rule.id)
+            continue
+
+        entries = expenses if rule.kind == "expense" else incomes
+        index, when = rule.occurrences, rule.next_run
+        while when <= now and (rule.end_date is None or when <= rule.end_date) and len(expenses) + len(incomes) < batch_size:
+            entry = {"title": rule.title, "amount": rule.amount, "currency": rule.currency, "description": rule.description,
+                     "date": when, "user_id": rule.user_id}
+            if rule.kind == "expense":
+                entry["category_id"] = rule.category_id
+            entries.append(entry)
+            index += 1
+            when = occurrence_at(rule.start_date, rule.frequency, rule.interval, index)
+        if rule.end_date is not None and when > rule.end_date:
+            when = None
+        advanced.append({"rule_id": rule.id, "old_occurrences": rule.occurrences, "new_occurrences": index, "new_next_run": when})
+
+    if expenses:
+        insert_expense_rows(db, expenses)
+    if incomes:
+        insert_income_rows(db, incomes)
+    if advanced:
+        result = db.execute(
+            update(rules)
+            .where(rules.c.id == bindparam("rule_id"), rules.c.occurrences == bindparam("old_occurrences"))
+            .values(occurrences=bindparam("new_occurrences"), next_run=bindparam("new_next_run")),
+            advanced,
+        )
+        # another pass advanced (or a user deleted) some of the rules since they were read: their
+        # entries may already exist, so nothing of this batch is kept and the next one reads them again
+        if db.get_bind().dialect.supports_sane_multi_rowcount and result.rowcount != len(advanced):
+            db.rollback()
+            logger.info("Recurring rules changed during a batch; retrying it")
+            return len(due), 0, 0
+    db.commit()
+    return len(due), len(expenses) + len(incomes), len(advanced)
+
+
+def materialize_due_rules(db: Session, now: Optional[datetime] = None, batch_size: int = RECURRING_BATCH_SIZE) -> int:
+    """
+    Create the entries of every occurrence due by now, for all users, one transaction per batch of
+    batch_size entries. Safe to run again or concurrently (see the module docstring): occurrences
+    are never created twice.
+    :param now: Cut-off timestamp; defaults to UTC now.
+    :return: Number of expenses and incomes created.
+    """
+    now = now or datetime.utcnow()
+    created = 0
+    skipped = set()
+    while True:
+        selected, entries, advanced = _materialize_batch(db, now, max(batch_size, 1), skipped)
+        created += entries
+        if not selected:
+            return created
+
+
+class RecurringScheduler:
+    """
+    Background thread running materialize_due_rules every interval_seconds, starting with a catch-up
+    pass. It uses its own thread and sessions, so it holds neither the event loop nor a threadpool
+    worker of the request handlers.
+    :param session_factory: Callable returning a new Session on the writer database, e.g. a sessionmaker.
+    """
+
+    def __init__(self, session_factory, interval_seconds: float = RECURRING_INTERVAL_SECONDS):
+        self.session_factory = session_factory
+        self.interval_seconds = interval_seconds
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="recurring-materializer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 10):
+        """Stop after the pass in progress, waiting up to timeout seconds for it."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run_once(self) -> int:
+        with self.session_factory() as db:
+            return materialize_due_rules(db)
+
+    def _run(self):
+        while True:
+            try:
+                created = self.run_once()
+                if created:
+                    logger.info("Created %d recurring entries", created)
+            except Exception:
+                logger.exception("Materializing recurring rules failed")
+            if self._stopped.wait(self.interval_seconds):
+                return
+
+
+# Awaitable variants for the async routers, usable with a Session or an AsyncSession
+create_recurring_rule_in_db_async = to_async(create_recurring_rule_in_db)
+get_recurring_rules_for_user_async = to_async(get_recurring_rules_for_user)
+delete_recurring_rule_in_db_async = to_async(delete_recurring_rule_in_db)
@@ -0,0 +1,233 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import func, delete, insert, null, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from .period_utils import month_period_start, period_bucket
+from .version_utils import bump_all_data_versions, bump_data_version
+
+
+def period_of(date: datetime) -> str:
+    """Return the YYYY-MM rollup period a timestamp falls into."""
+    return date.strftime("%Y-%m")
+
+
+def dialect_insert(db: Session, table):
+    """Return an INSERT for table that supports ON CONFLICT on the session's dialect (SQLite or PostgreSQL)."""
+    # only the dialect in use is imported
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects import postgresql
+        return postgresql.insert(table)
+    from sqlalchemy.dialects import sqlite
+    return sqlite.insert(table)
+
+
+def _adding_on_conflict(stmt, table, key_columns: list, index_where=None):
+    """Make an INSERT into a rollup table add its total/entry_count to the row it conflicts with on key_columns."""
+    return stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        index_where=index_where,
+        set_={
+            "total": table.c.total + stmt.excluded.total,
+            "entry_count": table.c.entry_count + stmt.excluded.entry_count,
+        },
+    )
+
+
+def _upsert_rollups(db: Session, table, key_columns: list, rows: list, index_where=None):
+    """
+    Add each row's total/entry_count to the rollup row identified by its key columns, creating it
+    when missing, with a single executemany. Runs inside the caller's transaction; nothing is committed here.
+    :param index_where: Predicate of the partial unique index over key_columns, when that is the one to conflict on.
+    """
+    if not rows:
+        return
+    db.execute(_adding_on_conflict(dialect_insert(db, table), table, key_columns, index_where), rows)
+
+
+def apply_expense_rollup_changes(db: Session, user_id: int, changes: Iterable[Tuple[Optional[int], datetime, object, int]]):
+    """
+    Fold expense changes into the monthly expense rollups; uncategorized expenses (category_id None)
+    have their own rollups.
+    :param db: SQLAlchemy session; the caller commits.
+    :param user_id: Owner user's id.
+    :param changes: (category_id, date, amount, sign) tuples, sign is 1 for added and -1 for removed expenses.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for category_id, date, amount, sign in changes:
+        delta = deltas[(category_id, period_of(date))]
+        delta[0] += amount * sign
+        delta[1] += sign
+
+    rows = [
+        {"user_id": user_id, "category_id": category_id, "period": period, "total": total, "entry_count": entry_count}
+        for (category_id, period), (total, entry_count) in deltas.items()
+        if total != 0 or entry_count != 0
+    ]
+    table = models.ExpenseRollup.__table__
+    _upsert_rollups(db, table, ["user_id", "category_id", "period"], [row for row in rows if row["category_id"] is not None])
+    _upsert_rollups(db, table, ["user_id", "period"], [row for row in rows if row["category_id"] is None],
+                    index_where=table.c.category_id.is_(None))
+
+
+def uncategorize_expense_rollups(db: Session, user_id: int, category_ids: list):
+    """
+    Move the expense rollups of categories being deleted to the user's uncategorized rollups, like
+    their expenses, with one INSERT ... SELECT and one DELETE. Runs inside the caller's transaction.
+    """
+    table = models.ExpenseRollup.__table__
+    moved = (
+        select(table.c.user_id, null(), table.c.period, func.sum(table.c.total), func.sum(table.c.entry_count))
+        .where(table.c.user_id == user_id, table.c.category_id.in_(category_ids))
+        .group_by(table.c.user_id, table.c.period)
+    )
+    stmt = dialect_insert(db, table).from_select(["user_id", "category_id", "period", "total", "entry_count"], moved)
+    db.execute(_adding_on_conflict(stmt, table, ["user_id", "period"], table.c.category_id.is_(None)))
+    db.execute(delete(table).where(table.c.user_id == user_id, table.c.category_id.in_(category_ids)))
+
+
+def apply_income_rollup_changes(db: Session, user_id: int, changes: Iterable[Tuple[datetime, object, int]]):
+    """
+    Fold income changes into the monthly income rollups.
+    :param db: SQLAlchemy session; the caller commits.
+    :param user_id: Owner user's id.
+    :param changes: (date, amount, sign) tuples, sign is 1 for added and -1 for removed incomes.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for date, amount, sign in changes:
+        delta = deltas[period_of(date)]
+        delta[0] += amount * sign
+        delta[1] += sign
+
+    _upsert_rollups(db, models.IncomeRollup.__table__, ["user_id", "period"], [
+        {"user_id": user_id, "period": period, "total": total, "entry_count": entry_count}
+        for period, (total, entry_count) in deltas.items()
+        if total != 0 or entry_count != 0
+    ])
+
+
+def _rollup_period_bucket(period_column, period: str):
+    """Map a YYYY-MM rollup period column onto a month, quarter (YYYY-Q) or year label, as period_bucket labels them."""
+    if period == "month":
+        return period_column
+    return period_bucket(month_period_start(period_column), period)
+
+
+def _period_filters(rollup, start: Optional[datetime], end: Optional[datetime]):
+    filters = []
+    if start is not None:
+        filters.append(rollup.period >= period_of(start))
+    if end is not None:
+        filters.append(rollup.period <= period_of(end))
+    return filters
+
+
+def get_expense_totals_by_category(db: Session, user_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """
+    Return (category name, total) rows from the expense rollups.
+    :param start: Optional timestamp; whole months from its month onwards are included.
+    :param end: Optional timestamp; whole months up to its month are included.
+    """
+    return (
+        db.query(models.Category.name, func.sum(models.ExpenseRollup.total))
+        .join(models.ExpenseRollup, models.ExpenseRollup.category_id == models.Category.id)
+        .filter(models.ExpenseRollup.user_id == user_id, *_period_filters(models.ExpenseRollup, start, end))
+        .group_by(models.Category.id)
+        .having(func.sum(models.ExpenseRollup.entry_count) > 0)
+        .all()
+    )
+
+
+def get_expense_totals_by_period(db: Session, user_id: int, period: str = "month"):
+    """Return (period label, total) rows from the expense rollups, bucketed by month/quarter/year."""
+    bucket = _rollup_period_bucket(models.ExpenseRollup.period, period)
+    return (
+        db.query(bucket, func.sum(models.ExpenseRollup.total))
+        .filter(models.ExpenseRollup.user_id == user_id)
+        .group_by(bucket)
+        .having(func.sum(models.ExpenseRollup.entry_count) > 0)
+        .order_by(bucket)
+        .all()
+    )
+
+
+def get_income_totals_by_period(db: Session, user_id: int, period: str = "month"):
+    """Return (period label, total) rows from the income rollups, bucketed by month/quarter/year."""
+    bucket = _rollup_period_bucket(models.IncomeRollup.period, period)
+    return (
+        db.query(bucket, func.sum(models.IncomeRollup.total))
+        .filter(models.IncomeRollup.user_id == user_id)
+        .group_by(bucket)
+        .having(func.sum(models.IncomeRollup.entry_count) > 0)
+        .order_by(bucket)
+        .all()
+    )
+
+
+def get_expense_rollup_total(db: Session, user_id: int, start: datetime, end: datetime):
+    """Return total expenses for the whole months between start and end (0 if None)."""
+    return (
+        db.query(func.sum(models.ExpenseRollup.total))
+        .filter(models.ExpenseRollup.user_id == user_id, *_period_filters(models.ExpenseRollup, start, end))
+        .scalar()
+    ) or 0
+
+
+def get_income_rollup_total(db: Session, user_id: int, start: datetime, end: datetime):
+    """Return total income for the whole months between start and end (0 if None)."""
+    return (
+        db.query(func.sum(models.IncomeRollup.total))
+        .filter(models.IncomeRollup.user_id == user_id, *_period_filters(models.IncomeRollup, start, end))
+        .scalar()
+    ) or 0
+
+
+def rebuild_rollups(db: Session, user_id: Optional[int] = None):
+    """
+    Regenerate the monthly rollups from the raw expenses and incomes tables and commit.
+    Amounts are the entries' stored base currency amounts. The rebuilt users' data versions are
+    bumped, so results computed from the old data are not served.
+    :param db: SQLAlchemy session.
+    :param user_id: Only rebuild this user's rollups; all users when None.
+    """
+    expense_rollups = models.ExpenseRollup.__table__
+    income_rollups = models.IncomeRollup.__table__
+
+    clear_expenses = delete(expense_rollups)
+    clear_incomes = delete(income_rollups)
+    if user_id is not None:
+        clear_expenses = clear_expenses.where(expense_rollups.c.user_id == user_id)
+        clear_incomes = clear_incomes.where(income_rollups.c.user_id == user_id)
+    db.execute(clear_expenses)
+    db.execute(clear_incomes)
+
+    expense_month = period_bucket(models.Expense.date, "month")
+    expense_rows = (
+        select(models.Expense.user_id, models.Expense.category_id, expense_month,
+               func.coalesce(func.sum(models.Expense.base_amount), 0), func.count(models.Expense.id))
+        .where(models.Expense.user_id.is_not(None))
+        .group_by(models.Expense.user_id, models.Expense.category_id, expense_month)
+    )
+
+    income_month = period_bucket(models.Income.date, "month")
+    income_rows = (
+        select(models.Income.user_id, income_month, func.coalesce(func.sum(models.Income.base_amount), 0),
+               func.count(models.Income.id))
+        .where(models.Income.user_id.is_not(None))
+        .group_by(models.Income.user_id, income_month)
+    )
+
+    if user_id is not None:
+        expense_rows = expense_rows.where(models.Expense.user_id == user_id)
+        income_rows = income_rows.where(models.Income.user_id == user_id)
+
+    db.execute(insert(expense_rollups).from_select(["user_id", "category_id", "period", "total", "entry_count"], expense_rows))
+    db.execute(insert(income_rollups).from_select(["user_id", "period", "total", "entry_count"], income_rows))
+    if user_id is None:
+        bump_all_data_versions(db)
+    else:
+        bump_data_version(db, user_id)
+    db.commit()
@@ -0,0 +1,106 @@
+"""
+Full-text search over the title and description of expenses and incomes.
+
+SQLite keeps an external-content FTS5 table per searched table ("<table>_fts"), filled by triggers
+so that every write path (ORM, bulk inserts, batches) keeps it in sync. PostgreSQL uses a GIN
+expression index on the tsvector of the same columns, which needs no upkeep. The DDL runs after
+the table is created (create_all) and from the migration that adds search to existing databases.
+"""
+import re
+from typing import Optional
+
+from sqlalchemy import DDL, column, event, false, func, literal_column, select, table
+
+
+# Searchable words: letters and digits, as both the FTS5 unicode61 tokenizer and PostgreSQL split them
+_WORDS = re.compile(r"[^\W_]+")
+# Search tables and the FTS5 shadow tables behind them, which are not part of the models' metadata
+SEARCH_TABLE_NAME = re.compile(r"^(expenses|incomes)_fts(_(data|idx|docsize|config|content))?$")
+
+_TSVECTOR = "to_tsvector('simple', coalesce({prefix}title, '') || ' ' || coalesce({prefix}description, ''))"
+
+
+def search_index_ddl(dialect_name: str, table_name: str) -> list:
+    """Return the statements creating the search index of a table with title/description columns."""
+    if dialect_name == "postgresql":
+        return [f"CREATE INDEX IF NOT EXISTS ix_{table_name}_search ON {table_name} USING gin ({_TSVECTOR.format(prefix='')})"]
+    if dialect_name != "sqlite":
+        return []
+
+    fts = f"{table_name}_fts"
+    insert_new = f"INSERT INTO {fts}(rowid, user_id, title, description) VALUES (new.id, new.user_id, new.title, new.description);"
+    delete_old = (f"INSERT INTO {fts}({fts}, rowid, user_id, title, description) "
+                  f"VALUES ('delete', old.id, old.user_id, old.title, old.description);")
+    return [
+        # the owner is indexed too, so a search reads and ranks only the user's own matches; prefix
+        # indexes make 2 and 3 letter prefix queries (e.g. "de*") as cheap as whole words
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(user_id, title, description, content='{table_name}', "
+        f"content_rowid='id', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table_name} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table_name} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF user_id, title, description ON {table_name} "
+        f"BEGIN {delete_old} {insert_new} END",
+        # index the rows written before the table existed
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def drop_search_index_ddl(dialect_name: str, table_name: str) -> list:
+    """Return the statements dropping the search index of a table."""
+    if dialect_name == "postgresql":
+        return [f"DROP INDEX IF EXISTS ix_{table_name}_search"]
+    if dialect_name != "sqlite":
+        return []
+    fts = f"{table_name}_fts"
+    return [f"DROP TRIGGER IF EXISTS {fts}_{action}" for action in ("insert", "delete", "update")] + [f"DROP TABLE IF EXISTS {fts}"]
+
+
+def install_search_index(searched_table):
+    """Create the search index of a mapped table whenever create_all creates the table, and drop it with the table."""
+    for dialect_name in ("sqlite", "postgresql"):
+        for statement in search_index_ddl(dialect_name, searched_table.name):
+            event.listen(searched_table, "after_create", DDL(statement).execute_if(dialect=dialect_name))
+        for statement in drop_search_index_ddl(dialect_name, searched_table.name):
+            event.listen(searched_table, "before_drop", DDL(statement).execute_if(dialect=dialect_name))
+
+
+def search_terms(q: Optional[str]) -> list:
+    """Split a search string into lowercase words."""
+    return [word.lower() for word in _WORDS.findall(q or "")]
+
+
+def dialect_name(db) -> str:
+    """Return the dialect name of a Session or AsyncSession."""
+    return db.get_bind().dialect.name
+
+
+def apply_search(query, model, user_id: int, q: str, dialect: str):
+    """
+    Keep the rows of query whose title or description contains every word of q, each word also
+    matching as a prefix ("dent" finds "dentist"), and order them best match first, then by id.
+    :param query: Select over model, filtered on the owner.
+    :param model: Mapped class of a table with a search index (Expense, Income).
+    :param user_id: Owner user's id.
+    :param q: Search string; without any word, nothing matches.
+    :param dialect: Dialect name of the session the query runs on ("sqlite" or "postgresql").
+    """
+    terms = search_terms(q)
+    if not terms:
+        return query.filter(false()).order_by(model.id)
+
+    table_name = model.__tablename__
+    if dialect == "postgresql":
+        vector = literal_column(_TSVECTOR.format(prefix=f"{table_name}."))
+        tsquery = func.to_tsquery(literal_column("'simple'"), " & ".join(f"{term}:*" for term in terms))
+        return query.filter(vector.op("@@")(tsquery)).order_by(func.ts_rank(vector, tsquery).desc(), model.id)
+
+    # MATCH applies to the hidden column named after the FTS5 table. The matches are materialized
+    # first: joined directly, SQLite may instead walk the user's rows and run the MATCH once per row.
+    fts_name = f"{table_name}_fts"
+    fts = table(fts_name, column("rowid"), column(fts_name))
+    # the words are scoped to the text columns, or a number would also match the owner column
+    match = f'user_id : "{int(user_id)}" AND {{title description}} : (' + " ".join(f'"{term}"*' for term in terms) + ")"
+    matches = (select(fts.c.rowid.label("id"), func.bm25(literal_column(fts_name), 0.0, 1.0, 1.0).label("score"))
+               .where(fts.c[fts_name].op("MATCH")(match))
+               .cte(f"{table_name}_matches").prefix_with("MATERIALIZED"))
+    return query.join(matches, matches.c.id == model.id).order_by(matches.c.score, model.id)
@@ -1,9 +1,16 @@
-from sqlalchemy import func
+from sqlalchemy import func, literal, select, type_coerce, union_all, String
 from datetime import datetime
 import calendar
 from decimal import Decimal
 
 from .. import models
+from .async_utils import to_async
+from .period_utils import add_periods, period_bucket, period_label, period_start
+from .rollup_utils import period_of
+
+
+# Zero amount as the Cents type reads it, for totals a statement returns no row or NULL for
+_ZERO = Decimal("0.00")
 
 
 def get_period_range(period: str):
@@ -32,9 +39,9 @@ def get_period_range(period: str):
 
 
 def get_income_total(db, user_id: int, start: datetime, end: datetime):
-    """Return total income for user between start and end (0 if None)."""
+    """Return total income for user between start and end, in the user's base currency (0 if None)."""
     total = (
-        db.query(func.sum(models.Income.amount))
+        db.query(func.sum(models.Income.base_amount))
         .filter(models.Income.user_id == user_id)
         .filter(models.Income.date.between(start, end))
         .scalar()
@@ -43,9 +50,9 @@ def get_income_total(db, user_id: int, start: datetime, end: datetime):
 
 
 def get_expense_total(db, user_id: int, start: datetime, end: datetime):
-    """Return total expenses for user between start and end (0 if None)."""
+    """Return total expenses for user between start and end, in the user's base currency (0 if None)."""
     total = (
-        db.query(func.sum(models.Expense.amount))
+        db.query(func.sum(models.Expense.base_amount))
         .filter(models.Expense.user_id == user_id)
         .filter(models.Expense.date.between(start, end))
         .scalar()
@@ -54,9 +61,9 @@ def get_expense_total(db, user_id: int, start: datetime, end: datetime):
 
 
 def get_expense_by_category(db, user_id: int, start: datetime, end: datetime):
-    """Return list of expense totals grouped by category name."""
+    """Return list of expense totals grouped by category name, in the user's base currency."""
     rows = (
-        db.query(models.Category.name, func.sum(models.Expense.amount))
+        db.query(models.Category.name, func.sum(models.Expense.base_amount))
         .join(models.Expense)
         .filter(models.Expense.user_id == user_id)
         .filter(models.Expense.date.between(start, end))
@@ -67,9 +74,9 @@ def get_expense_by_category(db, user_id: int, start: datetime, end: datetime):
 
 
 def get_income_by_title(db, user_id: int, start: datetime, end: datetime):
-    """Return list of income totals grouped by title."""
+    """Return list of income totals grouped by title, in the user's base currency."""
     rows = (
-        db.query(models.Income.title, func.sum(models.Income.amount))
+        db.query(models.Income.title, func.sum(models.Income.base_amount))
         .filter(models.Income.user_id == user_id)
         .filter(models.Income.date.between(start, end))
         .group_by(models.Income.title)
@@ -78,39 +85,57 @@ def get_income_by_title(db, user_id: int, start: datetime, end: datetime):
     return [{"title": t, "total": total} for t, total in rows]
 
 
+def _balance_parts(user_id: int, timestamp: datetime, inclusive: bool = True):
+    """
+    Return scalar subqueries (checkpoint net, income tail, expense tail) whose sum, added to the
+    initial balance, is the balance at timestamp: the latest balance checkpoint before the
+    timestamp's month plus the incomes/expenses of that month up to the timestamp, all in the user's
+    base currency.
+    :param inclusive: Whether entries dated exactly at timestamp count (False for an opening balance).
+    """
+    month_start = datetime(timestamp.year, timestamp.month, 1)
+
+    def in_tail(column):
+        if inclusive:
+            return column.between(month_start, timestamp)
+        return (column >= month_start) & (column < timestamp)
+
+    checkpoint = (
+        select(models.BalanceCheckpoint.net)
+        .where(models.BalanceCheckpoint.user_id == user_id)
+        .where(models.BalanceCheckpoint.period < period_of(timestamp))
+        .order_by(models.BalanceCheckpoint.period.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    income_tail = (
+        select(func.sum(models.Income.base_amount))
+        .where(models.Income.user_id == user_id)
+        .where(in_tail(models.Income.date))
+        .scalar_subquery()
+    )
+    expense_tail = (
+        select(func.sum(models.Expense.base_amount))
+        .where(models.Expense.user_id == user_id)
+        .where(in_tail(models.Expense.date))
+        .scalar_subquery()
+    )
+    return checkpoint, income_tail, expense_tail
+
+
 def compute_balance_at(db, user_id: int, timestamp: datetime):
     """Compute the balance at a given timestamp.
     Balance is calculated as: initial_balance + sum(incomes <= timestamp) - sum(expenses <= timestamp).
     Uses the stored `User.balance` as the initial balance (the configured initial value).
+    The sums come from the balance checkpoints plus a month-to-date tail, in one statement.
     Returns Decimal(0) if user not found.
     """
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    initial_balance = Decimal(user.balance) if user and hasattr(user, "balance") else Decimal("0")
+    row = db.query(models.User.balance, *_balance_parts(user_id, timestamp)).filter(models.User.id == user_id).first()
+    if row is None:
+        return _ZERO
 
-    income_sum = (
-        db.query(func.sum(models.Income.amount))
-        .filter(models.Income.user_id == user_id)
-        .filter(models.Income.date <= timestamp)
-        .scalar()
-    ) or 0
-
-    expense_sum = (
-        db.query(func.sum(models.Expense.amount))
-        .filter(models.Expense.user_id == user_id)
-        .filter(models.Expense.date <= timestamp)
-        .scalar()
-    ) or 0
-
-    try:
-        income_dec = Decimal(income_sum)
-    except Exception:
-        income_dec = Decimal(str(income_sum))
-    try:
-        expense_dec = Decimal(expense_sum)
-    except Exception:
-        expense_dec = Decimal(str(expense_sum))
-
-    return initial_balance + income_dec - expense_dec
+    initial_balance, checkpoint_net, income_sum, expense_sum = (value or _ZERO for value in row)
+    return initial_balance + checkpoint_net + income_sum - expense_sum
 
 
 def get_current_balance(db, user_id: int):
@@ -119,18 +144,62 @@ def get_current_balance(db, user_id: int):
 
 
 def get_financial_summary(db, user_id: int, period: str = "month"):
+    """
+    Return the financial summary of the current month/quarter/year in two statements:
+    one for the period totals and opening/closing balances, one for the per-category
+    expense and per-title income breakdowns. Amounts are in the user's base currency.
+    """
     start, end = get_period_range(period)
+    start_period, end_period = period_of(start), period_of(end)
 
-    income_total = get_income_total(db, user_id, start, end)
-    expense_total = get_expense_total(db, user_id, start, end)
+    # periods are whole months, so the totals can be read from the monthly rollups
+    income_total = (
+        select(func.sum(models.IncomeRollup.total))
+        .where(models.IncomeRollup.user_id == user_id)
+        .where(models.IncomeRollup.period.between(start_period, end_period))
+        .scalar_subquery()
+    )
+    expense_total = (
+        select(func.sum(models.ExpenseRollup.total))
+        .where(models.ExpenseRollup.user_id == user_id)
+        .where(models.ExpenseRollup.period.between(start_period, end_period))
+        .scalar_subquery()
+    )
+    totals = (
+        db.query(models.User.balance, income_total, expense_total,
+                 *_balance_parts(user_id, start), *_balance_parts(user_id, end))
+        .filter(models.User.id == user_id)
+        .first()
+    )
 
-    income_by_title = get_income_by_title(db, user_id, start, end)
-    expense_by_category = get_expense_by_category(db, user_id, start, end)
+    # a union's columns take the types of its first select's; the totals are typed on both sides as Cents,
+    # whose result processing turns the cents into amounts
+    expense_groups = (
+        select(literal("expense").label("kind"), models.Category.name.label("name"),
+               type_coerce(func.sum(models.ExpenseRollup.total), models.Cents).label("total"))
+        .join_from(models.ExpenseRollup, models.Category, models.ExpenseRollup.category_id == models.Category.id)
+        .where(models.ExpenseRollup.user_id == user_id)
+        .where(models.ExpenseRollup.period.between(start_period, end_period))
+        .group_by(models.Category.id, models.Category.name)
+        .having(func.sum(models.ExpenseRollup.entry_count) > 0)
+    )
+    income_groups = (
+        select(literal("income"), models.Income.title, type_coerce(func.sum(models.Income.base_amount), models.Cents))
+        .where(models.Income.user_id == user_id)
+        .where(models.Income.date.between(start, end))
+        .group_by(models.Income.title)
+    )
+    groups = db.execute(union_all(expense_groups, income_groups)).all()
 
-    net_savings = income_total - expense_total
+    if totals is None:
+        initial_balance = income_total = expense_total = _ZERO
+        balance_start = balance_end = _ZERO
+    else:
+        initial_balance, income_total, expense_total, *balance_values = (value or _ZERO for value in totals)
+        balance_start = initial_balance + balance_values[0] + balance_values[1] - balance_values[2]
+        balance_end = initial_balance + balance_values[3] + balance_values[4] - balance_values[5]
 
-    balance_start = compute_balance_at(db, user_id, start)
-    balance_end = compute_balance_at(db, user_id, end)
+    net_savings = income_total - expense_total
 
     return {
         "period": period,
@@ -141,6 +210,74 @@ def get_financial_summary(db, user_id: int, period: str = "month"):
         "net_savings": net_savings,
         "balance_start": balance_start,
         "balance_end": balance_end,
-        "income_by_category": income_by_title,
-        "expense_by_category": expense_by_category,
+        "income_by_category": [{"title": name, "total": total} for kind, name, total in groups if kind == "income"],
+        "expense_by_category": [{"category": name, "total": total} for kind, name, total in groups if kind == "expense"],
+    }
+
+
+def get_financial_timeseries(db, user_id: int, granularity: str = "month", periods: int = 12):
+    """
+    Return income, expense, net and closing balance for each of the last `periods` periods of
+    the given granularity, ending with the current one. Periods without entries are zero-filled.
+    One statement reads the opening balance and the per-period income and expense totals; the
+    closing balances are a running sum over them. Amounts are in the user's base currency.
+    """
+    first = add_periods(period_start(datetime.utcnow(), granularity), granularity, -(periods - 1))
+    end = add_periods(first, granularity, periods)
+
+    checkpoint, income_tail, expense_tail = _balance_parts(user_id, first, inclusive=False)
+    # the amounts are typed as Cents in every select of the union, the opening balance's arithmetic included,
+    # so that they are read as amounts rather than raw cents
+    balance_before = models.User.balance + func.coalesce(checkpoint, 0) + func.coalesce(income_tail, 0) - func.coalesce(expense_tail, 0)
+    opening = (
+        select(literal("opening").label("kind"), literal(None, String).label("period"), type_coerce(balance_before, models.Cents))
+        .where(models.User.id == user_id)
+    )
+    grouped = []
+    for kind, model in (("income", models.Income), ("expense", models.Expense)):
+        bucket = period_bucket(model.date, granularity)
+        grouped.append(
+            select(literal(kind), bucket, type_coerce(func.sum(model.base_amount), models.Cents))
+            .where(model.user_id == user_id, model.date >= first, model.date < end)
+            .group_by(bucket)
+        )
+    rows = db.execute(union_all(opening, *grouped)).all()
+
+    opening_balance = _ZERO
+    totals = {}
+    for kind, period, total in rows:
+        if kind == "opening":
+            opening_balance = total or _ZERO
+        else:
+            totals[(kind, period)] = total or _ZERO
+
+    series = []
+    balance = opening_balance
+    start = first
+    for _ in range(periods):
+        label = period_label(start, granularity)
+        income, expense = totals.get(("income", label), _ZERO), totals.get(("expense", label), _ZERO)
+        balance += income - expense
+        series.append({
+            "period": label,
+            "period_start": start,
+            "income": income,
+            "expense": expense,
+            "net": income - expense,
+            "closing_balance": balance,
+        })
+        start = add_periods(start, granularity, 1)
+
+    return {
+        "granularity": granularity,
+        "periods": periods,
+        "opening_balance": opening_balance,
+        "series": series,
     }
+
+
+# Awaitable variants for the async routers, usable with a Session or an AsyncSession
+compute_balance_at_async = to_async(compute_balance_at)
+get_current_balance_async = to_async(get_current_balance)
+get_financial_summary_async = to_async(get_financial_summary)
+get_financial_timeseries_async = to_async(get_financial_timeseries)
@@ -1,10 +1,16 @@
+from typing import Iterable
+
+from sqlalchemy import insert, or_
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import timedelta
 
-from ..models import User
+from ..database import release_connection
+from ..models import Category, User
 from ..schemas import UserCreate
-from .auth import hash_password, verify_password, create_access_token
+from .async_utils import to_async
+from .auth import create_access_token
+from .passwords import hash_password, verify_and_update_password, verify_and_update_password_async
 from .constants import INITIAL_BALANCE, ACCESS_TOKEN_EXPIRE_MINUTES
 
 
@@ -25,22 +31,39 @@ def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
 
-def create_user_in_db(db: Session, user: UserCreate, initial_balance: float = INITIAL_BALANCE):
+def user_exists(db: Session, username: str, email: str) -> bool:
+    """
+    Check in one query whether a user with this username or this email exists.
+    :param db: SQLAlchemy Session used to run the query.
+    :param username: Username to search for.
+    :param email: Email address to search for.
+    """
+    return db.query(User.id).filter(or_(User.username == username, User.email == email)).first() is not None
+
+def create_user_in_db(db: Session, user: UserCreate, initial_balance: float = INITIAL_BALANCE, password_hash: str | None = None,
+    category_names: Iterable[str] = ()):
     """
     Create a new user in DB.
     :param db: SQLAlchemy Session used for inserting and committing the new User instance.
     :param user: Pydantic model containing the creation info.
     :param initial_balance: Initial balance to assign to the new user.
+    :param password_hash: Precomputed hash of user.password (e.g. from hash_password_async); hashed here when None.
+    :param category_names: Categories created with the user, in the same transaction (e.g. PREDEFINED_CATEGORIES).
     """
-    hashed_pw = hash_password(user.password)
+    hashed_pw = password_hash or hash_password(user.password)
     new_user = User(
         username=user.username,
         email=user.email,
         password_hash=hashed_pw,
         balance=initial_balance,
+        base_currency=user.base_currency,
     )
+    category_names = [name.strip() for name in category_names]
     try:
         db.add(new_user)
+        if category_names:
+            db.flush()
+            db.execute(insert(Category), [{"name": name, "user_id": new_user.id} for name in category_names])
         db.commit()
         db.refresh(new_user)
         return new_user
@@ -58,8 +81,43 @@ def authenticate_user(db: Session, username: str, password: str):
     user = get_user_by_username(db, username)
     if not user:
         return None
-    if not verify_password(password, user.password_hash):
+    valid, new_hash = verify_and_update_password(password, user.password_hash)
+    if not valid:
+        return None
+    if new_hash:
+        update_password_hash_in_db(db, user, new_hash)
+    return user
+
+def update_password_hash_in_db(db: Session, user: User, password_hash: str):
+    """
+    Replace a user's stored password hash, e.g. after the bcrypt cost changed.
+    :param db: SQLAlchemy Session the user was loaded with.
+    :param user: User instance to update; re-attached to db if it was detached.
+    :param password_hash: New password hash.
+    """
+    db.add(user)
+    user.password_hash = password_hash
+    db.commit()
+    db.refresh(user)
+    return user
+
+async def authenticate_user_async(db, username: str, password: str):
+    """
+    Verify user's credentials with bcrypt running on the password hashing pool.
+    The stored hash is transparently replaced when it uses another bcrypt cost than BCRYPT_ROUNDS.
+    :param db: Session or AsyncSession used to load and update the user record.
+    :param username: Username to authenticate.
+    :param password: Plaintext password to verify against the stored hash.
+    """
+    user = await get_user_by_username_async(db, username)
+    if not user:
+        return None
+    await release_connection(db, user)
+    valid, new_hash = await verify_and_update_password_async(password, user.password_hash)
+    if not valid:
         return None
+    if new_hash:
+        await update_password_hash_in_db_async(db, user, new_hash)
     return user
 
 def create_token_for_user(user: User, expires_minutes: int = ACCESS_TOKEN_EXPIRE_MINUTES):
@@ -69,5 +127,13 @@ def create_token_for_user(user: User, expires_minutes: int = ACCESS_TOKEN_EXPIRE
     :param expires_minutes: Token validity period in minutes.
     """
     access_token_expires = timedelta(minutes=expires_minutes)
-    access_token = create_access_token(data={"sub": user.username}, expires_delta=access_token_expires)
+    access_token = create_access_token(data={"sub": user.username, "uid": user.id}, expires_delta=access_token_expires)
     return {"access_token": access_token, "token_type": "bearer"}
+
+
+# Awaitable variants for the async routers, usable with a Session or an AsyncSession
+get_user_by_username_async = to_async(get_user_by_username)
+get_user_by_email_async = to_async(get_user_by_email)
+user_exists_async = to_async(user_exists)
+create_user_in_db_async = to_async(create_user_in_db)
+update_password_hash_in_db_async = to_async(update_password_hash_in_db)
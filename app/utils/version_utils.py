@@ -0,0 +1,123 @@
+import hashlib
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Depends, Request, Response, status
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import AnySession, get_session
+from .async_utils import to_async
+from .auth import Principal, get_current_user
+from .cache_utils import TTLCache
+from .constants import RESULT_CACHE_SIZE, RESULT_CACHE_TTL_SECONDS
+
+
+# Computed GET results keyed by (user, data version, day, path, query); a write bumps the version and
+# the day rolls over by itself, so entries never need invalidating and the stale ones age out of the LRU
+result_cache = TTLCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL_SECONDS)
+
+
+def bump_data_version(db: Session, user_id: int):
+    """
+    Increment the user's data version inside the caller's transaction.
+    Every write to a user's categories, expenses or incomes calls this before committing.
+    """
+    users = models.User.__table__
+    db.execute(update(users).where(users.c.id == user_id).values(data_version=users.c.data_version + 1))
+
+
+def bump_all_data_versions(db: Session):
+    """
+    Increment every user's data version inside the caller's transaction, for changes to data all
+    everyone's derived data (rebuilds).
+    """
+    users = models.User.__table__
+    db.execute(update(users).values(data_version=users.c.data_version + 1))
+
+
+def get_data_version(db: Session, user_id: int) -> int:
+    """Return the user's data version (a primary key lookup on users; no transaction table is read)."""
+    return db.scalar(select(models.User.data_version).where(models.User.id == user_id)) or 0
+
+
+get_data_version_async = to_async(get_data_version)
+
+
+def _query_key(request: Request) -> str:
+    return "&".join(sorted(f"{key}={value}" for key, value in request.query_params.multi_items()))
+
+
+def current_day() -> str:
+    """
+    UTC day the responses are computed on. Summaries of the current month/quarter/year, time series
+    ending with the current period and windows ending today all depend on it; a day is the finest
+    period any of them uses, so results stay valid until it changes.
+    """
+    return datetime.utcnow().date().isoformat()
+
+
+def make_etag(user_id: int, version: int, request: Request, day: Optional[str] = None) -> str:
+    """Weak ETag of a GET response, derived from the data version, the day, the path and the query parameters."""
+    day = day or current_day()
+    digest = hashlib.sha256(f"{user_id}:{day}:{request.url.path}?{_query_key(request)}".encode("utf-8")).hexdigest()[:16]
+    return f'W/"{version}-{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against etag, as required for GET revalidation."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+class VersionedResponse:
+    """
+    Conditional-request state of a GET route, resolved by the versioned_response dependency.
+    The ETag and Cache-Control headers are already set on the route's response.
+    """
+
+    def __init__(self, user_id: int, version: int, request: Request, response: Response):
+        self.user_id = user_id
+        self.version = version
+        day = current_day()
+        self.etag = make_etag(user_id, version, request, day)
+        self.not_modified = etag_matches(request.headers.get("if-none-match"), self.etag)
+        self._key = (user_id, version, day, request.url.path, _query_key(request))
+        response.headers.update(self.headers)
+
+    @property
+    def headers(self) -> dict:
+        """Validator headers, for routes that return their own Response (e.g. a StreamingResponse)."""
+        return {"ETag": self.etag, "Cache-Control": "private, no-cache"}
+
+    def not_modified_response(self) -> Response:
+        """Return the 304 answer for a matching If-None-Match."""
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=self.headers)
+
+    async def cached(self, compute: Callable[[], Awaitable]):
+        """Return the result for this user, version, day and query from result_cache, computing it on a miss."""
+        result = result_cache.get(self._key)
+        if result is None:
+            result = await compute()
+            result_cache.set(self._key, result)
+        return result
+
+
+async def versioned_response(
+    request: Request,
+    response: Response,
+    db: AnySession = Depends(get_session),
+    current_user: Principal = Depends(get_current_user)):
+    """Dependency reading the current user's data version and matching it against If-None-Match."""
+    version = await get_data_version_async(db, current_user.id)
+    return VersionedResponse(current_user.id, version, request, response)
+
+
+def result_cache_stats():
+    """Return the size and hit/miss/eviction counters of the result cache."""
+    return result_cache.stats()
@@ -0,0 +1,7 @@
+"""
+Benchmarks of the API's hot paths on a seeded synthetic dataset.
+
+Usage:
+    python -m benchmarks [--users N] [--expenses M] [--incomes K] [--years Y] [--seed S]
+                         [--repeat R] [--filter TEXT] [--output FILE] [--baseline FILE]
+"""
@@ -0,0 +1,49 @@
+import argparse
+import sys
+
+from .runner import compare_results, load_results, run_benchmarks, save_results
+
+
+def _print_case(name: str, stats: dict):
+    print(f"{name:<36} median {stats['median_ms']:>10.3f} ms   p95 {stats['p95_ms']:>10.3f} ms   ({stats['samples']} samples)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Time the Home Budget hot paths on a seeded synthetic dataset.")
+    parser.add_argument("--database-url", default=None, help="Empty database to run on (default: a temporary SQLite file).")
+    parser.add_argument("--users", type=int, default=10, help="Users to generate (default: 10).")
+    parser.add_argument("--expenses", type=int, default=1000, help="Expenses per user (default: 1000).")
+    parser.add_argument("--incomes", type=int, default=100, help="Incomes per user (default: 100).")
+    parser.add_argument("--years", type=int, default=3, help="Years the transactions are spread over (default: 3).")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed of the generator (default: 42).")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed samples per case (default: 20).")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed calls before sampling (default: 1).")
+    parser.add_argument("--filter", default=None, help="Only run the cases whose name contains this text.")
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", default=None, help="Compare against the results in this JSON file and exit with status 1 on a regression.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown of a median against the baseline, as a fraction (default: 0.25).")
+    parser.add_argument("--min-delta-ms", type=float, default=0.1, help="Slowdowns smaller than this many milliseconds never count as regressions (default: 0.1).")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.database_url, args.users, args.expenses, args.incomes, args.years, args.seed,
+                             args.repeat, args.warmup, args.filter, progress=_print_case)
+    if args.output:
+        save_results(results, args.output)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        baseline = load_results(args.baseline)
+        if baseline["meta"]["dataset"] != results["meta"]["dataset"]:
+            print(f"Warning: the baseline was measured on another dataset: {baseline['meta']['dataset']}")
+        rows = compare_results(results, baseline, args.tolerance, args.min_delta_ms)
+        for row in rows:
+            flag = "REGRESSION" if row["regressed"] else ""
+            print(f"{row['name']:<36} {row['baseline_ms']:>10.3f} -> {row['median_ms']:>10.3f} ms  x{row['ratio']:<6} {flag}")
+        regressions = [row for row in rows if row["regressed"]]
+        print(f"{len(rows)} cases compared, {len(regressions)} regressions")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
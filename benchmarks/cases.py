@@ -0,0 +1,147 @@
+"""
+The benchmarked hot paths, each timed in isolation on its own session.
+"""
+import asyncio
+import itertools
+import os
+import subprocess
+import sys
+from datetime import timedelta
+from typing import Callable, NamedTuple, Optional
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app import models
+from app.routers.users import register_user
+from app.schemas import UserCreate
+from app.utils import analytics_utils, expense_utils, income_utils, summary_utils
+from app.utils.auth import get_current_user, principal_cache
+from app.utils.pagination_utils import encode_cursor
+from app.utils.user_utils import create_token_for_user
+
+from .data import BENCHMARK_PASSWORD
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What a worker does before serving its first request: import the app and run the lifespan startup
+STARTUP_SCRIPT = """
+import asyncio
+from app.main import app
+
+async def start():
+    async with app.router.lifespan_context(app):
+        pass
+
+asyncio.run(start())
+"""
+
+
+class Case(NamedTuple):
+    """
+    One benchmark.
+    :param name: Dotted name, stable across runs so results can be compared.
+    :param run: Callable timed once per sample.
+    :param repeat: Upper bound on the samples taken (for slow cases such as bcrypt); None for no bound.
+    """
+    name: str
+    run: Callable[[], object]
+    repeat: Optional[int] = None
+
+
+def benchmark_cases(session_factory, dataset: dict, loop: asyncio.AbstractEventLoop):
+    """
+    Return the benchmark cases for a generated dataset.
+    :param session_factory: sessionmaker bound to the benchmark database.
+    :param dataset: Result of generate_dataset.
+    :param loop: Event loop that runs the async routes and dependencies.
+    """
+    user_id = dataset["user_ids"][0]
+    category_id = dataset["category_ids"][user_id][0]
+    end = dataset["end"]
+    quarter_ago = end - timedelta(days=90)
+
+    def with_session(fn, *args, **kwargs):
+        def run():
+            with session_factory() as db:
+                return fn(db, *args, **kwargs)
+        return run
+
+    with session_factory() as db:
+        token = create_token_for_user(db.get(models.User, user_id))["access_token"]
+        first_page = expense_utils.get_expenses_for_user(db, user_id, limit=50)
+    cursor = first_page[-1] if first_page else None
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+    def current_user(cached: bool):
+        def run():
+            if not cached:
+                principal_cache.clear()
+            with session_factory() as db:
+                return loop.run_until_complete(get_current_user(credentials=credentials, db=db))
+        return run
+
+    def python_process(code: str):
+        # the background scheduler would add a database pass to what is meant to measure startup alone
+        env = {**os.environ, "DATABASE_URL": session_factory.kw["bind"].url.render_as_string(hide_password=False),
+               "RECURRING_SCHEDULER_ENABLED": "false"}
+
+        def run():
+            subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, env=env, check=True, capture_output=True)
+        return run
+
+    registrations = itertools.count()
+
+    def register():
+        n = next(registrations)
+        with session_factory() as db:
+            user = UserCreate(username=f"newcomer{n}", email=f"newcomer{n}@example.com", password=BENCHMARK_PASSWORD)
+            return loop.run_until_complete(register_user(user, db))
+
+    def analytics(cold: bool, **kwargs):
+        def run():
+            if cold:
+                analytics_utils.ledger_cache.clear()
+            with session_factory() as db:
+                return analytics_utils.analyze_ledger(db, user_id, **kwargs)
+        return run
+
+    cases = [
+        Case("expenses.list.all", with_session(expense_utils.get_expenses_for_user, user_id)),
+        Case("expenses.list.category", with_session(expense_utils.get_expenses_for_user, user_id, category_id=category_id)),
+        Case("expenses.list.date_range", with_session(expense_utils.get_expenses_for_user, user_id, start_date=quarter_ago, end_date=end)),
+        Case("expenses.list.amount_range", with_session(expense_utils.get_expenses_for_user, user_id, min_amount=50, max_amount=150)),
+        Case("expenses.list.combined", with_session(expense_utils.get_expenses_for_user, user_id, category_id=category_id,
+                                                    start_date=quarter_ago, end_date=end, min_amount=50, max_amount=150)),
+        Case("expenses.list.page", with_session(expense_utils.get_expenses_for_user, user_id, limit=50)),
+        Case("expenses.search.word", with_session(expense_utils.get_expenses_for_user, user_id, q="pharmacy", limit=50)),
+        Case("expenses.search.prefix", with_session(expense_utils.get_expenses_for_user, user_id, q="ph", limit=50)),
+        Case("expenses.search.miss", with_session(expense_utils.get_expenses_for_user, user_id, q="dentist", limit=50)),
+        Case("incomes.list.date_range", with_session(income_utils.get_incomes_for_user, user_id, start_date=quarter_ago, end_date=end)),
+    ]
+    if cursor is not None:
+        cases.append(Case("expenses.list.cursor", with_session(expense_utils.get_expenses_for_user, user_id,
+                                                               cursor=encode_cursor(cursor.date, cursor.id), limit=50)))
+
+    for period in ("month", "quarter", "year"):
+        cases += [
+            Case(f"summary.expenses.{period}", with_session(expense_utils.get_expense_summary_util, user_id, period)),
+            Case(f"summary.incomes.{period}", with_session(income_utils.get_income_summary_util, user_id, period)),
+            Case(f"summary.financial.{period}", with_session(summary_utils.get_financial_summary, user_id, period)),
+        ]
+    cases += [
+        Case("summary.timeseries.month_24", with_session(summary_utils.get_financial_timeseries, user_id, "month", 24)),
+        Case("summary.timeseries.day_90", with_session(summary_utils.get_financial_timeseries, user_id, "day", 90)),
+        Case("analytics.load", analytics(cold=True, granularity="month")),
+        Case("analytics.week", analytics(cold=False, granularity="week")),
+        Case("analytics.category_pivot", analytics(cold=False, granularity="month", group_by="category")),
+        Case("balance.compute_balance_at", with_session(summary_utils.compute_balance_at, user_id, end - timedelta(days=200))),
+        Case("balance.current", with_session(summary_utils.get_current_balance, user_id)),
+        Case("auth.get_current_user.cold", current_user(cached=False)),
+        Case("auth.get_current_user.cached", current_user(cached=True)),
+        Case("auth.register", register, repeat=5),
+        # a bare interpreter, to tell the application's share of a worker spawn from Python's own
+        Case("startup.interpreter", python_process("pass"), repeat=5),
+        Case("startup.worker", python_process(STARTUP_SCRIPT), repeat=5),
+    ]
+    return cases
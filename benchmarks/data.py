@@ -0,0 +1,92 @@
+"""
+Seeded synthetic data generator.
+
+The same seed and sizes always produce the same users, categories, amounts and date offsets;
+dates are laid out over the `years` before the end of the current month, so the current-period
+summaries always have data to work on.
+"""
+import calendar
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.utils.balance_utils import rebuild_balance_checkpoints
+from app.utils.constants import IMPORT_CHUNK_SIZE, INITIAL_BALANCE, PREDEFINED_CATEGORIES
+from app.utils.passwords import hash_password
+from app.utils.rollup_utils import rebuild_rollups
+
+
+BENCHMARK_PASSWORD = "benchmark-password"
+
+_EXTRA_CATEGORIES = ["Groceries", "Health", "Travel", "Gifts", "Education", "Leisure"]
+_EXPENSE_TITLES = ["Supermarket", "Fuel", "Rent", "Electricity", "Restaurant", "Pharmacy", "Cinema", "Train ticket"]
+_INCOME_TITLES = ["Salary", "Bonus", "Refund", "Interest", "Freelance"]
+
+
+def _insert_chunked(db: Session, model, rows: list):
+    for start in range(0, len(rows), IMPORT_CHUNK_SIZE):
+        db.execute(insert(model), rows[start:start + IMPORT_CHUNK_SIZE])
+
+
+def generate_dataset(db: Session, users: int = 10, expenses: int = 1000, incomes: int = 100, years: int = 3, seed: int = 42):
+    """
+    Bulk-insert a synthetic dataset and rebuild the rollups and balance checkpoints for it.
+    :param db: SQLAlchemy session on an empty database with the schema created.
+    :param users: Number of users.
+    :param expenses: Expenses per user.
+    :param incomes: Incomes per user.
+    :param years: Years the transactions are spread over.
+    :param seed: Random seed.
+    :return: {"user_ids": [...], "usernames": {id: name}, "category_ids": {user id: [...]}, "start": datetime, "end": datetime}
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    end = datetime(now.year, now.month, calendar.monthrange(now.year, now.month)[1], 23, 59, 59)
+    start = end - timedelta(days=365 * years)
+    span_seconds = int((end - start).total_seconds())
+
+    password_hash = hash_password(BENCHMARK_PASSWORD)
+    db.execute(insert(models.User), [
+        {"username": f"bench{n}", "email": f"bench{n}@example.com", "password_hash": password_hash, "balance": INITIAL_BALANCE}
+        for n in range(users)
+    ])
+    usernames = dict(db.execute(select(models.User.id, models.User.username).order_by(models.User.id)).all())
+    user_ids = list(usernames)
+
+    names = PREDEFINED_CATEGORIES + _EXTRA_CATEGORIES
+    db.execute(insert(models.Category), [
+        {"name": name, "description": None, "user_id": user_id}
+        for user_id in user_ids
+        for name in names[:len(PREDEFINED_CATEGORIES) + rng.randint(0, len(_EXTRA_CATEGORIES))]
+    ])
+    category_ids = {user_id: [] for user_id in user_ids}
+    for category_id, user_id in db.execute(select(models.Category.id, models.Category.user_id).order_by(models.Category.id)):
+        category_ids[user_id].append(category_id)
+
+    def moment():
+        return start + timedelta(seconds=rng.randrange(span_seconds))
+
+    expense_rows = [
+        {"title": rng.choice(_EXPENSE_TITLES), "amount": Decimal(rng.randint(100, 50000)).scaleb(-2), "description": None,
+         "date": moment(), "category_id": rng.choice(category_ids[user_id]), "user_id": user_id}
+        for user_id in user_ids
+        for _ in range(expenses)
+    ]
+    income_rows = [
+        {"title": rng.choice(_INCOME_TITLES), "amount": Decimal(rng.randint(10000, 500000)).scaleb(-2), "description": None,
+         "date": moment(), "user_id": user_id}
+        for user_id in user_ids
+        for _ in range(incomes)
+    ]
+    _insert_chunked(db, models.Expense, expense_rows)
+    _insert_chunked(db, models.Income, income_rows)
+    db.commit()
+
+    rebuild_rollups(db)
+    rebuild_balance_checkpoints(db)
+
+    return {"user_ids": user_ids, "usernames": usernames, "category_ids": category_ids, "start": start, "end": end}
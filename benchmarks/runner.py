@@ -0,0 +1,132 @@
+"""
+Timing, result files and baseline comparison.
+"""
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from typing import Optional
+
+import sqlalchemy
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, engine_options
+from app.utils.passwords import shutdown_password_pool
+
+from .cases import benchmark_cases
+from .data import generate_dataset
+
+
+def time_case(run, repeat: int, warmup: int = 1) -> dict:
+    """Call run warmup times untimed, then repeat times, and return the sample statistics in milliseconds."""
+    for _ in range(warmup):
+        run()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "samples": len(samples),
+        "min_ms": round(samples[0], 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+    }
+
+
+def run_benchmarks(database_url: Optional[str] = None, users: int = 10, expenses: int = 1000, incomes: int = 100, years: int = 3,
+    seed: int = 42, repeat: int = 20, warmup: int = 1, name_filter: Optional[str] = None, progress=None) -> dict:
+    """
+    Generate the dataset and time every case.
+    :param database_url: Empty database to benchmark on; a temporary SQLite file when None.
+    :param name_filter: Only run the cases whose name contains this text.
+    :param progress: Called with (case name, stats) after each case.
+    :return: {"meta": {...}, "results": {case name: stats}}
+    """
+    scratch = None
+    if database_url is None:
+        scratch = tempfile.mkdtemp(prefix="budget-bench-")
+        database_url = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+
+    engine = create_engine(database_url, **engine_options(database_url))
+    loop = asyncio.new_event_loop()
+    try:
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+        started = time.perf_counter()
+        with session_factory() as db:
+            dataset = generate_dataset(db, users, expenses, incomes, years, seed)
+        generation_seconds = time.perf_counter() - started
+
+        results = {}
+        for case in benchmark_cases(session_factory, dataset, loop):
+            if name_filter and name_filter not in case.name:
+                continue
+            results[case.name] = time_case(case.run, min(repeat, case.repeat or repeat), warmup)
+            if progress is not None:
+                progress(case.name, results[case.name])
+    finally:
+        loop.close()
+        shutdown_password_pool()
+        engine.dispose()
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    return {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "dialect": make_url(database_url).get_backend_name(),
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "machine": platform.machine(),
+            "dataset": {"users": users, "expenses": expenses, "incomes": incomes, "years": years, "seed": seed},
+            "generation_seconds": round(generation_seconds, 3),
+            "repeat": repeat,
+            "warmup": warmup,
+        },
+        "results": results,
+    }
+
+
+def save_results(results: dict, path: str):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def load_results(path: str) -> dict:
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def compare_results(results: dict, baseline: dict, tolerance: float = 0.25, min_delta_ms: float = 0.1) -> list:
+    """
+    Compare the medians of two runs, case by case.
+    A case regresses when its median is more than `tolerance` (a fraction) and more than
+    `min_delta_ms` milliseconds slower than the baseline; the absolute floor keeps sub-millisecond
+    cases from failing on timer noise.
+    :return: [{"name", "baseline_ms", "median_ms", "ratio", "regressed"}] for the cases present in both runs.
+    """
+    rows = []
+    for name, stats in results["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        ratio = stats["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+        rows.append({
+            "name": name,
+            "baseline_ms": before["median_ms"],
+            "median_ms": stats["median_ms"],
+            "ratio": round(ratio, 3),
+            "regressed": ratio > 1 + tolerance and stats["median_ms"] - before["median_ms"] > min_delta_ms,
+        })
+    return rows
@@ -0,0 +1,51 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import engine_from_config, pool
+
+from app import models  # noqa: F401  (registers the tables on Base.metadata)
+from app.database import Base
+from app.utils.constants import DATABASE_URL
+from app.utils.search_utils import SEARCH_TABLE_NAME
+
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+config.set_main_option("sqlalchemy.url", DATABASE_URL)
+target_metadata = Base.metadata
+
+
+def include_name(name, type_, parent_names):
+    """Leave the search tables, which the migrations manage outside the models, out of autogenerate."""
+    return not (type_ == "table" and SEARCH_TABLE_NAME.match(name))
+
+
+def run_migrations_offline():
+    """Emit the migration SQL to stdout instead of running it (alembic upgrade --sql)."""
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        render_as_batch=DATABASE_URL.startswith("sqlite"),
+        include_name=include_name,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connectable = engine_from_config(config.get_section(config.config_ini_section, {}), prefix="sqlalchemy.", poolclass=pool.NullPool)
+    with connectable.connect() as connection:
+        # SQLite cannot ALTER most constraints in place; batch mode recreates the table instead
+        context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=connection.dialect.name == "sqlite",
+                          include_name=include_name)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
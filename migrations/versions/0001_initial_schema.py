@@ -0,0 +1,68 @@
+"""Initial schema: users, categories, expenses and incomes
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String(30), nullable=False),
+        sa.Column("email", sa.String(254), nullable=False),
+        sa.Column("password_hash", sa.String(128), nullable=False),
+        sa.Column("balance", sa.Numeric(12, 2)),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "categories",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(100), nullable=False),
+        sa.Column("description", sa.String(500), nullable=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+    )
+    op.create_index("ix_categories_id", "categories", ["id"])
+    op.create_index("ix_categories_name", "categories", ["name"])
+
+    op.create_table(
+        "expenses",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(150), nullable=False),
+        sa.Column("amount", sa.Numeric(12, 2), nullable=False),
+        sa.Column("description", sa.String(500), nullable=True),
+        sa.Column("date", sa.DateTime()),
+        sa.Column("category_id", sa.Integer(), sa.ForeignKey("categories.id")),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+    )
+    op.create_index("ix_expenses_id", "expenses", ["id"])
+
+    op.create_table(
+        "incomes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("amount", sa.Numeric(12, 2), nullable=False),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("date", sa.DateTime()),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+    )
+    op.create_index("ix_incomes_id", "incomes", ["id"])
+
+
+def downgrade():
+    op.drop_table("incomes")
+    op.drop_table("expenses")
+    op.drop_table("categories")
+    op.drop_table("users")
@@ -0,0 +1,90 @@
+"""Monthly expense/income rollups and balance checkpoints, backfilled from the raw rows
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def _month(column: str) -> str:
+    if op.get_bind().dialect.name == "postgresql":
+        return f"to_char({column}, 'YYYY-MM')"
+    return f"strftime('%Y-%m', {column})"
+
+
+def upgrade():
+    # Databases created by the application's create_all already have these tables
+    if sa.inspect(op.get_bind()).has_table("expense_rollups"):
+        return
+
+    op.create_table(
+        "expense_rollups",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("category_id", sa.Integer(), sa.ForeignKey("categories.id"), nullable=False),
+        sa.Column("period", sa.String(7), nullable=False),
+        sa.Column("total", sa.Numeric(12, 2), nullable=False),
+        sa.Column("entry_count", sa.Integer(), nullable=False),
+        sa.UniqueConstraint("user_id", "category_id", "period", name="uq_expense_rollups_user_category_period"),
+    )
+    op.create_table(
+        "income_rollups",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("period", sa.String(7), nullable=False),
+        sa.Column("total", sa.Numeric(12, 2), nullable=False),
+        sa.Column("entry_count", sa.Integer(), nullable=False),
+        sa.UniqueConstraint("user_id", "period", name="uq_income_rollups_user_period"),
+    )
+    op.create_table(
+        "balance_checkpoints",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("period", sa.String(7), nullable=False),
+        sa.Column("net", sa.Numeric(12, 2), nullable=False),
+        sa.UniqueConstraint("user_id", "period", name="uq_balance_checkpoints_user_period"),
+    )
+
+    op.execute(f"""
+        INSERT INTO expense_rollups (user_id, category_id, period, total, entry_count)
+        SELECT user_id, category_id, {_month("date")}, SUM(amount), COUNT(*)
+        FROM expenses
+        WHERE user_id IS NOT NULL AND category_id IS NOT NULL AND date IS NOT NULL
+        GROUP BY user_id, category_id, {_month("date")}
+    """)
+    op.execute(f"""
+        INSERT INTO income_rollups (user_id, period, total, entry_count)
+        SELECT user_id, {_month("date")}, SUM(amount), COUNT(*)
+        FROM incomes
+        WHERE user_id IS NOT NULL AND date IS NOT NULL
+        GROUP BY user_id, {_month("date")}
+    """)
+    op.execute(f"""
+        INSERT INTO balance_checkpoints (user_id, period, net)
+        SELECT user_id, period, SUM(delta) OVER (PARTITION BY user_id ORDER BY period)
+        FROM (
+            SELECT user_id, period, SUM(amount) AS delta
+            FROM (
+                SELECT user_id, {_month("date")} AS period, amount FROM incomes
+                WHERE user_id IS NOT NULL AND date IS NOT NULL
+                UNION ALL
+                SELECT user_id, {_month("date")} AS period, -amount FROM expenses
+                WHERE user_id IS NOT NULL AND date IS NOT NULL
+            ) AS movements
+            GROUP BY user_id, period
+        ) AS monthly
+    """)
+
+
+def downgrade():
+    op.drop_table("balance_checkpoints")
+    op.drop_table("income_rollups")
+    op.drop_table("expense_rollups")
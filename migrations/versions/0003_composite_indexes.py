@@ -0,0 +1,32 @@
+"""Composite (user_id, date) indexes for the per-user ledger queries, plus expenses.category_id
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_expenses_user_date", "expenses", ["user_id", "date"], if_not_exists=True)
+    op.create_index("ix_expenses_user_category_date", "expenses", ["user_id", "category_id", "date"], if_not_exists=True)
+    op.create_index("ix_incomes_user_date", "incomes", ["user_id", "date"], if_not_exists=True)
+    # deleting a category detaches its expenses by category_id alone
+    op.create_index("ix_expenses_category_id", "expenses", ["category_id"], if_not_exists=True)
+    op.create_index("ix_categories_user_name", "categories", ["user_id", "name"], if_not_exists=True)
+    op.create_index("ix_expense_rollups_user_period", "expense_rollups", ["user_id", "period"], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index("ix_expense_rollups_user_period", table_name="expense_rollups")
+    op.drop_index("ix_categories_user_name", table_name="categories")
+    op.drop_index("ix_expenses_category_id", table_name="expenses")
+    op.drop_index("ix_incomes_user_date", table_name="incomes")
+    op.drop_index("ix_expenses_user_category_date", table_name="expenses")
+    op.drop_index("ix_expenses_user_date", table_name="expenses")
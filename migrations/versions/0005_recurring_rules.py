@@ -0,0 +1,45 @@
+"""Recurring expense and income rules
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by the application's create_all already have the table
+    if sa.inspect(op.get_bind()).has_table("recurring_rules"):
+        return
+
+    op.create_table(
+        "recurring_rules",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("kind", sa.String(7), nullable=False),
+        sa.Column("title", sa.String(150), nullable=False),
+        sa.Column("amount", sa.Numeric(12, 2), nullable=False),
+        sa.Column("description", sa.String(500), nullable=True),
+        sa.Column("category_id", sa.Integer(), sa.ForeignKey("categories.id"), nullable=True),
+        sa.Column("frequency", sa.String(7), nullable=False),
+        sa.Column("interval", sa.Integer(), nullable=False),
+        sa.Column("start_date", sa.DateTime(), nullable=False),
+        sa.Column("end_date", sa.DateTime(), nullable=True),
+        sa.Column("occurrences", sa.Integer(), nullable=False),
+        sa.Column("next_run", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_recurring_rules_next_run", "recurring_rules", ["next_run"])
+    op.create_index("ix_recurring_rules_user_id", "recurring_rules", ["user_id"])
+
+
+def downgrade():
+    op.drop_index("ix_recurring_rules_user_id", table_name="recurring_rules")
+    op.drop_index("ix_recurring_rules_next_run", table_name="recurring_rules")
+    op.drop_table("recurring_rules")
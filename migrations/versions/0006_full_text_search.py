@@ -0,0 +1,28 @@
+"""Full-text search indexes on expense and income titles and descriptions
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+from app.utils.search_utils import drop_search_index_ddl, search_index_ddl
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 tables and triggers on SQLite (filled with the existing rows), GIN indexes on PostgreSQL
+    for table_name in ("expenses", "incomes"):
+        for statement in search_index_ddl(op.get_bind().dialect.name, table_name):
+            op.execute(statement)
+
+
+def downgrade():
+    for table_name in ("expenses", "incomes"):
+        for statement in drop_search_index_ddl(op.get_bind().dialect.name, table_name):
+            op.execute(statement)
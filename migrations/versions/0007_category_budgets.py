@@ -0,0 +1,31 @@
+"""Monthly category budgets
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "category_budgets",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("category_id", sa.Integer(), sa.ForeignKey("categories.id"), nullable=False),
+        sa.Column("monthly_limit", sa.Numeric(12, 2), nullable=False),
+        sa.UniqueConstraint("category_id", name="uq_category_budgets_category"),
+    )
+    op.create_index("ix_category_budgets_user_id", "category_budgets", ["user_id"])
+
+
+def downgrade():
+    op.drop_index("ix_category_budgets_user_id", table_name="category_budgets")
+    op.drop_table("category_budgets")
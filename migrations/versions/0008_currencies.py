@@ -0,0 +1,52 @@
+"""Transaction currencies, user base currencies and the FX rate table
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.constants import DEFAULT_BASE_CURRENCY
+from app.utils.search_utils import drop_search_index_ddl, search_index_ddl
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing users keep reporting in the default currency; existing entries have no currency of
+    # their own, i.e. they are in their owner's base currency
+    op.add_column("users", sa.Column("base_currency", sa.String(3), nullable=False, server_default=DEFAULT_BASE_CURRENCY))
+    op.add_column("expenses", sa.Column("currency", sa.String(3), nullable=True))
+    op.add_column("incomes", sa.Column("currency", sa.String(3), nullable=True))
+    op.add_column("recurring_rules", sa.Column("currency", sa.String(3), nullable=True))
+
+    op.create_table(
+        "fx_rates",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("currency", sa.String(3), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("rate", sa.Numeric(18, 8), nullable=False),
+        sa.UniqueConstraint("currency", "date", name="uq_fx_rates_currency_date"),
+    )
+
+
+def downgrade():
+    op.drop_table("fx_rates")
+
+    dialect_name = op.get_bind().dialect.name
+    for table_name in ("recurring_rules", "users"):
+        with op.batch_alter_table(table_name) as batch:
+            batch.drop_column("base_currency" if table_name == "users" else "currency")
+    # SQLite batch mode recreates the table, which drops the search triggers: they are set up again
+    for table_name in ("expenses", "incomes"):
+        for statement in drop_search_index_ddl(dialect_name, table_name):
+            op.execute(statement)
+        with op.batch_alter_table(table_name) as batch:
+            batch.drop_column("currency")
+        for statement in search_index_ddl(dialect_name, table_name):
+            op.execute(statement)
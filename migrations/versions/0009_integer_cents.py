@@ -0,0 +1,63 @@
+"""Money columns stored as integer cents
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.search_utils import drop_search_index_ddl, search_index_ddl
+
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+# (table, money column, nullable)
+MONEY_COLUMNS = (
+    ("users", "balance", True),
+    ("expenses", "amount", False),
+    ("incomes", "amount", False),
+    ("recurring_rules", "amount", False),
+    ("expense_rollups", "total", False),
+    ("income_rollups", "total", False),
+    ("balance_checkpoints", "net", False),
+    ("category_budgets", "monthly_limit", False),
+)
+SEARCHED_TABLES = ("expenses", "incomes")
+
+
+def _alter(table_name: str, column_name: str, nullable: bool, from_type, to_type, using: str):
+    dialect_name = op.get_bind().dialect.name
+    # SQLite batch mode recreates the table, which drops the search triggers: they are set up again
+    if table_name in SEARCHED_TABLES:
+        for statement in drop_search_index_ddl(dialect_name, table_name):
+            op.execute(statement)
+    with op.batch_alter_table(table_name) as batch:
+        batch.alter_column(column_name, existing_type=from_type, type_=to_type, existing_nullable=nullable, postgresql_using=using)
+    if table_name in SEARCHED_TABLES:
+        for statement in search_index_ddl(dialect_name, table_name):
+            op.execute(statement)
+
+
+def upgrade():
+    sqlite = op.get_bind().dialect.name == "sqlite"
+    for table_name, column_name, nullable in MONEY_COLUMNS:
+        # SQLite keeps the stored values through the table copy, so they are converted beforehand;
+        # PostgreSQL converts them while changing the column type
+        if sqlite:
+            op.execute(f"UPDATE {table_name} SET {column_name} = CAST(ROUND({column_name} * 100) AS INTEGER)")
+        _alter(table_name, column_name, nullable, sa.Numeric(12, 2), sa.BigInteger(),
+               f"(round({column_name} * 100))::bigint")
+
+
+def downgrade():
+    sqlite = op.get_bind().dialect.name == "sqlite"
+    for table_name, column_name, nullable in MONEY_COLUMNS:
+        _alter(table_name, column_name, nullable, sa.BigInteger(), sa.Numeric(12, 2),
+               f"({column_name} / 100.0)::numeric(12, 2)")
+        if sqlite:
+            op.execute(f"UPDATE {table_name} SET {column_name} = {column_name} / 100.0")
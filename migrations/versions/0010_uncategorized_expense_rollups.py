@@ -0,0 +1,70 @@
+"""Rollups of uncategorized expenses
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.constants import FX_REFERENCE_CURRENCY
+
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("expense_rollups") as batch:
+        batch.alter_column("category_id", existing_type=sa.Integer(), nullable=True)
+    op.create_index("uq_expense_rollups_user_period_uncategorized", "expense_rollups", ["user_id", "period"], unique=True,
+                    sqlite_where=sa.text("category_id IS NULL"), postgresql_where=sa.text("category_id IS NULL"))
+
+    # references to categories deleted before their expenses, rollups and rules were kept in step
+    op.execute("UPDATE expenses SET category_id = NULL WHERE category_id NOT IN (SELECT id FROM categories)")
+    op.execute("UPDATE recurring_rules SET category_id = NULL, next_run = NULL WHERE category_id NOT IN (SELECT id FROM categories)")
+    op.execute("DELETE FROM expense_rollups WHERE category_id NOT IN (SELECT id FROM categories)")
+
+    # the tables and the conversion to each owner's base currency as they are at this revision
+    expenses = sa.table("expenses", sa.column("id"), sa.column("user_id"), sa.column("category_id"), sa.column("date"),
+                        sa.column("amount"), sa.column("currency"))
+    users = sa.table("users", sa.column("id"), sa.column("base_currency"))
+    fx_rates = sa.table("fx_rates", sa.column("currency"), sa.column("date"), sa.column("rate"))
+    expense_rollups = sa.table("expense_rollups", sa.column("user_id"), sa.column("category_id"), sa.column("period"),
+                               sa.column("total"), sa.column("entry_count"))
+
+    def rate(currency):
+        in_effect = (
+            sa.select(fx_rates.c.rate)
+            .where(fx_rates.c.currency == currency, fx_rates.c.date <= expenses.c.date)
+            .order_by(fx_rates.c.date.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        return sa.case((currency == FX_REFERENCE_CURRENCY, 1), else_=in_effect)
+
+    base_currency = sa.select(users.c.base_currency).where(users.c.id == expenses.c.user_id).scalar_subquery()
+    base_amount = sa.case(
+        (expenses.c.currency.is_(None) | (expenses.c.currency == base_currency), expenses.c.amount),
+        else_=sa.cast(sa.func.round(expenses.c.amount * rate(base_currency) / rate(expenses.c.currency)), sa.BigInteger()),
+    )
+    if op.get_bind().dialect.name == "postgresql":
+        month = sa.func.to_char(expenses.c.date, "YYYY-MM")
+    else:
+        month = sa.func.strftime("%Y-%m", expenses.c.date)
+
+    op.execute(expense_rollups.insert().from_select(
+        ["user_id", "category_id", "period", "total", "entry_count"],
+        sa.select(expenses.c.user_id, sa.null(), month, sa.func.sum(base_amount), sa.func.count(expenses.c.id))
+        .where(expenses.c.user_id.is_not(None), expenses.c.category_id.is_(None), expenses.c.date.is_not(None))
+        .group_by(expenses.c.user_id, month)
+    ))
+
+
+def downgrade():
+    op.execute("DELETE FROM expense_rollups WHERE category_id IS NULL")
+    op.drop_index("uq_expense_rollups_user_period_uncategorized", table_name="expense_rollups")
+    with op.batch_alter_table("expense_rollups") as batch:
+        batch.alter_column("category_id", existing_type=sa.Integer(), nullable=False)
@@ -0,0 +1,56 @@
+"""Amounts in the owner's base currency stored on expenses and incomes
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.constants import FX_REFERENCE_CURRENCY
+
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+ENTRY_TABLES = ("expenses", "incomes")
+
+
+def _backfill(table_name: str):
+    """Convert the existing entries with the rates in effect at their dates, as the rollups were rebuilt with."""
+    # the tables and the conversion to each owner's base currency as they are at this revision
+    entries = sa.table(table_name, sa.column("user_id"), sa.column("date"), sa.column("amount"), sa.column("currency"),
+                       sa.column("base_amount"))
+    users = sa.table("users", sa.column("id"), sa.column("base_currency"))
+    fx_rates = sa.table("fx_rates", sa.column("currency"), sa.column("date"), sa.column("rate"))
+
+    def rate(currency):
+        in_effect = (
+            sa.select(fx_rates.c.rate)
+            .where(fx_rates.c.currency == currency, fx_rates.c.date <= entries.c.date)
+            .order_by(fx_rates.c.date.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        return sa.case((currency == FX_REFERENCE_CURRENCY, 1), else_=in_effect)
+
+    base_currency = sa.select(users.c.base_currency).where(users.c.id == entries.c.user_id).scalar_subquery()
+    # entries in a currency without a rate are left NULL, as they were left out of the sums
+    op.execute(entries.update().values(base_amount=sa.case(
+        (entries.c.currency.is_(None) | (entries.c.currency == base_currency), entries.c.amount),
+        else_=sa.cast(sa.func.round(entries.c.amount * rate(base_currency) / rate(entries.c.currency)), sa.BigInteger()),
+    )))
+
+
+def upgrade():
+    for table_name in ENTRY_TABLES:
+        op.add_column(table_name, sa.Column("base_amount", sa.BigInteger(), nullable=True))
+        _backfill(table_name)
+
+
+def downgrade():
+    for table_name in ENTRY_TABLES:
+        op.drop_column(table_name, "base_amount")
@@ -0,0 +1,86 @@
+"""
+Shared fixtures: the application on a throwaway SQLite database, migrated once per test session.
+The settings are read when the app package is imported, so they are set before any app import.
+"""
+import itertools
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+os.environ["RECURRING_SCHEDULER_ENABLED"] = "false"
+os.environ["BCRYPT_ROUNDS"] = "4"
+# a request running more statements than its route's query budget fails its test
+os.environ["QUERY_BUDGET_ENFORCE"] = "true"
+
+from collections import namedtuple  # noqa: E402
+from contextlib import contextmanager  # noqa: E402
+
+import pytest  # noqa: E402
+from alembic import command  # noqa: E402
+from alembic.config import Config  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.database import get_engines  # noqa: E402
+from app.main import create_app  # noqa: E402
+from app.manage import PROJECT_ROOT  # noqa: E402
+
+
+User = namedtuple("User", "id headers")
+_user_numbers = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    command.upgrade(Config(os.path.join(PROJECT_ROOT, "alembic.ini")), "head")
+    with TestClient(create_app()) as test_client:
+        yield test_client
+
+
+def _register(client) -> User:
+    number = next(_user_numbers)
+    credentials = {"username": f"user{number}", "password": "secret1"}
+    registered = client.post("/auth/register", json={**credentials, "email": f"user{number}@example.com"})
+    assert registered.status_code == 201, registered.text
+    token = client.post("/auth/login", json=credentials).json()["access_token"]
+    return User(registered.json()["id"], {"Authorization": f"Bearer {token}"})
+
+
+@pytest.fixture
+def user(client) -> User:
+    """A newly registered user, with its predefined categories, and the headers authenticating it."""
+    return _register(client)
+
+
+@pytest.fixture
+def other_user(client) -> User:
+    """A second newly registered user, for comparing two ways of making the same changes."""
+    return _register(client)
+
+
+@pytest.fixture
+def db(client):
+    session = get_engines().SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def statements(client):
+    """Context manager collecting the SQL statements run on the application's engines while it is open."""
+    @contextmanager
+    def collect():
+        executed = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            executed.append(statement)
+
+        engines = {get_engines().engine, get_engines().read_engine}
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", record)
+        try:
+            yield executed
+        finally:
+            for engine in engines:
+                event.remove(engine, "before_cursor_execute", record)
+    return collect
@@ -0,0 +1,48 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import func, select
+
+from app import models
+from app.utils.period_utils import period_bucket
+
+ENTRIES = (("Food", "12.34", "2025-01-05"), ("Car", "40", "2025-01-06"), ("Food", "7.66", "2025-03-31"),
+           ("Car", "0.01", "2025-04-01"), ("Food", "100", "2025-06-30"), ("Car", "5.5", "2024-12-31"))
+
+
+def _add_entries(client, user):
+    categories = {category["name"]: category["id"] for category in client.get("/categories/", headers=user.headers).json()}
+    for name, amount, day in ENTRIES:
+        client.post("/expenses/", headers=user.headers,
+                    json={"title": "x", "amount": amount, "category_id": categories[name], "date": f"{day}T10:00:00"})
+        client.post("/incomes/", headers=user.headers, json={"title": "pay", "amount": "50", "date": f"{day}T09:00:00"})
+
+
+def _sql_totals(db, model, user_id, granularity, by_category=False):
+    """Return the (period[, category name], total, count) rows of the analytics window summed in SQL."""
+    bucket = period_bucket(model.date, granularity)
+    groups = (bucket, models.Category.name) if by_category else (bucket,)
+    query = select(*groups, func.sum(model.base_amount), func.count())
+    if by_category:
+        query = query.join(models.Category, model.category_id == models.Category.id)
+    return db.execute(
+        query.where(model.user_id == user_id, model.date >= "2025-01-01", model.date < "2025-07-01").group_by(*groups)
+    ).all()
+
+
+@pytest.mark.parametrize("granularity", ["week", "month", "quarter"])
+def test_bucket_totals_match_the_sql_sums(client, user, db, granularity):
+    _add_entries(client, user)
+    window = {"granularity": granularity, "start_date": "2025-01-01T00:00:00", "end_date": "2025-06-30T00:00:00"}
+
+    for kind, model in (("expenses", models.Expense), ("incomes", models.Income)):
+        result = client.get("/finance/analytics", headers=user.headers, params={**window, "kind": kind}).json()
+        buckets = {period["period"]: (Decimal(str(period["total"])), period["count"]) for period in result["periods"] if period["count"]}
+        assert buckets == {period: (total, count) for period, total, count in _sql_totals(db, model, user.id, granularity)}
+        assert Decimal(str(result["total"])) == sum(total for total, _ in buckets.values())
+
+    result = client.get("/finance/analytics", headers=user.headers, params={**window, "group_by": "category"}).json()
+    names = [category["name"] for category in result["categories"]]
+    pivoted = {(period["period"], name): Decimal(str(total))
+               for period in result["periods"] for name, total in zip(names, period["by_category"]) if total}
+    assert pivoted == {(period, name): total for period, name, total, _ in _sql_totals(db, models.Expense, user.id, granularity, True)}
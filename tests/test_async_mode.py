@@ -0,0 +1,53 @@
+"""
+The routes served through SQLAlchemy's AsyncEngine (DB_ASYNC): the engines and the session
+dependency are switched for one application instance, on the same database as the other tests.
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import database
+from app.main import create_app
+
+
+@pytest.fixture
+def async_client(client, monkeypatch):
+    monkeypatch.setattr(database, "DB_ASYNC", True)
+    # the engines are created again, with their async members; the lifespan disposes them on exit
+    monkeypatch.setattr(database, "_engines", None)
+    app = create_app()
+    app.dependency_overrides[database.get_session] = database.get_async_db
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _scenario(client, username):
+    credentials = {"username": username, "password": "secret1"}
+    assert client.post("/auth/register", json={**credentials, "email": f"{username}@example.com"}).status_code == 201
+    headers = {"Authorization": f"Bearer {client.post('/auth/login', json=credentials).json()['access_token']}"}
+
+    food = next(category["id"] for category in client.get("/categories/", headers=headers).json() if category["name"] == "Food")
+    expense = client.post("/expenses/", headers=headers, json={"title": "lunch", "amount": "12.5", "category_id": food,
+                                                               "date": "2025-05-02T12:00:00"}).json()
+    client.put(f"/expenses/{expense['id']}", headers=headers, json={"title": "lunch", "amount": "15", "category_id": food,
+                                                                    "date": "2025-05-02T12:00:00"})
+    batch = client.post("/batch/", headers=headers, json={"operations": [
+        {"action": "create", "entity": "income", "data": {"title": "pay", "amount": "100", "date": "2025-05-01T00:00:00"}},
+        {"action": "create", "entity": "category", "data": {"name": "Books"}},
+    ]}).json()
+    return {
+        "expenses": [(row["title"], row["amount"]) for row in client.get("/expenses/", headers=headers).json()],
+        "batch": [result["status"] for result in batch["results"]],
+        "summary": client.get("/expenses/summary", headers=headers).json(),
+        "year": client.get("/finance/timeseries?granularity=year&periods=2", headers=headers).json()["opening_balance"],
+    }
+
+
+def test_async_mode_answers_like_the_threadpool(client, async_client):
+    executed = []
+    async_engine = database.get_engines().async_engine.sync_engine
+    event.listen(async_engine, "before_cursor_execute", lambda *args: executed.append(args[2]))
+    served_async = _scenario(async_client, "async_user")
+    assert executed
+    assert served_async == _scenario(client, "threadpool_user")
+    assert served_async["expenses"] == [("lunch", "15.00")]
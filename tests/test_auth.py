@@ -0,0 +1,43 @@
+from app import models
+from app.utils.auth import principal_cache
+from app.utils.passwords import hash_password
+from app.utils.user_utils import update_password_hash_in_db
+
+
+def _token(user):
+    return user.headers["Authorization"].split(" ", 1)[1]
+
+
+def test_cached_tokens_are_dropped_when_their_user_changes(client, user, other_user, db):
+    for authenticated in (user, other_user):
+        assert client.get("/categories/", headers=authenticated.headers).status_code == 200
+    assert principal_cache.get(_token(user)).id == user.id
+
+    stored = db.get(models.User, user.id)
+    update_password_hash_in_db(db, stored, hash_password("secret2"))
+    assert principal_cache.get(_token(user)) is None
+    assert principal_cache.get(_token(other_user)).id == other_user.id
+
+    # a renamed user's tokens name someone else: they are checked again rather than served from the cache
+    client.get("/categories/", headers=user.headers)
+    stored.username = f"renamed{user.id}"
+    db.commit()
+    response = client.get("/categories/", headers=user.headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "User not found"
+
+
+def test_login_rehashes_passwords_hashed_with_another_cost(client, user, db):
+    from passlib.hash import bcrypt
+
+    stored = db.get(models.User, user.id)
+    stored.password_hash = bcrypt.using(rounds=5).hash("secret1")
+    db.commit()
+
+    credentials = {"username": stored.username, "password": "secret1"}
+    assert client.post("/auth/login", json=credentials).status_code == 200
+    db.refresh(stored)
+    assert stored.password_hash.startswith("$2b$04$")
+    assert bcrypt.verify("secret1", stored.password_hash)
+
+    assert client.post("/auth/login", json={**credentials, "password": "wrong1"}).status_code == 401
@@ -0,0 +1,100 @@
+from collections import Counter
+
+from sqlalchemy import select
+
+from app import models
+
+
+def _category(client, user, name):
+    return next(category["id"] for category in client.get("/categories/", headers=user.headers).json() if category["name"] == name)
+
+
+def _rollups(db, user_id):
+    table = models.ExpenseRollup.__table__
+    rows = db.execute(select(table.c.category_id, table.c.period, table.c.total, table.c.entry_count)
+                      .where(table.c.user_id == user_id, table.c.entry_count != 0)).all()
+    return Counter((category_id is not None, period, total, count) for category_id, period, total, count in rows)
+
+
+def _setup(client, user):
+    food, car = _category(client, user, "Food"), _category(client, user, "Car")
+    expenses = [client.post("/expenses/", headers=user.headers,
+                            json={"title": "x", "amount": amount, "category_id": food, "date": "2025-09-02T00:00:00"}).json()
+                for amount in ("10", "2.5")]
+    rule = client.post("/recurring/", headers=user.headers, json={
+        "kind": "expense", "title": "Lunch", "amount": "9", "category_id": food, "frequency": "week", "start_date": "2030-01-01T00:00:00"}).json()
+    return food, car, expenses[0], rule
+
+
+def test_batch_category_delete_matches_the_single_delete(client, user, other_user, db):
+    single, batched = user, other_user
+    food, car, moved, _ = _setup(client, single)
+    client.put(f"/expenses/{moved['id']}", headers=single.headers,
+               json={"title": "x", "amount": "10", "category_id": car, "date": "2025-09-02T00:00:00"})
+    assert client.delete(f"/categories/{food}", headers=single.headers).status_code == 204
+
+    food, car, moved, rule = _setup(client, batched)
+    response = client.post("/batch/", headers=batched.headers, json={"operations": [
+        {"action": "update", "entity": "expense", "id": moved["id"],
+         "data": {"title": "x", "amount": "10", "category_id": car, "date": "2025-09-02T00:00:00"}},
+        {"action": "delete", "entity": "category", "id": food},
+    ]})
+    assert [result["status"] for result in response.json()["results"]] == [200, 204]
+
+    assert _rollups(db, batched.id) == _rollups(db, single.id)
+    assert db.get(models.RecurringRule, rule["id"]).next_run is None
+
+
+def test_batch_missing_income_matches_the_single_endpoint(client, user):
+    detail = client.delete("/incomes/999999", headers=user.headers).json()["detail"]
+    response = client.post("/batch/", headers=user.headers, json={"operations": [{"action": "delete", "entity": "income", "id": 999999}]})
+    assert response.json()["results"][0]["error"] == detail == "Income not found"
+
+
+def test_batch_category_update_strips_the_name_and_rejects_duplicates(client, user):
+    food, car = _category(client, user, "Food"), _category(client, user, "Car")
+    response = client.post("/batch/", headers=user.headers, json={"operations": [
+        {"action": "update", "entity": "category", "id": food, "data": {"name": " Car "}},
+        {"action": "update", "entity": "category", "id": food, "data": {"name": " Groceries "}},
+        {"action": "update", "entity": "category", "id": car, "data": {"name": "Groceries"}},
+    ]})
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == [409, 200, 409]
+    assert results[0]["error"] == "Category already exists"
+    assert results[1]["data"]["name"] == "Groceries"
+
+    single = client.put(f"/categories/{car}", headers=user.headers, json={"name": " Groceries "})
+    assert single.status_code == 409
+    assert single.json()["detail"] == results[2]["error"]
+    assert client.put(f"/categories/{car}", headers=user.headers, json={"name": " Car "}).json()["name"] == "Car"
+
+
+def test_batch_results_carry_the_stored_values(client, user):
+    food = _category(client, user, "Food")
+    expense = {"title": "x", "amount": "5", "category_id": food, "date": "2025-09-02T10:00:00"}
+    income = {"title": "x", "amount": "5.005", "date": "2025-09-02T10:00:00"}
+    response = client.post("/batch/", headers=user.headers, json={"operations": [
+        {"action": "create", "entity": "expense", "data": expense},
+        {"action": "create", "entity": "income", "data": income},
+    ]})
+    batched = [result["data"] for result in response.json()["results"]]
+
+    single = [client.post("/expenses/", headers=user.headers, json=expense).json(),
+              client.post("/incomes/", headers=user.headers, json=income).json()]
+    assert [data["amount"] for data in batched] == ["5.00", "5.01"]
+    assert [{**data, "id": None} for data in batched] == [{**data, "id": None} for data in single]
+
+
+def test_batch_updates_of_one_expense_take_off_its_stored_amount_once(client, user, db):
+    food, car = _category(client, user, "Food"), _category(client, user, "Car")
+    expense = client.post("/expenses/", headers=user.headers,
+                          json={"title": "x", "amount": "10", "category_id": food, "date": "2025-09-02T00:00:00"}).json()
+    response = client.post("/batch/", headers=user.headers, json={"operations": [
+        {"action": "update", "entity": "expense", "id": expense["id"],
+         "data": {"title": "x", "amount": "4", "category_id": car, "date": "2025-08-02T00:00:00"}},
+        {"action": "update", "entity": "expense", "id": expense["id"],
+         "data": {"title": "x", "amount": "6", "category_id": car, "date": "2025-09-02T00:00:00"}},
+    ]})
+    assert [result["status"] for result in response.json()["results"]] == [200, 200]
+    assert db.get(models.Expense, expense["id"]).base_amount == 6
+    assert _rollups(db, user.id) == Counter({(True, "2025-09", 6, 1): 1})
@@ -0,0 +1,33 @@
+def _category(client, user, name):
+    return next(category["id"] for category in client.get("/categories/", headers=user.headers).json() if category["name"] == name)
+
+
+def _expense(category_id, amount, day="2025-05-10"):
+    return {"title": "x", "amount": amount, "category_id": category_id, "date": f"{day}T00:00:00"}
+
+
+def test_overspend_header_is_sent_by_the_write_crossing_the_limit(client, user):
+    food, car = _category(client, user, "Food"), _category(client, user, "Car")
+    assert client.put(f"/budgets/{food}", headers=user.headers, json={"monthly_limit": "50"}).status_code == 200
+
+    within = client.post("/expenses/", headers=user.headers, json=_expense(food, "50"))
+    assert "X-Budget-Exceeded" not in within.headers
+    unbudgeted = client.post("/expenses/", headers=user.headers, json=_expense(car, "500"))
+    assert "X-Budget-Exceeded" not in unbudgeted.headers
+
+    crossing = client.post("/expenses/", headers=user.headers, json=_expense(food, "0.01"))
+    assert crossing.headers["X-Budget-Exceeded"] == str(food)
+    # already over: no new alert, nor in another month still within its limit
+    over = client.post("/expenses/", headers=user.headers, json=_expense(food, "1"))
+    assert "X-Budget-Exceeded" not in over.headers
+    assert "X-Budget-Exceeded" not in client.post("/expenses/", headers=user.headers, json=_expense(food, "1", "2025-06-10")).headers
+
+    # back within the limit, then taken over it again by an update
+    client.delete(f"/expenses/{over.json()['id']}", headers=user.headers)
+    moved = client.put(f"/expenses/{crossing.json()['id']}", headers=user.headers, json=_expense(car, "0.01"))
+    assert "X-Budget-Exceeded" not in moved.headers
+    assert client.put(f"/expenses/{crossing.json()['id']}", headers=user.headers,
+                      json=_expense(food, "5")).headers["X-Budget-Exceeded"] == str(food)
+
+    status = next(entry for entry in client.get("/budgets/?period=2025-05", headers=user.headers).json() if entry["category_id"] == food)
+    assert (status["spent"], status["over_budget"]) == ("55.00", True)
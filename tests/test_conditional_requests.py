@@ -0,0 +1,27 @@
+from datetime import date
+
+from app.utils import version_utils
+from app.utils.fx_utils import load_fx_rates
+
+
+def _revalidate(client, user, path, etag):
+    return client.get(path, headers={**user.headers, "If-None-Match": etag})
+
+
+def test_etag_changes_with_the_day(client, user, monkeypatch):
+    path = "/finance/summary?period=month"
+    etag = client.get(path, headers=user.headers).headers["ETag"]
+    assert _revalidate(client, user, path, etag).status_code == 304
+
+    monkeypatch.setattr(version_utils, "current_day", lambda: "2999-01-01")
+    response = _revalidate(client, user, path, etag)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_loading_rates_keeps_results_built_from_stored_amounts(client, user, db):
+    path = "/finance/timeseries?granularity=month&periods=3"
+    etag = client.get(path, headers=user.headers).headers["ETag"]
+
+    load_fx_rates(db, [{"currency": "USD", "date": date(2020, 1, 1), "rate": 1}])
+    assert _revalidate(client, user, path, etag).status_code == 304
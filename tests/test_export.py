@@ -0,0 +1,35 @@
+import csv
+import io
+import json
+
+
+def _add_entries(client, user):
+    food = next(category["id"] for category in client.get("/categories/", headers=user.headers).json() if category["name"] == "Food")
+    expense = client.post("/expenses/", headers=user.headers, json={
+        "title": "lunch, late", "amount": "12.5", "description": "with \"friends\"", "category_id": food, "date": "2025-05-02T12:00:00"}).json()
+    income = client.post("/incomes/", headers=user.headers, json={"title": "pay", "amount": "100", "date": "2025-05-01T09:00:00"}).json()
+    return expense, income
+
+
+def test_csv_export_lists_the_ledger_by_date(client, user):
+    expense, income = _add_entries(client, user)
+    response = client.get("/finance/export?format=csv", headers=user.headers)
+
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == 'attachment; filename="ledger.csv"'
+    assert list(csv.reader(io.StringIO(response.text))) == [
+        ["kind", "id", "date", "title", "description", "amount", "currency", "category"],
+        ["income", str(income["id"]), "2025-05-01T09:00:00", "pay", "", "100.00", "", ""],
+        ["expense", str(expense["id"]), "2025-05-02T12:00:00", "lunch, late", 'with "friends"', "12.50", "", "Food"],
+    ]
+
+
+def test_ndjson_export_applies_the_filters(client, user):
+    expense, _ = _add_entries(client, user)
+    response = client.get("/finance/export?format=ndjson&kind=expenses&min_amount=10", headers=user.headers)
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in response.text.splitlines()] == [{
+        "kind": "expense", "id": expense["id"], "date": "2025-05-02T12:00:00", "title": "lunch, late",
+        "description": 'with "friends"', "amount": "12.50", "currency": None, "category": "Food"}]
+    assert client.get("/finance/export?format=ndjson&kind=incomes&category_id=1", headers=user.headers).status_code == 400
@@ -0,0 +1,43 @@
+from datetime import date
+
+import pytest
+
+from app.utils import expense_utils, income_utils
+from app.utils.fx_utils import load_fx_rates
+
+
+def _csv(rows: int, category: str = "") -> bytes:
+    # amounts alternate between the base currency and a converted one, with a new date on every row
+    lines = ["title,amount,currency,date" + (",category" if category else "")]
+    for n in range(rows):
+        currency = "GBP" if n % 2 else ""
+        lines.append(f"row{n},1.50,{currency},2025-{n % 12 + 1:02d}-{n % 28 + 1:02d}" + (f",{category}" if category else ""))
+    return "\n".join(lines).encode()
+
+
+@pytest.mark.parametrize("kind,utils", [("expenses", expense_utils), ("incomes", income_utils)])
+def test_imports_of_many_chunks_stay_within_budget(client, user, db, monkeypatch, kind, utils):
+    load_fx_rates(db, [{"currency": currency, "date": date(2020, 1, 1), "rate": rate} for currency, rate in (("USD", 1.1), ("GBP", 0.85))])
+    # with QUERY_BUDGET_ENFORCE set, a request going over its budget fails
+    monkeypatch.setattr(utils, "IMPORT_CHUNK_SIZE", 3)
+    category = client.get("/categories/", headers=user.headers).json()[0]["name"] if kind == "expenses" else ""
+
+    response = client.post(f"/{kind}/import", headers=user.headers, files={"file": ("rows.csv", _csv(45, category), "text/csv")})
+    assert response.status_code == 200, response.text
+    assert response.json() == {"imported": 45, "failed": 0, "errors": []}
+
+
+@pytest.mark.parametrize("kind", ["expenses", "incomes"])
+def test_rows_without_a_rate_are_reported_per_row(client, user, kind):
+    category = ",Food" if kind == "expenses" else ""
+    upload = "\n".join([
+        "title,amount,currency,date" + (",category" if category else ""),
+        f"ok,1.50,,2025-01-02{category}",
+        f"no rate,2.00,JPY,2025-01-03{category}",
+        f"ok,3.00,,2025-01-04{category}",
+    ]).encode()
+
+    response = client.post(f"/{kind}/import", headers=user.headers, files={"file": ("rows.csv", upload, "text/csv")})
+    assert response.status_code == 200, response.text
+    assert response.json() == {"imported": 2, "failed": 1,
+                               "errors": [{"row": 2, "errors": ["currency: No JPY exchange rate on or before 2025-01-03"]}]}
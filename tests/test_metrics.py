@@ -0,0 +1,12 @@
+def _types(exposition: str) -> dict:
+    return dict(line.split()[2:4] for line in exposition.splitlines() if line.startswith("# TYPE "))
+
+
+def test_cache_hits_and_misses_are_counters(client, user):
+    client.get("/finance/summary", headers=user.headers)
+    types = _types(client.get("/metrics").text)
+
+    for counter in ("hits", "misses", "evictions"):
+        assert types[f"budget_cache_{counter}_total"] == "counter"
+        assert f"budget_cache_{counter}" not in types
+    assert types["budget_cache_entries"] == "gauge"
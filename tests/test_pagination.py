@@ -0,0 +1,25 @@
+def _titles(rows):
+    return [row["title"] for row in rows]
+
+
+def test_cursor_pages_continue_after_entries_sharing_a_date(client, user):
+    for index, day in enumerate(("02", "01", "02", "02", "03")):
+        client.post("/incomes/", headers=user.headers, json={"title": f"pay {index}", "amount": "1", "date": f"2025-05-{day}T00:00:00"})
+
+    pages, cursor = [], None
+    while True:
+        response = client.get("/incomes/", headers=user.headers, params={"limit": 2, **({"cursor": cursor} if cursor else {})})
+        pages.append(_titles(response.json()))
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert pages == [["pay 1", "pay 0"], ["pay 2", "pay 3"], ["pay 4"]]
+    assert _titles(client.get("/incomes/", headers=user.headers).json()) == [title for page in pages for title in page]
+
+
+def test_malformed_cursors_are_refused(client, user):
+    for cursor in ("not a cursor", "b2Zmc2V0fDM="):  # the second is a search (offset) cursor
+        response = client.get("/expenses/", headers=user.headers, params={"limit": 2, "cursor": cursor})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid cursor"
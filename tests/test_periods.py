@@ -0,0 +1,31 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import DateTime, literal, select
+from sqlalchemy.dialects import postgresql
+
+from app import models
+from app.utils.period_utils import GRANULARITIES, period_bucket, period_label, period_start
+
+# a Sunday closing a quarter, a Monday, and a leap day
+MOMENTS = (datetime(2025, 3, 30, 23, 59), datetime(2025, 3, 31, 0, 0), datetime(2024, 2, 29, 12, 0))
+
+
+@pytest.mark.parametrize("granularity", GRANULARITIES)
+def test_sqlite_buckets_match_the_python_labels(db, granularity):
+    labels = db.execute(select(*(period_bucket(literal(moment, DateTime), granularity) for moment in MOMENTS))).one()
+    assert list(labels) == [period_label(period_start(moment, granularity), granularity) for moment in MOMENTS]
+
+
+def test_week_and_quarter_labels():
+    assert [period_label(period_start(moment, "week"), "week") for moment in MOMENTS] == ["2025-03-24", "2025-03-31", "2024-02-26"]
+    assert [period_label(period_start(moment, "quarter"), "quarter") for moment in MOMENTS] == ["2025-1", "2025-1", "2024-1"]
+
+
+@pytest.mark.parametrize("granularity, expected", [
+    ("week", "to_char(date_trunc('week', expenses.date), 'YYYY-MM-DD')"),
+    ("quarter", "to_char(date_trunc('quarter', expenses.date), 'YYYY-Q')"),
+])
+def test_postgresql_buckets_truncate_then_format(granularity, expected):
+    compiled = select(period_bucket(models.Expense.date, granularity)).compile(dialect=postgresql.dialect())
+    assert expected in str(compiled)
@@ -0,0 +1,37 @@
+import pytest
+
+from app.utils.summary_utils import get_financial_summary
+
+
+def _add_entries(client, user, count, start=0):
+    category = client.get("/categories/", headers=user.headers).json()[0]["id"]
+    for n in range(start, start + count):
+        client.post("/expenses/", headers=user.headers,
+                    json={"title": f"e{n}", "amount": "1.25", "category_id": category, "date": f"2025-{n % 12 + 1:02d}-03T00:00:00"})
+        client.post("/incomes/", headers=user.headers, json={"title": f"i{n % 5}", "amount": "10", "date": f"2025-{n % 12 + 1:02d}-04T00:00:00"})
+
+
+def _count(client, user, statements, path):
+    # the first request may look the user up for authentication; the measured one is served from the principal cache
+    client.get(path, headers=user.headers, params={"_": "warm"})
+    with statements() as executed:
+        response = client.get(path, headers=user.headers)
+    assert response.status_code == 200, response.text
+    return len(executed)
+
+
+@pytest.mark.parametrize("period", ["month", "quarter", "year"])
+def test_financial_summary_takes_two_statements(client, user, db, statements, period):
+    _add_entries(client, user, 3)
+    with statements() as executed:
+        get_financial_summary(db, user.id, period)
+    assert len(executed) == 2
+
+
+@pytest.mark.parametrize("path", ["/finance/summary?period=year", "/expenses/", "/incomes/", "/expenses/summary"])
+def test_statements_do_not_grow_with_entries(client, user, statements, path):
+    _add_entries(client, user, 1)
+    one = _count(client, user, statements, path)
+    _add_entries(client, user, 49, start=1)
+    fifty = _count(client, user, statements, path)
+    assert fifty == one
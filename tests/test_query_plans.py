@@ -0,0 +1,11 @@
+from app.utils.query_plan_utils import collect_query_plans
+
+
+def test_no_util_statement_scans_a_whole_table():
+    plans = collect_query_plans()
+
+    regressions = [f"{plan['label']}: {' '.join(plan['statement'].split())} -> {plan['plan']}" for plan in plans if plan["full_scans"]]
+    assert not regressions, "\n".join(regressions)
+    # executemany statements (rollup and checkpoint upserts) are explained too
+    for table in ("expense_rollups", "income_rollups", "balance_checkpoints"):
+        assert any(plan["statement"].startswith(f"INSERT INTO {table} ") for plan in plans), table
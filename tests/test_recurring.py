@@ -0,0 +1,55 @@
+from datetime import datetime
+
+from app import models
+from app.database import get_engines
+from app.utils import recurring_utils
+from app.utils.recurring_utils import materialize_due_rules
+
+
+def _rule(client, user, **fields):
+    category = client.get("/categories/", headers=user.headers).json()[0]["id"]
+    return client.post("/recurring/", headers=user.headers, json={
+        "kind": "expense", "title": "Rent", "amount": "800", "category_id": category, "frequency": "month",
+        "start_date": "2025-01-01T00:00:00", **fields})
+
+
+def test_rules_in_a_currency_without_rate_are_refused(client, user):
+    response = _rule(client, user, currency="JPY")
+    assert response.status_code == 422
+    assert response.json()["detail"] == "No JPY exchange rate on or before 2025-01-01"
+
+
+def test_a_rule_without_rate_does_not_block_the_others(client, user, other_user, db):
+    # e.g. created before its currency's rates were removed from the rates file and reloaded
+    stuck = db.get(models.RecurringRule, _rule(client, user).json()["id"])
+    stuck.currency = "JPY"
+    db.commit()
+    rule = _rule(client, other_user).json()
+
+    assert materialize_due_rules(db, datetime(2025, 3, 15), batch_size=1) == 3
+    db.expire_all()
+    assert db.get(models.RecurringRule, rule["id"]).occurrences == 3
+    assert db.get(models.RecurringRule, stuck.id).next_run == datetime(2025, 1, 1)
+    assert db.query(models.Expense).filter(models.Expense.user_id == user.id).count() == 0
+
+
+def test_concurrent_passes_do_not_create_occurrences_twice(client, user, db, monkeypatch):
+    rule = _rule(client, user).json()
+    now = datetime(2025, 3, 15)
+    insert_rows = recurring_utils.insert_expense_rows
+    raced = []
+
+    def insert_after_another_pass(session, rows):
+        # another process runs a whole pass between this batch's read of the rules and its writes
+        if not raced:
+            raced.append(True)
+            with get_engines().SessionLocal() as other:
+                materialize_due_rules(other, now)
+        insert_rows(session, rows)
+
+    monkeypatch.setattr(recurring_utils, "insert_expense_rows", insert_after_another_pass)
+    materialize_due_rules(db, now)
+
+    db.expire_all()
+    assert db.get(models.RecurringRule, rule["id"]).occurrences == 3
+    assert db.query(models.Expense).filter(models.Expense.user_id == user.id).count() == 3
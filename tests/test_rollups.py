@@ -0,0 +1,116 @@
+from collections import Counter
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from app import models
+from app.utils.balance_utils import rebuild_balance_checkpoints
+from app.utils.fx_utils import load_fx_rates
+from app.utils.rollup_utils import rebuild_rollups
+
+
+def _rollups(db, user_id):
+    table = models.ExpenseRollup.__table__
+    rows = db.execute(select(table.c.category_id, table.c.period, table.c.total, table.c.entry_count)
+                      .where(table.c.user_id == user_id, table.c.entry_count != 0)).all()
+    return Counter(tuple(row) for row in rows)
+
+
+def _category(client, user, name="Food"):
+    return next(category["id"] for category in client.get("/categories/", headers=user.headers).json() if category["name"] == name)
+
+
+def test_uncategorized_expenses_keep_their_rollups(client, user, db):
+    food, car = _category(client, user, "Food"), _category(client, user, "Car")
+    expense = client.post("/expenses/", headers=user.headers,
+                          json={"title": "lunch", "amount": "25.50", "category_id": food, "date": "2025-10-25T14:00:00"}).json()
+    client.post("/expenses/", headers=user.headers, json={"title": "fuel", "amount": "40", "category_id": car, "date": "2025-10-25T19:00:00"})
+
+    assert client.delete(f"/categories/{food}", headers=user.headers).status_code == 204
+    summary = client.get("/expenses/summary?period=month", headers=user.headers).json()
+    assert summary["total_per_period"] == [{"period": "2025-10", "total": 65.5}]
+    assert summary["total_per_category"] == [{"category": "Car", "total": 40.0}]
+
+    # moving it off the deleted category, then deleting it, updates the uncategorized rollups
+    moved = client.put(f"/expenses/{expense['id']}", headers=user.headers,
+                       json={"title": "lunch", "amount": "30", "category_id": car, "date": "2025-10-25T14:00:00"})
+    assert moved.status_code == 200
+    assert client.delete(f"/expenses/{expense['id']}", headers=user.headers).status_code == 204
+    assert client.get("/expenses/summary?period=month", headers=user.headers).json()["total_per_period"] == [
+        {"period": "2025-10", "total": 40.0}]
+
+
+def test_deleting_an_uncategorized_expense(client, user, db):
+    food = _category(client, user)
+    expense = client.post("/expenses/", headers=user.headers,
+                          json={"title": "lunch", "amount": "12.25", "category_id": food, "date": "2025-10-25T14:00:00"}).json()
+    client.delete(f"/categories/{food}", headers=user.headers)
+
+    assert client.delete(f"/expenses/{expense['id']}", headers=user.headers).status_code == 204
+    assert _rollups(db, user.id) == Counter()
+
+
+def test_category_delete_moves_rollups_and_stops_rules(client, user, db):
+    food, car = _category(client, user, "Food"), _category(client, user, "Car")
+    for category, amount in ((food, "10"), (car, "5"), (food, "2.5")):
+        client.post("/expenses/", headers=user.headers, json={"title": "x", "amount": amount, "category_id": category, "date": "2025-09-02T00:00:00"})
+    rule = client.post("/recurring/", headers=user.headers, json={
+        "kind": "expense", "title": "Lunch", "amount": "9", "category_id": food, "frequency": "week", "start_date": "2030-01-01T00:00:00"}).json()
+
+    client.delete(f"/categories/{food}", headers=user.headers)
+
+    assert _rollups(db, user.id) == Counter({(car, "2025-09", Decimal("5.00"), 1): 1, (None, "2025-09", Decimal("12.50"), 2): 1})
+    assert db.get(models.RecurringRule, rule["id"]).next_run is None
+    assert db.scalar(select(models.CategoryBudget).where(models.CategoryBudget.category_id == food)) is None
+
+
+def test_rebuilt_rollups_match_the_incremental_ones(client, user, db):
+    food, car = _category(client, user, "Food"), _category(client, user, "Car")
+    for category, amount, date in ((food, "10", "2025-08-02"), (car, "5", "2025-09-02"), (food, "2.5", "2025-09-03")):
+        client.post("/expenses/", headers=user.headers, json={"title": "x", "amount": amount, "category_id": category, "date": f"{date}T00:00:00"})
+    client.delete(f"/categories/{food}", headers=user.headers)
+    client.post("/incomes/", headers=user.headers, json={"title": "pay", "amount": "100", "date": "2025-09-01T00:00:00"})
+    incremental = _rollups(db, user.id)
+    balance = client.get("/finance/summary?period=year", headers=user.headers).json()["balance_end"]
+
+    rebuild_rollups(db, user.id)
+    rebuild_balance_checkpoints(db, user.id)
+    db.expire_all()
+    assert _rollups(db, user.id) == incremental
+    assert client.get("/finance/summary?period=year", headers=user.headers).json()["balance_end"] == balance
+    assert sum(total for (_, _, total, _), _ in incremental.items()) == Decimal("17.50")
+
+
+def test_rollup_totals_by_quarter_and_year_use_the_period_labels(client, user):
+    food = _category(client, user)
+    for amount, date in (("1", "2024-12-31"), ("2", "2025-01-01"), ("4", "2025-03-31"), ("8", "2025-04-01")):
+        client.post("/expenses/", headers=user.headers, json={"title": "x", "amount": amount, "category_id": food, "date": f"{date}T12:00:00"})
+
+    def totals(period):
+        return client.get(f"/expenses/summary?period={period}", headers=user.headers).json()["total_per_period"]
+
+    assert totals("quarter") == [{"period": "2024-4", "total": 1.0}, {"period": "2025-1", "total": 6.0}, {"period": "2025-2", "total": 8.0}]
+    assert totals("year") == [{"period": "2024", "total": 1.0}, {"period": "2025", "total": 14.0}]
+
+
+def test_removals_take_off_the_stored_base_amount(client, user, db):
+    food = _category(client, user, "Food")
+    load_fx_rates(db, [{"currency": "USD", "date": date(2011, 3, 1), "rate": 1}, {"currency": "GBP", "date": date(2011, 3, 1), "rate": 0.5}])
+    expense = {"title": "x", "amount": "10", "currency": "GBP", "category_id": food, "date": "2011-03-02T00:00:00"}
+    converted = client.post("/expenses/", headers=user.headers, json=expense).json()
+    client.post("/expenses/", headers=user.headers, json={**expense, "amount": "30", "currency": None})
+    updated = client.post("/expenses/", headers=user.headers, json=expense).json()
+    assert db.get(models.Expense, converted["id"]).base_amount == Decimal("20.00")
+
+    # entries written before keep the 20.00 they were converted to, and are taken off at it
+    load_fx_rates(db, [{"currency": "GBP", "date": date(2011, 3, 1), "rate": 0.25}])
+    client.delete(f"/expenses/{converted['id']}", headers=user.headers)
+    client.put(f"/expenses/{updated['id']}", headers=user.headers, json={**expense, "amount": "5"})
+
+    summary = client.get("/expenses/summary", headers=user.headers).json()
+    assert summary["total_per_category"] == [{"category": "Food", "total": 50.0}]
+    assert client.get("/finance/summary?period=year", headers=user.headers).json()["balance_end"] == 950.0
+    incremental = _rollups(db, user.id)
+    rebuild_rollups(db, user.id)
+    assert _rollups(db, user.id) == incremental
@@ -0,0 +1,23 @@
+def _titles(client, user, kind, q):
+    response = client.get(f"/{kind}/", headers=user.headers, params={"q": q})
+    assert response.status_code == 200, response.text
+    return [entry["title"] for entry in response.json()]
+
+
+def test_search_terms_only_match_titles_and_descriptions(client, user):
+    client.post("/incomes/", headers=user.headers, json={"title": "salary", "amount": "10", "date": "2025-01-01T00:00:00"})
+    client.post("/incomes/", headers=user.headers, json={"title": f"bonus {user.id}", "amount": "10", "date": "2025-01-02T00:00:00"})
+
+    # the user's id is in the indexed owner column of every row, but only the title contains it
+    assert _titles(client, user, "incomes", str(user.id)) == [f"bonus {user.id}"]
+
+
+def test_search_matches_prefixes_and_ranks_the_best_match_first(client, user):
+    food = client.get("/categories/", headers=user.headers).json()[0]["id"]
+    for title, description in (("groceries", "dentist parking"), ("dentist", "dental checkup at the dentist"), ("coffee", None)):
+        client.post("/expenses/", headers=user.headers,
+                    json={"title": title, "amount": "1", "description": description, "category_id": food, "date": "2025-01-01T00:00:00"})
+
+    assert _titles(client, user, "expenses", "dent") == ["dentist", "groceries"]
+    assert _titles(client, user, "expenses", "dent park") == ["groceries"]
+    assert _titles(client, user, "expenses", "tea") == []
@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app import database
+from app.utils.constants import SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE
+
+
+def _pragmas(connection):
+    return {name: connection.execute(text(f"PRAGMA {name}")).scalar()
+            for name in ("journal_mode", "synchronous", "busy_timeout", "mmap_size", "cache_size", "query_only")}
+
+
+def test_production_profile_applies_to_sqlite_files_only(monkeypatch):
+    monkeypatch.setattr(database, "SQLITE_PRODUCTION", True)
+    assert database.uses_sqlite_production("sqlite:///budget.db")
+    assert not database.uses_sqlite_production("sqlite:///:memory:")
+    assert not database.uses_sqlite_production("postgresql://localhost/budget")
+    monkeypatch.setattr(database, "SQLITE_PRODUCTION", False)
+    assert not database.uses_sqlite_production("sqlite:///budget.db")
+
+
+def test_writer_and_reader_connections_get_the_pragmas(tmp_path):
+    writer, reader = database._sqlite_production_engines(create_engine, f"sqlite:///{tmp_path}/production.db")
+    try:
+        with writer.begin() as connection:
+            written = _pragmas(connection)
+            connection.execute(text("CREATE TABLE entries (id INTEGER PRIMARY KEY)"))
+        with reader.connect() as connection:
+            read = _pragmas(connection)
+            with pytest.raises(OperationalError, match="readonly"):
+                connection.execute(text("INSERT INTO entries DEFAULT VALUES"))
+
+        # synchronous NORMAL is 1, the cache size is given in KiB as a negative number
+        expected = {"journal_mode": "wal", "synchronous": 1, "busy_timeout": SQLITE_BUSY_TIMEOUT_MS, "mmap_size": SQLITE_MMAP_SIZE,
+                    "cache_size": -SQLITE_CACHE_SIZE_KB}
+        assert written == {**expected, "query_only": 0}
+        assert read == {**expected, "query_only": 1}
+        assert writer.pool.size() == 1
+    finally:
+        writer.dispose()
+        reader.dispose()
@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+from app.manage import PROJECT_ROOT
+
+
+def test_importing_the_app_does_not_touch_the_database(tmp_path):
+    # the database file's directory does not exist: any connection attempt would fail the import
+    database_url = f"sqlite:///{tmp_path}/missing/budget.db"
+    script = textwrap.dedent("""
+        import sys
+        from app import database
+        from app.main import app
+
+        assert database._engines is None
+        assert app.routes
+        print(",".join(sorted(module for module in ("numpy", "passlib", "pyarrow") if module in sys.modules)))
+    """)
+    result = subprocess.run([sys.executable, "-c", script], cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=120,
+                            env={**os.environ, "DATABASE_URL": database_url, "RECURRING_SCHEDULER_ENABLED": "true"})
+
+    assert result.returncode == 0, result.stderr
+    # the analytics engine and password hashing load their dependencies on first use
+    assert result.stdout.strip() == ""
+    assert not (tmp_path / "missing").exists()
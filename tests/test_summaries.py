@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+
+from app.utils.period_utils import add_periods, period_label, period_start
+
+
+def _add_month_entries(client, user):
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+    food = next(category["id"] for category in client.get("/categories/", headers=user.headers).json() if category["name"] == "Food")
+    client.post("/expenses/", headers=user.headers, json={"title": "lunch", "amount": "12.50", "category_id": food, "date": today})
+    client.post("/incomes/", headers=user.headers, json={"title": "pay", "amount": "100", "date": today})
+
+
+def test_timeseries_amounts_are_in_currency_units(client, user):
+    _add_month_entries(client, user)
+    response = client.get("/finance/timeseries?granularity=month&periods=2", headers=user.headers).json()
+
+    assert response["opening_balance"] == 1000.0
+    assert [(point["income"], point["expense"], point["net"], point["closing_balance"]) for point in response["series"]] == [
+        (0.0, 0.0, 0.0, 1000.0), (100.0, 12.5, 87.5, 1087.5)]
+
+
+def test_summary_amounts_are_in_currency_units(client, user):
+    _add_month_entries(client, user)
+    summary = client.get("/finance/summary?period=month", headers=user.headers).json()
+
+    assert (summary["income_total"], summary["expense_total"], summary["balance_start"], summary["balance_end"]) == (100.0, 12.5, 1000.0, 1087.5)
+    assert summary["expense_by_category"] == [{"category": "Food", "total": 12.5}]
+    assert summary["income_by_category"] == [{"title": "pay", "total": 100.0}]
+
+
+def test_timeseries_opens_with_the_earlier_entries_and_zero_fills(client, user):
+    first = add_periods(period_start(datetime.utcnow(), "month"), "month", -2)
+    for amount, moment in (("30", add_periods(first, "month", -14)), ("5", first), ("2.25", add_periods(first, "month", 2))):
+        client.post("/incomes/", headers=user.headers, json={"title": "pay", "amount": amount, "date": moment.isoformat()})
+    food = next(category["id"] for category in client.get("/categories/", headers=user.headers).json() if category["name"] == "Food")
+    client.post("/expenses/", headers=user.headers,
+                json={"title": "x", "amount": "10", "category_id": food, "date": (first - timedelta(seconds=1)).isoformat()})
+
+    response = client.get("/finance/timeseries?granularity=month&periods=3", headers=user.headers).json()
+    assert response["opening_balance"] == 1020.0
+    assert [(point["period"], point["income"], point["expense"], point["closing_balance"]) for point in response["series"]] == [
+        (period_label(first, "month"), 5.0, 0.0, 1025.0),
+        (period_label(add_periods(first, "month", 1), "month"), 0.0, 0.0, 1025.0),
+        (period_label(add_periods(first, "month", 2), "month"), 2.25, 0.0, 1027.25),
+    ]
+
+    quarters = client.get("/finance/timeseries?granularity=quarter&periods=1", headers=user.headers).json()["series"]
+    assert quarters[0]["period"] == period_label(period_start(datetime.utcnow(), "quarter"), "quarter")